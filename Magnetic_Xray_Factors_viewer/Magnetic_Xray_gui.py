@@ -1,396 +1,1247 @@
-import sys
-import numpy as np
-from PyQt5.QtWidgets import (
-    QApplication, QWidget, QGridLayout, QPushButton, QLabel, QLineEdit,
-    QComboBox, QCheckBox, QHBoxLayout, QVBoxLayout, QMessageBox, QGroupBox, QFileDialog,
-    QDialog, QTextEdit, QSpacerItem, QSizePolicy,
-)
-from PyQt5.QtGui import QPixmap, QFont, QColor, QPalette
-from PyQt5.QtCore import Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-from data_manager import MagneticFormFactorDB, XRayFormFactorDB
-
-# 省略周期表内容，假设ELEMENTS为[(原子序数, 元素符号, 中文名, (row, col)), ...]
-ELEMENTS = [
-        (1, 'H', '氢', (0, 0)), (2, 'He', '氦', (0, 17)),
-    (3, 'Li', '锂', (1, 0)), (4, 'Be', '铍', (1, 1)), (5, 'B', '硼', (1, 12)), (6, 'C', '碳', (1, 13)),
-    (7, 'N', '氮', (1, 14)), (8, 'O', '氧', (1, 15)), (9, 'F', '氟', (1, 16)), (10, 'Ne', '氖', (1, 17)),
-    (11, 'Na', '钠', (2, 0)), (12, 'Mg', '镁', (2, 1)), (13, 'Al', '铝', (2, 12)), (14, 'Si', '硅', (2, 13)),
-    (15, 'P', '磷', (2, 14)), (16, 'S', '硫', (2, 15)), (17, 'Cl', '氯', (2, 16)), (18, 'Ar', '氩', (2, 17)),
-    (19, 'K', '钾', (3, 0)), (20, 'Ca', '钙', (3, 1)), (21, 'Sc', '钪', (3, 2)), (22, 'Ti', '钛', (3, 3)),
-    (23, 'V', '钒', (3, 4)), (24, 'Cr', '铬', (3, 5)), (25, 'Mn', '锰', (3, 6)), (26, 'Fe', '铁', (3, 7)),
-    (27, 'Co', '钴', (3, 8)), (28, 'Ni', '镍', (3, 9)), (29, 'Cu', '铜', (3, 10)), (30, 'Zn', '锌', (3, 11)),
-    (31, 'Ga', '镓', (3, 12)), (32, 'Ge', '锗', (3, 13)), (33, 'As', '砷', (3, 14)), (34, 'Se', '硒', (3, 15)),
-    (35, 'Br', '溴', (3, 16)), (36, 'Kr', '氪', (3, 17)),
-    (37, 'Rb', '铷', (4, 0)), (38, 'Sr', '锶', (4, 1)), (39, 'Y', '钇', (4, 2)), (40, 'Zr', '锆', (4, 3)),
-    (41, 'Nb', '铌', (4, 4)), (42, 'Mo', '钼', (4, 5)), (43, 'Tc', '锝', (4, 6)), (44, 'Ru', '钌', (4, 7)),
-    (45, 'Rh', '铑', (4, 8)), (46, 'Pd', '钯', (4, 9)), (47, 'Ag', '银', (4, 10)), (48, 'Cd', '镉', (4, 11)),
-    (49, 'In', '铟', (4, 12)), (50, 'Sn', '锡', (4, 13)), (51, 'Sb', '锑', (4, 14)), (52, 'Te', '碲', (4, 15)),
-    (53, 'I', '碘', (4, 16)), (54, 'Xe', '氙', (4, 17)),
-    (55, 'Cs', '铯', (5, 0)), (56, 'Ba', '钡', (5, 1)), (57, 'La', '镧', (5, 2)), (72, 'Hf', '铪', (5, 3)),
-    (73, 'Ta', '钽', (5, 4)), (74, 'W', '钨', (5, 5)), (75, 'Re', '铼', (5, 6)), (76, 'Os', '锇', (5, 7)),
-    (77, 'Ir', '铱', (5, 8)), (78, 'Pt', '铂', (5, 9)), (79, 'Au', '金', (5, 10)), (80, 'Hg', '汞', (5, 11)),
-    (81, 'Tl', '铊', (5, 12)), (82, 'Pb', '铅', (5, 13)), (83, 'Bi', '铋', (5, 14)), (84, 'Po', '钋', (5, 15)),
-    (85, 'At', '砹', (5, 16)), (86, 'Rn', '氡', (5, 17)),
-    (87, 'Fr', '钫', (6, 0)), (88, 'Ra', '镭', (6, 1)), (89, 'Ac', '锕', (6, 2)), (104, 'Rf', '𬬻', (6, 3)),
-    (105, 'Db', '𬭊', (6, 4)), (106, 'Sg', '𬭳', (6, 5)), (107, 'Bh', '𬭶', (6, 6)), (108, 'Hs', '𬭸', (6, 7)),
-    (109, 'Mt', '鿔', (6, 8)), (110, 'Ds', '𫟼', (6, 9)), (111, 'Rg', '𬬭', (6, 10)), (112, 'Cn', '鿬', (6, 11)),
-    (113, 'Nh', '鉨', (6, 12)), (114, 'Fl', '鈇', (6, 13)), (115, 'Mc', '镆', (6, 14)), (116, 'Lv', '鉝', (6, 15)),
-    (117, 'Ts', '石田', (6, 16)), (118, 'Og', '气奥', (6, 17)),
-    (58, 'Ce', '铈', (7, 3)), (59, 'Pr', '镨', (7, 4)), (60, 'Nd', '钕', (7, 5)), (61, 'Pm', '钷', (7, 6)),
-    (62, 'Sm', '钐', (7, 7)), (63, 'Eu', '铕', (7, 8)), (64, 'Gd', '钆', (7, 9)), (65, 'Tb', '铽', (7, 10)),
-    (66, 'Dy', '镝', (7, 11)), (67, 'Ho', '钬', (7, 12)), (68, 'Er', '铒', (7, 13)), (69, 'Tm', '铥', (7, 14)),
-    (70, 'Yb', '镱', (7, 15)), (71, 'Lu', '镥', (7, 16)),
-    (90, 'Th', '钍', (8, 3)), (91, 'Pa', '镤', (8, 4)), (92, 'U', '铀', (8, 5)), (93, 'Np', '镎', (8, 6)),
-    (94, 'Pu', '钚', (8, 7)), (95, 'Am', '镅', (8, 8)), (96, 'Cm', '锔', (8, 9)), (97, 'Bk', '锫', (8, 10)),
-    (98, 'Cf', '锎', (8, 11)), (99, 'Es', '锿', (8, 12)), (100, 'Fm', '镄', (8, 13)), (101, 'Md', '钔', (8, 14)),
-    (102, 'No', '锘', (8, 15)), (103, 'Lr', '铹', (8, 16))
-]
-
-class PeriodicTableWidget(QWidget):
-    def __init__(self, db, xdb, get_category, on_element_clicked):
-        super().__init__()
-        self.db = db
-        self.xdb = xdb
-        self.get_category = get_category
-        self.on_element_clicked = on_element_clicked
-        self.init_ui()
-
-    def init_ui(self):
-        grid = QGridLayout()
-        self.btns = {}
-        for num, en, zh, (row, col) in ELEMENTS:
-            btn = QPushButton(f"{zh}\n{en}\n{num}")
-            btn.setFixedSize(60, 80)
-            btn.clicked.connect(lambda _, e=en: self.on_element_clicked(e))
-            grid.addWidget(btn, row, col)
-            self.btns[en] = btn
-        self.setLayout(grid)
-        self.update_btns()
-
-    def update_btns(self):
-        # 根据分类灰色显示无数据元素
-        category = self.get_category()
-        if category == "磁性形状因子":
-            valid_elems = set(self.db.get_elements())
-        else:
-            valid_elems = self.xdb.get_all_elements()
-        for en, btn in self.btns.items():
-            if en in valid_elems:
-                btn.setEnabled(True)
-                btn.setStyleSheet("color: black; background-color: white;")
-            else:
-                btn.setEnabled(True)
-                btn.setStyleSheet("color: gray; background-color: lightgray;")
-
-INSTRUCTION_TEXT = """
-【Magia_Form_Factor_Viewer: 磁性Form Factor可视化工具 使用说明】
-1. 在左侧周期表中点击元素，若有数据则可选择价态和j类型，若无数据则提示。
-2. 输入波长（单位Å）、θ范围和步长。
-3. 选择价态和j类型（可多选），点击“绘图”显示曲线。
-4. 可勾选“对数坐标”切换横轴为对数。
-5. 可导出当前曲线为PNG图片和数据文件（.dat）。
-6. 切换“X射线形状因子”分类后，周期表灰色表示无数据元素，点击后弹窗提示。
-"""
-
-class HelpDialog(QDialog):
-    def __init__(self, parent=None):
-        super().__init__(parent)  
-        self.setWindowTitle("操作说明") 
-        self.resize(1000, 600)  
-        layout = QVBoxLayout(self) 
-        text_edit = QTextEdit() 
-        text_edit.setReadOnly(True) 
-        text_edit.setPlainText(INSTRUCTION_TEXT)  
-        text_edit.setFont(QFont("Consolas", 12)) 
-        layout.addWidget(text_edit) 
-
-class MainWindow(QWidget):
-    def __init__(self):
-        super().__init__()
-        #确保以下路径正确！！！
-        self.db = MagneticFormFactorDB(r"D:\\study\\Program\\XRD_Form_Factors\\Magnetic_Form_factor_data")
-        self.xdb = XRayFormFactorDB(r"D:\\study\\Program\\XRD_Form_Factors\\Xray_scatter_data")
-        self.selected_element = None
-        self.selected_valence = None
-        self.selected_jtypes = []
-        self.current_category = "磁性形状因子"
-        self.last_plot_data = None
-        self.init_ui()
-
-    def init_ui(self):
-        self.setWindowTitle("Magia_Factor_Viewer")
-        main_layout = QHBoxLayout()
-
-        # 分类选择
-        left_layout = QVBoxLayout()
-        category_label = QLabel("请选择分类：")
-        category_label.setFont(QFont("Arial", 14))
-        self.category_combo = QComboBox()
-        self.category_combo.addItems(["磁性形状因子", "X射线形状因子"])
-        self.category_combo.setFont(QFont("Arial", 14))
-        self.category_combo.setFixedHeight(40)
-        self.category_combo.setMinimumWidth(220)
-        self.category_combo.currentTextChanged.connect(self.on_category_changed)
-        left_layout.addWidget(category_label)
-        left_layout.addWidget(self.category_combo)
-
-        # 周期表
-        self.pt_widget = PeriodicTableWidget(self.db, self.xdb, self.get_category, self.on_element_clicked)
-        left_layout.addWidget(self.pt_widget, 2)
-        main_layout.addLayout(left_layout, 2)
-
-        # 右侧参数区
-        param_layout = QVBoxLayout()
-
-        # 使用说明按钮
-        help_btn = QPushButton("使用说明")
-        help_btn.clicked.connect(self.show_help)
-        param_layout.addWidget(help_btn, alignment=Qt.AlignRight)
-
-        # method信息
-        self.method_label = QLabel()
-        self.method_label.setFont(QFont("Arial", 10))
-        param_layout.addWidget(self.method_label)
-
-        # 波长、θ范围等，仅磁性形状因子分类显示
-        self.param_group = QWidget()
-        param_form = QVBoxLayout()
-        w_box = QHBoxLayout()
-        w_box.addWidget(QLabel("波长 λ (Å):"))
-        self.w_input = QLineEdit()
-        w_box.addWidget(self.w_input)
-        param_form.addLayout(w_box)
-
-        theta_box = QHBoxLayout()
-        theta_box.addWidget(QLabel("θ范围 (度):"))
-        self.theta_min = QLineEdit("0")
-        self.theta_max = QLineEdit("80")
-        self.theta_step = QLineEdit("0.05")
-        theta_box.addWidget(self.theta_min)
-        theta_box.addWidget(QLabel("~"))
-        theta_box.addWidget(self.theta_max)
-        theta_box.addWidget(QLabel("步长:"))
-        theta_box.addWidget(self.theta_step)
-        param_form.addLayout(theta_box)
-
-        self.valence_combo = QComboBox()
-        self.valence_combo.currentIndexChanged.connect(self.on_valence_changed)
-        param_form.addWidget(QLabel("选择价态:"))
-        param_form.addWidget(self.valence_combo)
-
-        self.j0_cb = QCheckBox("j0")
-        self.j2_cb = QCheckBox("j2")
-        self.j4_cb = QCheckBox("j4")
-        self.j6_cb = QCheckBox("j6")
-        jtype_box = QHBoxLayout()
-        for cb in [self.j0_cb, self.j2_cb, self.j4_cb, self.j6_cb]:
-            jtype_box.addWidget(cb)
-        param_form.addWidget(QLabel("选择j类型:"))
-        param_form.addLayout(jtype_box)
-
-        self.log_cb = QCheckBox("对数坐标（横轴s）")
-        param_form.addWidget(self.log_cb)
-        self.param_group.setLayout(param_form)
-        param_layout.addWidget(self.param_group)
-
-        # 绘图与导出按钮
-        btn_box = QHBoxLayout()
-        self.plot_btn = QPushButton("绘图")
-        self.export_btn = QPushButton("导出")
-        btn_box.addWidget(self.plot_btn)
-        btn_box.addWidget(self.export_btn)
-        param_layout.addLayout(btn_box)
-
-        # matplotlib画布
-        self.fig = Figure(figsize=(5, 4), dpi=100)
-        self.canvas = FigureCanvas(self.fig)
-        plot_group = QGroupBox("Form Factor 曲线")
-        plot_layout = QVBoxLayout()
-        plot_layout.addWidget(self.canvas)
-        plot_group.setLayout(plot_layout)
-        param_layout.addWidget(plot_group, 2)
-
-        main_layout.addLayout(param_layout, 1)
-        self.setLayout(main_layout)
-
-        # 事件绑定
-        self.plot_btn.clicked.connect(self.on_plot)
-        self.export_btn.clicked.connect(self.on_export)
-
-        self.update_param_visibility()
-
-    def get_category(self):
-        return self.category_combo.currentText()
-
-    def on_category_changed(self, text):
-        self.current_category = text
-        self.selected_element = None
-        self.selected_valence = None
-        self.method_label.setText("")
-        self.fig.clear()
-        self.canvas.draw()
-        self.pt_widget.update_btns()
-        self.update_param_visibility()
-
-    def update_param_visibility(self):
-        # 仅磁性形状因子分类显示参数区
-        if self.get_category() == "磁性形状因子":
-            self.param_group.show()
-            self.plot_btn.setText("绘图")
-        else:
-            self.param_group.hide()
-            self.plot_btn.setText("显示X射线散射因子")
-
-    def on_element_clicked(self, elem):
-        self.selected_element = elem
-        if self.get_category() == "磁性形状因子":
-            valences = self.db.get_valences(elem)
-            if not valences:
-                QMessageBox.information(self, "提示", "暂无数据，亟需补充。")
-                self.valence_combo.clear()
-                return
-            self.valence_combo.clear()
-            self.valence_combo.addItems(valences)
-            self.on_valence_changed(0)
-            self.method_label.setText("")
-            self.fig.clear()
-            self.canvas.draw()
-        else:
-            # X射线形状因子
-            if not self.xdb.has_data(elem):
-                QMessageBox.information(self, "提示", "暂无数据，亟待补充")
-                self.method_label.setText("")
-                self.fig.clear()
-                self.canvas.draw()
-                return
-            method = self.xdb.get_method(elem)
-            points = self.xdb.get_points(elem)
-            self.method_label.setText(f"元素采用的method为：{method}")
-            self.fig.clear()
-            ax = self.fig.add_subplot(111)
-            x = [pt[0] for pt in points]
-            y = [pt[1] for pt in points]
-            ax.plot(x, y, marker='o')
-            ax.set_xlabel(r"(sinθ)/λ (Å⁻¹)")
-            ax.set_ylabel("scattering factor (count)")
-            ax.set_title(f"{elem} X-ray scattering factor")
-            ax.grid(True)
-            self.canvas.draw()
-            self.last_plot_data = ("xray", elem, method, x, y)
-
-    def on_valence_changed(self, idx):
-        elem = self.selected_element
-        if not elem:
-            return
-        valence = self.valence_combo.currentText()
-        self.selected_valence = valence
-        jtypes = self.db.get_j_types(elem, valence)
-        self.j0_cb.setEnabled("j0" in jtypes)
-        self.j2_cb.setEnabled("j2" in jtypes)
-        self.j4_cb.setEnabled("j4" in jtypes)
-        self.j6_cb.setEnabled("j6" in jtypes)
-        for cb, jt in zip([self.j0_cb, self.j2_cb, self.j4_cb, self.j6_cb], ["j0", "j2", "j4", "j6"]):
-            cb.setChecked(jt in jtypes)
-
-    def on_plot(self):
-        if self.get_category() == "磁性形状因子":
-            elem = self.selected_element
-            valence = self.valence_combo.currentText()
-            jtypes = []
-            for cb, jt in zip([self.j0_cb, self.j2_cb, self.j4_cb, self.j6_cb], ["j0", "j2", "j4", "j6"]):
-                if cb.isChecked() and cb.isEnabled():
-                    jtypes.append(jt)
-            if not elem or not valence or not jtypes:
-                QMessageBox.warning(self, "警告", "请先选择元素、价态和j类型。")
-                return
-            try:
-                w = float(self.w_input.text())
-                theta_min = float(self.theta_min.text())
-                theta_max = float(self.theta_max.text())
-                theta_step = float(self.theta_step.text())
-                if w <= 0 or theta_min < 0 or theta_max > 180 or theta_min >= theta_max or theta_step <= 0:
-                    raise ValueError
-            except Exception:
-                QMessageBox.warning(self, "警告", "请输入有效的波长和θ范围参数。")
-                return
-
-            theta = np.arange(theta_min, theta_max + theta_step, theta_step)
-            s = np.sin(np.deg2rad(theta)) / w
-
-            self.fig.clear()
-            ax = self.fig.add_subplot(111)
-            plot_data = []
-
-            for jt in jtypes:
-                params = self.db.get_params(elem, valence, jt)
-                if not params:
-                    continue
-                if jt == "j0":
-                    y = (
-                        params["A"] * np.exp(-params["a"] * s ** 2)
-                        + params["B"] * np.exp(-params["b"] * s ** 2)
-                        + params["C"] * np.exp(-params["c"] * s ** 2)
-                    )
-                else:
-                    y = (
-                        params["A"] * np.exp(-params["a"] * s ** 2)
-                        + params["B"] * np.exp(-params["b"] * s ** 2)
-                        + params["C"] * np.exp(-params["c"] * s ** 2)
-                        + params["D"]
-                    ) * s ** 2
-                ax.plot(s, y, label=jt)
-                plot_data.append((jt, s.copy(), y.copy()))
-
-            ax.set_xlabel("s = sinθ / λ (Å⁻¹)")
-            ax.set_ylabel("Form Factor")
-            title = f"{elem} {valence}+  Form Factor"
-            ax.set_title(title)
-            ax.legend()
-            if self.log_cb.isChecked():
-                ax.set_xscale("log")
-            ax.grid(True)
-            self.canvas.draw()
-            self.last_plot_data = ("magnetic", elem, valence, plot_data)
-        else:
-            # X射线形状因子已在on_element_clicked中绘制，无需重复
-            pass
-
-    def on_export(self):
-        if not self.last_plot_data:
-            QMessageBox.warning(self, "警告", "请先绘制曲线后再导出。")
-            return
-        img_path, _ = QFileDialog.getSaveFileName(self, "保存图片", "", "PNG图片 (*.png)")
-        if img_path:
-            self.fig.savefig(img_path)
-        dat_path, _ = QFileDialog.getSaveFileName(self, "保存数据", "", "数据文件 (*.dat)")
-        if dat_path:
-            with open(dat_path, "w", encoding="utf-8") as f:
-                if self.last_plot_data[0] == "magnetic":
-                    _, elem, valence, plot_data = self.last_plot_data
-                    f.write(f"# {elem} {valence}+ Form Factor\n")
-                    s_arr = plot_data[0][1]
-                    f.write("# s\t" + "\t".join(jt for jt, _, _ in plot_data) + "\n")
-                    y_arrs = [y for _, _, y in plot_data]
-                    for i in range(len(s_arr)):
-                        row = [f"{s_arr[i]:.6f}"] + [f"{y[i]:.6f}" for y in y_arrs]
-                        f.write("\t".join(row) + "\n")
-                elif self.last_plot_data[0] == "xray":
-                    _, elem, method, x, y = self.last_plot_data
-                    f.write(f"# {elem} X射线散射因子\n")
-                    f.write(f"# {method}\n")
-                    f.write("# (sinθ)/λ (Å⁻¹)\t散射因子 (count)\n")
-                    for xi, yi in zip(x, y):
-                        f.write(f"{xi:.6f}\t{yi:.6f}\n")
-        QMessageBox.information(self, "提示", "导出完成！")
-
-    def show_help(self):
-        dlg = HelpDialog(self)
-        dlg.exec_()
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    win = MainWindow()
-    win.show()
+import time
+STARTUP_T0 = time.perf_counter()
+import os
+import sys
+from PyQt5.QtWidgets import (
+    QApplication, QWidget, QGridLayout, QPushButton, QLabel, QLineEdit,
+    QComboBox, QCheckBox, QHBoxLayout, QVBoxLayout, QMessageBox, QGroupBox, QFileDialog,
+    QDialog, QTextEdit, QSpacerItem, QSizePolicy, QProgressBar, QSlider, QListWidget, QAbstractItemView,
+)
+from PyQt5.QtGui import QPixmap, QFont, QColor, QPalette
+from PyQt5.QtCore import Qt, QThreadPool, QTimer
+from workers import Worker
+from perf import PERF
+# numpy、matplotlib 与数据模块在后台加载或首次绘图时才导入，以便窗口尽快显示
+
+#确保以下路径正确！！！
+MAGNETIC_DATA_DIR = r"D:\\study\\Program\\XRD_Form_Factors\\Magnetic_Form_factor_data"
+XRAY_DATA_DIR = r"D:\\study\\Program\\XRD_Form_Factors\\Xray_scatter_data"
+XRAY_GAUSSIAN_COEFFS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Xray_gaussian_coeffs.txt")
+
+# 省略周期表内容，假设ELEMENTS为[(原子序数, 元素符号, 中文名, (row, col)), ...]
+ELEMENTS = [
+        (1, 'H', '氢', (0, 0)), (2, 'He', '氦', (0, 17)),
+    (3, 'Li', '锂', (1, 0)), (4, 'Be', '铍', (1, 1)), (5, 'B', '硼', (1, 12)), (6, 'C', '碳', (1, 13)),
+    (7, 'N', '氮', (1, 14)), (8, 'O', '氧', (1, 15)), (9, 'F', '氟', (1, 16)), (10, 'Ne', '氖', (1, 17)),
+    (11, 'Na', '钠', (2, 0)), (12, 'Mg', '镁', (2, 1)), (13, 'Al', '铝', (2, 12)), (14, 'Si', '硅', (2, 13)),
+    (15, 'P', '磷', (2, 14)), (16, 'S', '硫', (2, 15)), (17, 'Cl', '氯', (2, 16)), (18, 'Ar', '氩', (2, 17)),
+    (19, 'K', '钾', (3, 0)), (20, 'Ca', '钙', (3, 1)), (21, 'Sc', '钪', (3, 2)), (22, 'Ti', '钛', (3, 3)),
+    (23, 'V', '钒', (3, 4)), (24, 'Cr', '铬', (3, 5)), (25, 'Mn', '锰', (3, 6)), (26, 'Fe', '铁', (3, 7)),
+    (27, 'Co', '钴', (3, 8)), (28, 'Ni', '镍', (3, 9)), (29, 'Cu', '铜', (3, 10)), (30, 'Zn', '锌', (3, 11)),
+    (31, 'Ga', '镓', (3, 12)), (32, 'Ge', '锗', (3, 13)), (33, 'As', '砷', (3, 14)), (34, 'Se', '硒', (3, 15)),
+    (35, 'Br', '溴', (3, 16)), (36, 'Kr', '氪', (3, 17)),
+    (37, 'Rb', '铷', (4, 0)), (38, 'Sr', '锶', (4, 1)), (39, 'Y', '钇', (4, 2)), (40, 'Zr', '锆', (4, 3)),
+    (41, 'Nb', '铌', (4, 4)), (42, 'Mo', '钼', (4, 5)), (43, 'Tc', '锝', (4, 6)), (44, 'Ru', '钌', (4, 7)),
+    (45, 'Rh', '铑', (4, 8)), (46, 'Pd', '钯', (4, 9)), (47, 'Ag', '银', (4, 10)), (48, 'Cd', '镉', (4, 11)),
+    (49, 'In', '铟', (4, 12)), (50, 'Sn', '锡', (4, 13)), (51, 'Sb', '锑', (4, 14)), (52, 'Te', '碲', (4, 15)),
+    (53, 'I', '碘', (4, 16)), (54, 'Xe', '氙', (4, 17)),
+    (55, 'Cs', '铯', (5, 0)), (56, 'Ba', '钡', (5, 1)), (57, 'La', '镧', (5, 2)), (72, 'Hf', '铪', (5, 3)),
+    (73, 'Ta', '钽', (5, 4)), (74, 'W', '钨', (5, 5)), (75, 'Re', '铼', (5, 6)), (76, 'Os', '锇', (5, 7)),
+    (77, 'Ir', '铱', (5, 8)), (78, 'Pt', '铂', (5, 9)), (79, 'Au', '金', (5, 10)), (80, 'Hg', '汞', (5, 11)),
+    (81, 'Tl', '铊', (5, 12)), (82, 'Pb', '铅', (5, 13)), (83, 'Bi', '铋', (5, 14)), (84, 'Po', '钋', (5, 15)),
+    (85, 'At', '砹', (5, 16)), (86, 'Rn', '氡', (5, 17)),
+    (87, 'Fr', '钫', (6, 0)), (88, 'Ra', '镭', (6, 1)), (89, 'Ac', '锕', (6, 2)), (104, 'Rf', '𬬻', (6, 3)),
+    (105, 'Db', '𬭊', (6, 4)), (106, 'Sg', '𬭳', (6, 5)), (107, 'Bh', '𬭶', (6, 6)), (108, 'Hs', '𬭸', (6, 7)),
+    (109, 'Mt', '鿔', (6, 8)), (110, 'Ds', '𫟼', (6, 9)), (111, 'Rg', '𬬭', (6, 10)), (112, 'Cn', '鿬', (6, 11)),
+    (113, 'Nh', '鉨', (6, 12)), (114, 'Fl', '鈇', (6, 13)), (115, 'Mc', '镆', (6, 14)), (116, 'Lv', '鉝', (6, 15)),
+    (117, 'Ts', '石田', (6, 16)), (118, 'Og', '气奥', (6, 17)),
+    (58, 'Ce', '铈', (7, 3)), (59, 'Pr', '镨', (7, 4)), (60, 'Nd', '钕', (7, 5)), (61, 'Pm', '钷', (7, 6)),
+    (62, 'Sm', '钐', (7, 7)), (63, 'Eu', '铕', (7, 8)), (64, 'Gd', '钆', (7, 9)), (65, 'Tb', '铽', (7, 10)),
+    (66, 'Dy', '镝', (7, 11)), (67, 'Ho', '钬', (7, 12)), (68, 'Er', '铒', (7, 13)), (69, 'Tm', '铥', (7, 14)),
+    (70, 'Yb', '镱', (7, 15)), (71, 'Lu', '镥', (7, 16)),
+    (90, 'Th', '钍', (8, 3)), (91, 'Pa', '镤', (8, 4)), (92, 'U', '铀', (8, 5)), (93, 'Np', '镎', (8, 6)),
+    (94, 'Pu', '钚', (8, 7)), (95, 'Am', '镅', (8, 8)), (96, 'Cm', '锔', (8, 9)), (97, 'Bk', '锫', (8, 10)),
+    (98, 'Cf', '锎', (8, 11)), (99, 'Es', '锿', (8, 12)), (100, 'Fm', '镄', (8, 13)), (101, 'Md', '钔', (8, 14)),
+    (102, 'No', '锘', (8, 15)), (103, 'Lr', '铹', (8, 16))
+]
+
+class PeriodicTableWidget(QWidget):
+    # db/xdb 为 None 表示仍在后台加载，对应分类下的元素全部灰显
+    def __init__(self, db, xdb, get_category, on_element_clicked):
+        super().__init__()
+        self.db = db
+        self.xdb = xdb
+        self.get_category = get_category
+        self.on_element_clicked = on_element_clicked
+        self.init_ui()
+
+    def init_ui(self):
+        grid = QGridLayout()
+        self.btns = {}
+        for num, en, zh, (row, col) in ELEMENTS:
+            btn = QPushButton(f"{zh}\n{en}\n{num}")
+            btn.setFixedSize(60, 80)
+            btn.clicked.connect(lambda _, e=en: self.on_element_clicked(e))
+            grid.addWidget(btn, row, col)
+            self.btns[en] = btn
+        self.setLayout(grid)
+        self.update_btns()
+
+    def update_btns(self):
+        # 根据分类灰色显示无数据元素
+        category = self.get_category()
+        db = self.db if category == "磁性形状因子" else self.xdb
+        if db is None:
+            for btn in self.btns.values():
+                btn.setEnabled(False)
+                btn.setStyleSheet("color: gray; background-color: lightgray;")
+            return
+        if category == "磁性形状因子":
+            valid_elems = self.db.registry.element_set
+        else:
+            valid_elems = self.xdb.get_all_elements()
+        for en, btn in self.btns.items():
+            if en in valid_elems:
+                btn.setEnabled(True)
+                btn.setStyleSheet("color: black; background-color: white;")
+            else:
+                btn.setEnabled(True)
+                btn.setStyleSheet("color: gray; background-color: lightgray;")
+
+    def set_databases(self, db=None, xdb=None):
+        if db is not None:
+            self.db = db
+        if xdb is not None:
+            self.xdb = xdb
+        self.update_btns()
+
+DEFAULT_MAX_POINTS = 5_000_000  # 超过此点数的绘图请求需要确认
+# 实时调节滑块：λ 以 0.001 Å、θ 以 0.1° 为一格；点数超过 LIVE_MAX_POINTS 时拖动中不重算，松开后按“绘图”流程计算
+WAVELENGTH_SLIDER = (0.1, 10.0, 1000)  # (最小, 最大, 每Å格数)
+THETA_SLIDER = (0.0, 180.0, 10)
+DEFAULT_SLIDER_WAVELENGTH = 1.5
+LIVE_MAX_POINTS = 200_000
+# 多离子对比：系列显示名、各 j类型的线型、离子多于此数时图例只列出部分离子
+SERIES_NAMES = {"3d": "3d 过渡元素", "4d": "4d 元素", "rare earth": "稀土离子", "actinide": "锕系离子"}
+JTYPE_LINESTYLES = {"j0": "-", "j2": "--", "j4": ":", "j6": "-."}
+COMPARE_LEGEND_IONS = 12
+DEFAULT_TOF_RANGE = "1000:20000:2"
+
+DATA_FILTERS = "数据文件 (*.dat);;NumPy数组 (*.npy);;NumPy压缩包 (*.npz);;二进制float64 (*.bin)"
+FILTER_EXT = {
+    "数据文件 (*.dat)": ".dat",
+    "NumPy数组 (*.npy)": ".npy",
+    "NumPy压缩包 (*.npz)": ".npz",
+    "二进制float64 (*.bin)": ".bin",
+}
+
+def load_magnetic(data_dir, progress=None):
+    # 在工作线程中加载磁性形状因子数据库与计算引擎
+    from data_manager import MagneticFormFactorDB
+    from form_factor_engine import MagneticFormFactorEngine
+    db = MagneticFormFactorDB(data_dir)
+    return db, MagneticFormFactorEngine(db)
+
+def load_xray(data_dir, progress=None):
+    from data_manager import XRayFormFactorDB
+    from form_factor_engine import XRayFormFactorEngine
+    xdb = XRayFormFactorDB(data_dir)
+    return xdb, XRayFormFactorEngine(xdb)
+
+def write_plot_data(dat_path, plot_data, progress=None):
+    # 在工作线程中导出 last_plot_data
+    from exporters import export_magnetic, export_xray, export_comparison, export_dipole
+    if plot_data[0] == "magnetic":
+        _, elem, valence, curves = plot_data
+        export_magnetic(dat_path, elem, valence, curves[0][1],
+                        [jt for jt, _, _ in curves], [y for _, _, y in curves], progress=progress)
+    elif plot_data[0] == "xray":
+        _, elem, method, x, y = plot_data
+        export_xray(dat_path, elem, method, x, y, progress=progress)
+    elif plot_data[0] == "compare":
+        _, s, curves, ys = plot_data
+        export_comparison(dat_path, s, curves, ys, progress=progress)
+    elif plot_data[0] == "dipole":
+        _, s, ions, labels, f = plot_data
+        export_dipole(dat_path, s, ions, labels, f, progress=progress)
+    elif plot_data[0] == "tof":
+        from ff_tof import export_tof
+        _, banks, tof, ions, jtypes, values = plot_data
+        export_tof(dat_path, banks, tof, ions, jtypes, values, progress=progress)
+    elif plot_data[0] == "mixture":
+        from exporters import export_mixtures
+        _, s, labels, f = plot_data
+        export_mixtures(dat_path, s, labels, f, progress=progress)
+    return dat_path
+
+INSTRUCTION_TEXT = """
+【Magia_Form_Factor_Viewer: 磁性Form Factor可视化工具 使用说明】
+1. 在左侧周期表中点击元素，若有数据则可选择价态和j类型，若无数据则提示。
+2. 输入波长（单位Å）、θ范围和步长。
+3. 选择价态和j类型（可多选），点击“绘图”显示曲线。
+4. 可勾选“对数坐标”切换横轴为对数。
+5. 可导出当前曲线为PNG图片和数据文件（.dat文本，或.npy/.npz/.bin二进制，.bin附带.json说明）。
+6. 切换“X射线形状因子”分类后，周期表灰色表示无数据元素，点击后弹窗提示；
+   勾选“叠加高斯拟合曲线”可同时显示 Xray_gaussian_coeffs.txt 中 Cromer–Mann 系数的闭式曲线。
+7. 计算与导出在后台进行，可随时点击“取消”；点数超过“最大点数”时会先询问。
+8. “性能统计”显示解析、计算、绘图、导出各阶段耗时与点数/字节数，可开启 cProfile 采样；
+   设置环境变量 FF_PERF_LOG=文件路径 可将每个阶段的耗时逐行记录为 JSON。
+9. 绘图后可拖动 λ 与 θ 滑块实时查看曲线变化，或在输入框中修改后按回车直接重绘，无需再点“绘图”。
+10. 勾选“多离子对比”后，点击周期表元素即加入其全部价态，或选择系列整体加入；
+    “绘图”一次计算全部离子并叠加显示（颜色区分离子、线型区分j类型），导出为一张宽表。
+11. 勾选“偶极近似”后绘制 F = <j0> + C2·<j2> + C4·<j4> + C6·<j6>（C2 = 2/g − 1），
+    g 可写多个值（如 1.5, 2）或范围 min:max:step，全部 g 一次计算；与多离子对比同时勾选时计算列表中的全部离子。
+12. 勾选“飞行时间 (TOF)”后选择 bank 参数文件（每行 L1 L2 2θ，单位米、米、度）并输入 TOF 范围（μs），
+    “绘图”在全部 bank × 通道上计算当前离子的所选j类型，每个 bank 一条曲线（横轴为 TOF）；
+    填写 Δt/t 时改用对数通道，TOF 范围写作 min:max。
+13. 勾选“混合价态 / 部分占位”后输入位点组成，如 Fe2:0.5 Fe3:0.5（可写 Fe3@j2:0.1 指定j类型），
+    多个组成用分号分隔；权重可含 x（如 Mn3:1-x Mn4:x），并在 x 框中给出取值或 min:max:step 得到掺杂系列。
+    偶极近似、TOF 与混合价态三种模式互斥，勾选其一会取消其他；TOF 与混合价态也会取消多离子对比。
+"""
+
+class HelpDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)  
+        self.setWindowTitle("操作说明") 
+        self.resize(1000, 600)  
+        layout = QVBoxLayout(self) 
+        text_edit = QTextEdit() 
+        text_edit.setReadOnly(True) 
+        text_edit.setPlainText(INSTRUCTION_TEXT)  
+        text_edit.setFont(QFont("Consolas", 12)) 
+        layout.addWidget(text_edit) 
+
+class PerfDialog(QDialog):
+    # 调试面板：各阶段耗时与计数（每秒刷新），cProfile 采样开关，可保存为 JSON
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("性能统计")
+        self.resize(900, 600)
+        layout = QVBoxLayout(self)
+        self.text_edit = QTextEdit()
+        self.text_edit.setReadOnly(True)
+        self.text_edit.setFont(QFont("Consolas", 10))
+        layout.addWidget(self.text_edit)
+        self.profile_text = ""
+        btn_box = QHBoxLayout()
+        self.profile_btn = QPushButton()
+        self.profile_btn.clicked.connect(self.toggle_profile)
+        reset_btn = QPushButton("清零")
+        reset_btn.clicked.connect(self.on_reset)
+        save_btn = QPushButton("保存 JSON")
+        save_btn.clicked.connect(self.on_save)
+        for btn in (self.profile_btn, reset_btn, save_btn):
+            btn_box.addWidget(btn)
+        layout.addLayout(btn_box)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def refresh(self):
+        self.profile_btn.setText("停止 cProfile" if PERF.profiling else "开始 cProfile")
+        text = PERF.summary_text()
+        if self.profile_text:
+            text += "\n\ncProfile（按累计时间）：\n" + self.profile_text
+        if text != self.text_edit.toPlainText():
+            self.text_edit.setPlainText(text)
+
+    def toggle_profile(self):
+        if not PERF.profiling:
+            PERF.start_profile()
+            self.profile_text = ""
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "保存 cProfile 结果（可取消）", "", "pstats 文件 (*.prof)")
+            self.profile_text = PERF.stop_profile(path or None)
+        self.refresh()
+
+    def on_reset(self):
+        PERF.reset()
+        self.profile_text = ""
+        self.refresh()
+
+    def on_save(self):
+        path, _ = QFileDialog.getSaveFileName(self, "保存性能统计", "", "JSON文件 (*.json)")
+        if path:
+            import json
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(PERF.snapshot(), f, ensure_ascii=False, indent=1)
+
+class MainWindow(QWidget):
+    def __init__(self):
+        super().__init__()
+        # 数据库在窗口显示后由后台线程加载，加载完成前为 None
+        self.db = None
+        self.xdb = None
+        self.engine = None
+        self.xengine = None
+        self._gaussian_xengine = None
+        self.startup_times = {}
+        self.perf_dialog = None
+        self._loaders = []
+        self.selected_element = None
+        self.selected_valence = None
+        self.selected_jtypes = []
+        self.current_category = "磁性形状因子"
+        self.last_plot_data = None
+        self.thread_pool = QThreadPool.globalInstance()
+        self._worker = None
+        self.view = None
+        self.curve_cache = None
+        self.fig = None
+        self.canvas = None
+        self.init_ui()
+        # 进入事件循环后（窗口已显示）再开始加载数据
+        QTimer.singleShot(0, self.start_loading)
+
+    def init_ui(self):
+        self.setWindowTitle("Magia_Factor_Viewer")
+        main_layout = QHBoxLayout()
+
+        # 分类选择
+        left_layout = QVBoxLayout()
+        category_label = QLabel("请选择分类：")
+        category_label.setFont(QFont("Arial", 14))
+        self.category_combo = QComboBox()
+        self.category_combo.addItems(["磁性形状因子", "X射线形状因子"])
+        self.category_combo.setFont(QFont("Arial", 14))
+        self.category_combo.setFixedHeight(40)
+        self.category_combo.setMinimumWidth(220)
+        self.category_combo.currentTextChanged.connect(self.on_category_changed)
+        left_layout.addWidget(category_label)
+        left_layout.addWidget(self.category_combo)
+
+        # 周期表
+        self.pt_widget = PeriodicTableWidget(self.db, self.xdb, self.get_category, self.on_element_clicked)
+        left_layout.addWidget(self.pt_widget, 2)
+        main_layout.addLayout(left_layout, 2)
+
+        # 右侧参数区
+        param_layout = QVBoxLayout()
+
+        # 使用说明按钮
+        help_btn = QPushButton("使用说明")
+        help_btn.clicked.connect(self.show_help)
+        perf_btn = QPushButton("性能统计")
+        perf_btn.clicked.connect(self.show_perf)
+        top_box = QHBoxLayout()
+        top_box.addStretch(1)
+        top_box.addWidget(perf_btn)
+        top_box.addWidget(help_btn)
+        param_layout.addLayout(top_box)
+
+        # method信息
+        self.method_label = QLabel()
+        self.method_label.setFont(QFont("Arial", 10))
+        param_layout.addWidget(self.method_label)
+        # X射线分类：叠加 xray_fitting 拟合的 Cromer–Mann 闭式曲线，与 PCHIP 插值对照
+        self.gauss_cb = QCheckBox("叠加高斯拟合曲线 (Cromer–Mann)")
+        self.gauss_cb.toggled.connect(self.on_gauss_toggled)
+        self.gauss_cb.hide()
+        param_layout.addWidget(self.gauss_cb)
+
+        # 波长、θ范围等，仅磁性形状因子分类显示
+        self.param_group = QWidget()
+        param_form = QVBoxLayout()
+        w_box = QHBoxLayout()
+        w_box.addWidget(QLabel("波长 λ (Å):"))
+        self.w_input = QLineEdit()
+        w_box.addWidget(self.w_input)
+        param_form.addLayout(w_box)
+
+        theta_box = QHBoxLayout()
+        theta_box.addWidget(QLabel("θ范围 (度):"))
+        self.theta_min = QLineEdit("0")
+        self.theta_max = QLineEdit("80")
+        self.theta_step = QLineEdit("0.05")
+        theta_box.addWidget(self.theta_min)
+        theta_box.addWidget(QLabel("~"))
+        theta_box.addWidget(self.theta_max)
+        theta_box.addWidget(QLabel("步长:"))
+        theta_box.addWidget(self.theta_step)
+        param_form.addLayout(theta_box)
+
+        # 实时调节：拖动时只重算当前曲线并重绘数据层，与上面的输入框双向同步
+        live_box = QGridLayout()
+        self.w_slider = self._make_slider(WAVELENGTH_SLIDER, DEFAULT_SLIDER_WAVELENGTH)
+        self.theta_min_slider = self._make_slider(THETA_SLIDER, 0.0)
+        self.theta_max_slider = self._make_slider(THETA_SLIDER, 80.0)
+        for row, (text, slider) in enumerate((("λ:", self.w_slider), ("θmin:", self.theta_min_slider),
+                                              ("θmax:", self.theta_max_slider))):
+            live_box.addWidget(QLabel(text), row, 0)
+            live_box.addWidget(slider, row, 1)
+        param_form.addLayout(live_box)
+        self._live_timer = QTimer(self)
+        self._live_timer.setSingleShot(True)
+        self._live_timer.timeout.connect(self._live_update)
+
+        limit_box = QHBoxLayout()
+        limit_box.addWidget(QLabel("最大点数:"))
+        self.max_points_input = QLineEdit(str(DEFAULT_MAX_POINTS))
+        limit_box.addWidget(self.max_points_input)
+        param_form.addLayout(limit_box)
+
+        self.valence_combo = QComboBox()
+        self.valence_combo.currentIndexChanged.connect(self.on_valence_changed)
+        param_form.addWidget(QLabel("选择价态:"))
+        param_form.addWidget(self.valence_combo)
+
+        self.j0_cb = QCheckBox("j0")
+        self.j2_cb = QCheckBox("j2")
+        self.j4_cb = QCheckBox("j4")
+        self.j6_cb = QCheckBox("j6")
+        jtype_box = QHBoxLayout()
+        for cb in [self.j0_cb, self.j2_cb, self.j4_cb, self.j6_cb]:
+            jtype_box.addWidget(cb)
+        param_form.addWidget(QLabel("选择j类型:"))
+        param_form.addLayout(jtype_box)
+
+        self.log_cb = QCheckBox("对数坐标（横轴s）")
+        param_form.addWidget(self.log_cb)
+
+        # 偶极近似：绘制组合后的 F(s)，可一次给出多个 g，此时不使用j类型选择
+        self.dipole_cb = QCheckBox("偶极近似 F = <j0> + C2·<j2> + C4·<j4> + C6·<j6>")
+        self.dipole_cb.toggled.connect(lambda checked: self.dipole_group.setVisible(checked))
+        param_form.addWidget(self.dipole_cb)
+        self.dipole_group = QWidget()
+        dipole_box = QHBoxLayout()
+        dipole_box.setContentsMargins(0, 0, 0, 0)
+        self.g_input = QLineEdit("2")
+        self.g_input.setToolTip("Landé g 因子，C2 = 2/g − 1；多个值用逗号分隔，或写作 min:max:step")
+        self.c4_input = QLineEdit("0")
+        self.c6_input = QLineEdit("0")
+        for text, widget, stretch in (("g:", self.g_input, 2), ("C4:", self.c4_input, 1), ("C6:", self.c6_input, 1)):
+            dipole_box.addWidget(QLabel(text))
+            dipole_box.addWidget(widget, stretch)
+        self.dipole_group.setLayout(dipole_box)
+        self.dipole_group.hide()
+        param_form.addWidget(self.dipole_group)
+
+        # 飞行时间模式：bank 参数文件（每行 L1 L2 2θ）× TOF 通道，代替 λ/θ 网格
+        self.tof_cb = QCheckBox("飞行时间 (TOF)")
+        self.tof_cb.toggled.connect(lambda checked: self.tof_group.setVisible(checked))
+        param_form.addWidget(self.tof_cb)
+        self.tof_group = QWidget()
+        tof_form = QVBoxLayout()
+        tof_form.setContentsMargins(0, 0, 0, 0)
+        bank_box = QHBoxLayout()
+        self.bank_input = QLineEdit()
+        self.bank_input.setPlaceholderText("bank 文件：每行 L1 L2 2θ（米、米、度）")
+        bank_btn = QPushButton("浏览")
+        bank_btn.clicked.connect(self.on_browse_banks)
+        bank_box.addWidget(self.bank_input, 1)
+        bank_box.addWidget(bank_btn)
+        tof_form.addLayout(bank_box)
+        channel_box = QHBoxLayout()
+        channel_box.addWidget(QLabel("TOF (μs):"))
+        self.tof_input = QLineEdit(DEFAULT_TOF_RANGE)
+        self.tof_input.setToolTip("min:max:step；填写 Δt/t 时为 min:max")
+        channel_box.addWidget(self.tof_input, 2)
+        channel_box.addWidget(QLabel("Δt/t:"))
+        self.dt_over_t_input = QLineEdit()
+        self.dt_over_t_input.setPlaceholderText("留空为等间隔")
+        self.dt_over_t_input.setToolTip("对数通道的 Δt/t（如 0.001），留空时按 step 等间隔")
+        channel_box.addWidget(self.dt_over_t_input, 1)
+        tof_form.addLayout(channel_box)
+        self.tof_group.setLayout(tof_form)
+        self.tof_group.hide()
+        param_form.addWidget(self.tof_group)
+
+        # 混合价态 / 部分占位：每个组成为若干离子按占位加权，多个组成（或 x 系列）一次计算
+        self.mixture_cb = QCheckBox("混合价态 / 部分占位")
+        self.mixture_cb.toggled.connect(lambda checked: self.mixture_group.setVisible(checked))
+        param_form.addWidget(self.mixture_cb)
+        self.mixture_group = QWidget()
+        mixture_box = QHBoxLayout()
+        mixture_box.setContentsMargins(0, 0, 0, 0)
+        self.site_input = QLineEdit("Fe2:0.5 Fe3:0.5")
+        self.site_input.setToolTip("组成如 Fe2:0.5 Fe3:0.5，多个组成用分号分隔；权重可含 x，如 Mn3:1-x Mn4:x")
+        self.x_input = QLineEdit()
+        self.x_input.setPlaceholderText("min:max:step")
+        self.x_input.setToolTip("掺杂系列 x 的取值：逗号分隔或 min:max:step；组成中不含 x 时可留空")
+        for text, widget, stretch in (("组成:", self.site_input, 3), ("x:", self.x_input, 1)):
+            mixture_box.addWidget(QLabel(text))
+            mixture_box.addWidget(widget, stretch)
+        self.mixture_group.setLayout(mixture_box)
+        self.mixture_group.hide()
+        param_form.addWidget(self.mixture_group)
+
+        # 多离子对比：周期表点击改为把该元素全部价态加入列表
+        self.compare_cb = QCheckBox("多离子对比")
+        self.compare_cb.toggled.connect(self.on_compare_toggled)
+        param_form.addWidget(self.compare_cb)
+        self.compare_group = QWidget()
+        compare_form = QVBoxLayout()
+        compare_form.setContentsMargins(0, 0, 0, 0)
+        series_box = QHBoxLayout()
+        self.series_combo = QComboBox()
+        add_series_btn = QPushButton("加入系列")
+        add_series_btn.clicked.connect(self.on_add_series)
+        series_box.addWidget(self.series_combo, 1)
+        series_box.addWidget(add_series_btn)
+        compare_form.addLayout(series_box)
+        self.compare_list = QListWidget()
+        self.compare_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.compare_list.setMaximumHeight(120)
+        compare_form.addWidget(self.compare_list)
+        list_box = QHBoxLayout()
+        remove_btn = QPushButton("移除所选")
+        remove_btn.clicked.connect(self.on_remove_compare)
+        clear_btn = QPushButton("清空")
+        clear_btn.clicked.connect(self.compare_list.clear)
+        list_box.addWidget(remove_btn)
+        list_box.addWidget(clear_btn)
+        compare_form.addLayout(list_box)
+        self.compare_group.setLayout(compare_form)
+        self.compare_group.hide()
+        param_form.addWidget(self.compare_group)
+
+        # 偶极近似、TOF、混合价态三种模式互斥；TOF 与混合价态也不与多离子对比同时使用
+        # （偶极近似与多离子对比可同时勾选，此时计算对比列表中的全部离子）
+        modes = {self.dipole_cb: (self.tof_cb, self.mixture_cb),
+                 self.tof_cb: (self.dipole_cb, self.mixture_cb, self.compare_cb),
+                 self.mixture_cb: (self.dipole_cb, self.tof_cb, self.compare_cb),
+                 self.compare_cb: (self.tof_cb, self.mixture_cb)}
+        for cb, others in modes.items():
+            cb.toggled.connect(lambda checked, others=others: self._uncheck_modes(checked, others))
+        self.param_group.setLayout(param_form)
+        param_layout.addWidget(self.param_group)
+
+        # 绘图与导出按钮
+        btn_box = QHBoxLayout()
+        self.plot_btn = QPushButton("绘图")
+        self.export_btn = QPushButton("导出")
+        btn_box.addWidget(self.plot_btn)
+        btn_box.addWidget(self.export_btn)
+        param_layout.addLayout(btn_box)
+
+        # 后台任务进度与取消
+        progress_box = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.setEnabled(False)
+        progress_box.addWidget(self.progress_bar)
+        progress_box.addWidget(self.cancel_btn)
+        param_layout.addLayout(progress_box)
+
+        # matplotlib画布在首次绘图时才创建，之前显示占位文字
+        plot_group = QGroupBox("Form Factor 曲线")
+        self.plot_layout = QVBoxLayout()
+        self.canvas_placeholder = QLabel("数据加载中……")
+        self.canvas_placeholder.setAlignment(Qt.AlignCenter)
+        self.plot_layout.addWidget(self.canvas_placeholder)
+        plot_group.setLayout(self.plot_layout)
+        param_layout.addWidget(plot_group, 2)
+
+        main_layout.addLayout(param_layout, 1)
+        self.setLayout(main_layout)
+
+        # 事件绑定
+        self.plot_btn.clicked.connect(self.on_plot)
+        self.export_btn.clicked.connect(self.on_export)
+        self.cancel_btn.clicked.connect(self.on_cancel)
+        for slider in (self.w_slider, self.theta_min_slider, self.theta_max_slider):
+            slider.valueChanged.connect(lambda _value, s=slider: self.on_slider_moved(s))
+            slider.sliderPressed.connect(self.on_slider_pressed)
+            slider.sliderReleased.connect(self.on_slider_released)
+        for edit in (self.w_input, self.theta_min, self.theta_max, self.theta_step):
+            edit.editingFinished.connect(self.on_grid_edited)
+
+        self.update_param_visibility()
+
+    @staticmethod
+    def _make_slider(spec, value):
+        lo, hi, per_unit = spec
+        slider = QSlider(Qt.Horizontal)
+        slider.setRange(int(round(lo * per_unit)), int(round(hi * per_unit)))
+        slider.setValue(int(round(value * per_unit)))
+        return slider
+
+    def start_loading(self):
+        self.startup_times["窗口显示"] = time.perf_counter() - STARTUP_T0
+        for name, fn, data_dir, on_loaded in (
+            ("磁性数据", load_magnetic, MAGNETIC_DATA_DIR, self._on_magnetic_loaded),
+            ("X射线数据", load_xray, XRAY_DATA_DIR, self._on_xray_loaded),
+        ):
+            worker = Worker(fn, data_dir)
+            worker.signals.finished.connect(lambda result, n=name, f=on_loaded: self._on_loaded(n, f, result))
+            worker.signals.failed.connect(
+                lambda msg, n=name: QMessageBox.warning(self, "警告", f"{n}加载失败：{msg}"))
+            self._loaders.append(worker)
+            self.thread_pool.start(worker)
+
+    def _on_loaded(self, name, on_loaded, result):
+        self.startup_times[name] = time.perf_counter() - STARTUP_T0
+        on_loaded(*result)
+        if self.db is not None and self.xdb is not None:
+            self._loaders = []
+            self.canvas_placeholder.setText("请选择元素")
+            self.report_startup()
+
+    def _on_magnetic_loaded(self, db, engine):
+        from curve_cache import CurveCache
+        self.db, self.engine = db, engine
+        self.curve_cache = CurveCache()
+        self.pt_widget.set_databases(db=db)
+        for series in db.get_series():
+            self.series_combo.addItem(SERIES_NAMES.get(series, series), series)
+
+    def _on_xray_loaded(self, xdb, xengine):
+        self.xdb, self.xengine = xdb, xengine
+        self.pt_widget.set_databases(xdb=xdb)
+
+    def report_startup(self):
+        # 启动耗时报告（自进程导入本模块起计时），输出到标准错误
+        text = "，".join(f"{k} {v:.3f} s" for k, v in self.startup_times.items())
+        for k, v in self.startup_times.items():
+            PERF.record(f"startup.{k}", v)
+        print(f"[启动耗时] {text}", file=sys.stderr)
+
+    def ensure_canvas(self):
+        # 首次绘图时导入 matplotlib 并创建画布
+        if self.canvas is not None:
+            return
+        t0 = time.perf_counter()
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+        from matplotlib.figure import Figure
+        self.fig = Figure(figsize=(5, 4), dpi=100)
+        self.canvas = FigureCanvas(self.fig)
+        # 所有重绘（含缩放、平移与分级显示更新触发的 draw_idle）都经过 canvas.draw
+        draw = self.canvas.draw
+
+        def timed_draw(*args, **kwargs):
+            with PERF.span("draw", points=sum(len(line.get_xdata()) for ax in self.fig.axes for line in ax.lines)):
+                draw(*args, **kwargs)
+        self.canvas.draw = timed_draw
+        self.plot_layout.removeWidget(self.canvas_placeholder)
+        self.canvas_placeholder.deleteLater()
+        self.plot_layout.addWidget(NavigationToolbar(self.canvas, self))
+        self.plot_layout.addWidget(self.canvas)
+        from plot_view import CurveView
+        self.view = CurveView(self.fig)
+        self.startup_times["创建画布"] = time.perf_counter() - t0
+
+    def get_category(self):
+        return self.category_combo.currentText()
+
+    def on_category_changed(self, text):
+        self.current_category = text
+        self.selected_element = None
+        self.selected_valence = None
+        self.method_label.setText("")
+        self.clear_figure(redraw=True)
+        self.pt_widget.update_btns()
+        self.update_param_visibility()
+
+    def update_param_visibility(self):
+        # 仅磁性形状因子分类显示参数区
+        if self.get_category() == "磁性形状因子":
+            self.param_group.show()
+            self.gauss_cb.hide()
+            self.plot_btn.setText("绘图")
+        else:
+            self.param_group.hide()
+            self.gauss_cb.show()
+            self.plot_btn.setText("显示X射线散射因子")
+
+    def gaussian_xray_engine(self):
+        # 首次使用时读取拟合系数表，读取失败时提示并取消勾选
+        if self._gaussian_xengine is None:
+            from form_factor_engine import GaussianXRayEngine
+            try:
+                self._gaussian_xengine = GaussianXRayEngine.from_file(XRAY_GAUSSIAN_COEFFS)
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "警告", f"无法读取高斯拟合系数表：{e}")
+                self.gauss_cb.setChecked(False)
+        return self._gaussian_xengine
+
+    def on_gauss_toggled(self, checked):
+        if self.get_category() != "磁性形状因子" and self.selected_element and self.data_ready():
+            self.on_element_clicked(self.selected_element)
+
+    def on_element_clicked(self, elem):
+        if not self.data_ready():
+            return
+        if self.get_category() == "磁性形状因子" and self.compare_cb.isChecked():
+            valences = self.db.get_valences(elem)
+            if not valences:
+                QMessageBox.information(self, "提示", "暂无数据，亟需补充。")
+                return
+            self.add_compare_ions([(elem, v) for v in valences])
+            return
+        self.selected_element = elem
+        if self.get_category() == "磁性形状因子":
+            valences = self.db.get_valences(elem)
+            if not valences:
+                QMessageBox.information(self, "提示", "暂无数据，亟需补充。")
+                self.valence_combo.clear()
+                return
+            self.method_label.setText("")
+            self.clear_figure(redraw=True)
+            # 填充价态会触发 on_valence_changed，曲线已缓存时立即重绘
+            self.valence_combo.clear()
+            self.valence_combo.addItems(valences)
+        else:
+            # X射线形状因子
+            if not self.xdb.has_data(elem):
+                QMessageBox.information(self, "提示", "暂无数据，亟待补充")
+                self.method_label.setText("")
+                self.clear_figure(redraw=True)
+                return
+            method = self.xdb.get_method(elem)
+            x, y = self.xdb.get_points(elem)
+            self.method_label.setText(f"元素采用的method为：{method}")
+            self.ensure_canvas()
+            import numpy as np
+            s_fine = np.linspace(x[0], x[-1], 2000)
+            gauss = self.gaussian_xray_engine() if self.gauss_cb.isChecked() else None
+            fitted = [("Gaussian fit", s_fine, gauss.evaluate_element(elem, s_fine), {"linestyle": "--"})] \
+                if gauss is not None and gauss.has(elem) else []
+            if self.xengine.has(elem):
+                # 分立数据点 + 单调三次样条插值曲线（+ 高斯拟合曲线）
+                curves = [("PCHIP", s_fine, self.xengine.evaluate_element(elem, s_fine), {})] + fitted + \
+                         [("data", x, y, {"linestyle": "none", "marker": "o", "markersize": 4})]
+            else:
+                curves = fitted + [(None if not fitted else "data", x, y, {"marker": "o"})]
+            self.view.show(curves, title=f"{elem} X-ray scattering factor", xlabel=r"(sinθ)/λ (Å⁻¹)",
+                           ylabel="scattering factor (count)", legend=len(curves) > 1)
+            self.last_plot_data = ("xray", elem, method, x, y)
+
+    def on_valence_changed(self, idx):
+        elem = self.selected_element
+        if not elem:
+            return
+        valence = self.valence_combo.currentText()
+        self.selected_valence = valence
+        jtypes = self.db.get_j_types(elem, valence)
+        self.j0_cb.setEnabled("j0" in jtypes)
+        self.j2_cb.setEnabled("j2" in jtypes)
+        self.j4_cb.setEnabled("j4" in jtypes)
+        self.j6_cb.setEnabled("j6" in jtypes)
+        for cb, jt in zip([self.j0_cb, self.j2_cb, self.j4_cb, self.j6_cb], ["j0", "j2", "j4", "j6"]):
+            cb.setChecked(jt in jtypes)
+        grid = self._read_grid()
+        if grid is not None and self._worker is None:
+            self._plot_from_cache(elem, valence, self._selected_jtypes(), grid)
+
+    def _selected_jtypes(self):
+        jtypes = []
+        for cb, jt in zip([self.j0_cb, self.j2_cb, self.j4_cb, self.j6_cb], ["j0", "j2", "j4", "j6"]):
+            if cb.isChecked() and cb.isEnabled():
+                jtypes.append(jt)
+        return jtypes
+
+    def _read_grid(self):
+        # 返回 (λ, θmin, θmax, θstep)，输入无效时返回 None
+        try:
+            w = float(self.w_input.text())
+            theta_min = float(self.theta_min.text())
+            theta_max = float(self.theta_max.text())
+            theta_step = float(self.theta_step.text())
+        except ValueError:
+            return None
+        if w <= 0 or theta_min < 0 or theta_max > 180 or theta_min >= theta_max or theta_step <= 0:
+            return None
+        return (w, theta_min, theta_max, theta_step)
+
+    def _plot_from_cache(self, elem, valence, jtypes, grid):
+        # 所选曲线都已缓存时直接重绘，返回是否成功
+        jtypes = [jt for jt in jtypes if self.engine.has(elem, valence, jt)]
+        curves = [self.curve_cache.get(elem, valence, jt, grid) for jt in jtypes]
+        if not jtypes or any(y is None for y in curves):
+            return False
+        self._draw_magnetic(elem, valence, self.curve_cache.get_grid(grid), jtypes, curves)
+        return True
+
+    def _on_curves_ready(self, elem, valence, grid, jtypes, cached, result):
+        # 直接用本次计算结果与请求时取出的缓存曲线绘图；缓存只作存储，大网格时放入新曲线可能淘汰本次的其他曲线
+        s, computed, curves = result
+        ready = dict(cached)
+        ready.update(zip(computed, curves))
+        for jt, y in zip(computed, curves):
+            s = self.curve_cache.put(elem, valence, jt, grid, s, y)
+        jtypes = [jt for jt in jtypes if jt in ready]
+        if not jtypes:
+            QMessageBox.information(self, "提示", "所选j类型没有数据。")
+            return
+        self._draw_magnetic(elem, valence, s, jtypes, [ready[jt] for jt in jtypes])
+
+    def data_ready(self):
+        if self.get_category() == "磁性形状因子":
+            return self.db is not None
+        return self.xdb is not None
+
+    def _uncheck_modes(self, checked, others):
+        if checked:
+            for cb in others:
+                cb.setChecked(False)
+
+    # ---------- 多离子对比 ----------
+    def on_compare_toggled(self, checked):
+        self.compare_group.setVisible(checked)
+        # 对比模式下 j类型不受单个离子限制
+        if checked:
+            for cb in (self.j0_cb, self.j2_cb, self.j4_cb, self.j6_cb):
+                cb.setEnabled(True)
+        elif self.selected_element and self.valence_combo.count():
+            self.on_valence_changed(self.valence_combo.currentIndex())
+
+    def compare_ions(self):
+        return [tuple(self.compare_list.item(k).data(Qt.UserRole)) for k in range(self.compare_list.count())]
+
+    def add_compare_ions(self, ions):
+        present = set(self.compare_ions())
+        for elem, valence in ions:
+            if (elem, valence) not in present:
+                self.compare_list.addItem(f"{elem}{valence}+")
+                self.compare_list.item(self.compare_list.count() - 1).setData(Qt.UserRole, [elem, valence])
+                present.add((elem, valence))
+
+    def on_add_series(self):
+        if self.db is None or self.series_combo.currentIndex() < 0:
+            return
+        self.add_compare_ions(self.db.get_series_ions(self.series_combo.currentData()))
+
+    def on_remove_compare(self):
+        for item in self.compare_list.selectedItems():
+            self.compare_list.takeItem(self.compare_list.row(item))
+
+    def _plot_comparison(self):
+        ions = self.compare_ions()
+        jtypes = [jt for cb, jt in zip([self.j0_cb, self.j2_cb, self.j4_cb, self.j6_cb], ["j0", "j2", "j4", "j6"])
+                  if cb.isChecked()]
+        if not ions or not jtypes:
+            QMessageBox.warning(self, "警告", "请先加入要对比的离子并选择j类型。")
+            return
+        grid = self._read_grid()
+        if grid is None:
+            QMessageBox.warning(self, "警告", "请输入有效的波长和θ范围参数。")
+            return
+        from form_factor_engine import evaluate_ions, grid_size
+        n_values = grid_size(*grid[1:]) * len(ions) * len(jtypes)
+        if not self._confirm_points(n_values, f"共 {len(ions)} 个离子 × {len(jtypes)} 种j类型，"):
+            return
+        self._start_worker(lambda result: self._draw_comparison(*result),
+                           evaluate_ions, self.engine, ions, jtypes, *grid)
+
+    def _confirm_points(self, n_values, what=""):
+        # 点数超过“最大点数”时询问是否继续；what 为点数前的说明（如“共 3 个离子 × 2 种j类型，”）
+        try:
+            max_points = int(float(self.max_points_input.text()))
+        except ValueError:
+            max_points = DEFAULT_MAX_POINTS
+        if n_values <= max_points:
+            return True
+        answer = QMessageBox.question(
+            self, "确认", f"{what}{n_values} 个点，超过最大点数 {max_points}，是否继续计算？",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        return answer == QMessageBox.Yes
+
+    @staticmethod
+    def _palette(keys):
+        # 不超过 10 个时用默认颜色循环，否则按 viridis 均匀取色
+        if len(keys) <= 10:
+            return {key: f"C{k}" for k, key in enumerate(keys)}
+        from matplotlib import colormaps
+        import numpy as np
+        cmap = colormaps["viridis"]
+        return {key: cmap(v) for key, v in zip(keys, np.linspace(0, 1, len(keys)))}
+
+    @staticmethod
+    def _legend_entries(items, noun):
+        # items: [(文字, 颜色)]；条目过多时只列出均匀分布的几个，并注明总数
+        shown = items
+        if len(items) > COMPARE_LEGEND_IONS:
+            step = (len(items) - 1) / (COMPARE_LEGEND_IONS - 2)
+            shown = [items[round(k * step)] for k in range(COMPARE_LEGEND_IONS - 1)]
+        entries = [(text, color, "-") for text, color in shown]
+        if len(shown) < len(items):
+            entries.insert(-1, (f"… ({len(items)} {noun})", "none", "-"))
+        return entries
+
+    def _draw_comparison(self, s, curves, ys):
+        # 全部曲线作为一个 LineCollection 绘制：颜色区分离子，线型区分j类型
+        self.ensure_canvas()
+        if not curves:
+            QMessageBox.information(self, "提示", "所选离子没有所选j类型的数据。")
+            return
+        ions = list(dict.fromkeys((elem, valence) for elem, valence, _ in curves))
+        jtypes = list(dict.fromkeys(jt for _, _, jt in curves))
+        ion_colors = self._palette(ions)
+        colors = [ion_colors[elem, valence] for elem, valence, _ in curves]
+        linestyles = [JTYPE_LINESTYLES[jt] for _, _, jt in curves]
+        # 另加各j类型的线型说明
+        entries = self._legend_entries([(f"{elem}{valence}+", ion_colors[elem, valence]) for elem, valence in ions],
+                                       "ions")
+        if len(jtypes) > 1:
+            entries += [(jt, "0.3", JTYPE_LINESTYLES[jt]) for jt in jtypes]
+        self.view.show_collection(s, ys, colors, linestyles, entries,
+                                  title=f"Form Factor comparison ({len(ions)} ions, {len(curves)} curves)",
+                                  xlabel="s = sinθ / λ (Å⁻¹)", ylabel="Form Factor", log=self.log_cb.isChecked())
+        self.last_plot_data = ("compare", s, curves, ys)
+
+    # ---------- 偶极近似 ----------
+    def _plot_dipole(self):
+        # 单离子模式用当前元素与价态，多离子对比模式用对比列表中的全部离子；全部 g 一次计算
+        if self.compare_cb.isChecked():
+            ions = self.compare_ions()
+        else:
+            elem, valence = self.selected_element, self.valence_combo.currentText()
+            ions = [(elem, valence)] if elem and valence else []
+        if not ions:
+            QMessageBox.warning(self, "警告", "请先选择离子（或在多离子对比列表中加入离子）。")
+            return
+        from form_factor_engine import evaluate_dipole_grid, grid_size, parse_values, dipole_weights, dipole_labels
+        try:
+            g = parse_values(self.g_input.text())
+            weights = dipole_weights(g=g, c4=float(self.c4_input.text() or 0), c6=float(self.c6_input.text() or 0))
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", f"g 因子或 C4/C6 无效：{e}")
+            return
+        grid = self._read_grid()
+        if grid is None:
+            QMessageBox.warning(self, "警告", "请输入有效的波长和θ范围参数。")
+            return
+        n_values = grid_size(*grid[1:]) * len(ions) * len(weights)
+        if not self._confirm_points(n_values, f"共 {len(ions)} 个离子 × {len(weights)} 个 g，"):
+            return
+        labels = dipole_labels(weights, g)
+        self._start_worker(lambda result: self._draw_dipole(labels, *result),
+                           evaluate_dipole_grid, self.engine, ions, weights, *grid)
+
+    def _draw_dipole(self, labels, s, ions, f):
+        # 单个离子时颜色区分 g，多个离子时颜色区分离子（各 g 同色）
+        self.ensure_canvas()
+        if not ions:
+            QMessageBox.information(self, "提示", "所选离子缺少偶极近似所需的j类型数据。")
+            return
+        ys = f.reshape(len(ions) * len(labels), -1)
+        if len(ions) == 1:
+            palette = self._palette(labels)
+            colors = [palette[label] for label in labels]
+            entries = self._legend_entries([(label, palette[label]) for label in labels], "curves")
+            elem, valence = ions[0]
+            title = f"{elem} {valence}+  dipole form factor"
+        else:
+            palette = self._palette(ions)
+            colors = [palette[ion] for ion in ions for _ in labels]
+            entries = self._legend_entries([(f"{elem}{valence}+", palette[elem, valence]) for elem, valence in ions],
+                                           "ions")
+            title = f"Dipole form factor ({len(ions)} ions × {len(labels)} g)"
+        self.view.show_collection(s, ys, colors, ["-"] * len(ys), entries, title=title,
+                                  xlabel="s = sinθ / λ (Å⁻¹)", ylabel="F(s)", log=self.log_cb.isChecked())
+        self.last_plot_data = ("dipole", s, ions, labels, f)
+
+    # ---------- 飞行时间模式 ----------
+    def on_browse_banks(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择 bank 参数文件", "", "文本文件 (*.txt *.dat *.csv);;所有文件 (*)")
+        if path:
+            self.bank_input.setText(path)
+
+    def _plot_tof(self):
+        # 当前离子的所选j类型在全部 bank × TOF 通道上一次计算，每个 bank 一条曲线
+        elem = self.selected_element
+        valence = self.valence_combo.currentText()
+        jtypes = self._selected_jtypes()
+        if not elem or not valence or not jtypes:
+            QMessageBox.warning(self, "警告", "请先选择元素、价态和j类型。")
+            return
+        if not self.bank_input.text().strip():
+            QMessageBox.warning(self, "警告", "请先选择 bank 参数文件。")
+            return
+        from ff_tof import load_banks, parse_tof, evaluate_tof
+        try:
+            banks = load_banks(self.bank_input.text().strip())
+            dt_over_t = float(self.dt_over_t_input.text()) if self.dt_over_t_input.text().strip() else None
+            tof = parse_tof(self.tof_input.text(), dt_over_t)
+        except (ValueError, OSError) as e:
+            QMessageBox.warning(self, "警告", f"bank 文件或 TOF 范围无效：{e}")
+            return
+        n_values = len(banks) * len(tof) * len(jtypes)
+        if not self._confirm_points(n_values,
+                                    f"共 {len(banks)} 个 bank × {len(tof)} 个通道 × {len(jtypes)} 种j类型，"):
+            return
+        ions = [(elem, valence)]
+        self._start_worker(lambda values: self._draw_tof(banks, tof, ions, jtypes, values),
+                           evaluate_tof, self.engine, ions, jtypes, banks, tof)
+
+    def _draw_tof(self, banks, tof, ions, jtypes, values):
+        # 颜色区分 bank（按 2θ 排列），线型区分j类型
+        self.ensure_canvas()
+        keys = [f"2θ={two_theta:g}°" for two_theta in banks[:, 2]]
+        palette = self._palette(keys)
+        ys = values[0].reshape(len(jtypes) * len(banks), -1)
+        colors = [palette[key] for _ in jtypes for key in keys]
+        linestyles = [JTYPE_LINESTYLES[jt] for jt in jtypes for _ in keys]
+        entries = self._legend_entries([(key, palette[key]) for key in keys], "banks")
+        if len(jtypes) > 1:
+            entries += [(jt, "0.3", JTYPE_LINESTYLES[jt]) for jt in jtypes]
+        elem, valence = ions[0]
+        self.view.show_collection(tof, ys, colors, linestyles, entries,
+                                  title=f"{elem} {valence}+  TOF ({len(banks)} banks × {len(tof)} channels)",
+                                  xlabel="TOF (μs)", ylabel="Form Factor", log=self.log_cb.isChecked())
+        self.last_plot_data = ("tof", banks, tof, ions, jtypes, values)
+
+    # ---------- 混合价态 / 部分占位 ----------
+    def _plot_mixture(self):
+        # 全部组成（及 x 系列）的权重排成矩阵，分量曲线只算一次
+        from form_factor_engine import evaluate_mixture_grid, grid_size, parse_values
+        from ff_sites import composition_matrix
+        texts = [text.strip() for text in self.site_input.text().split(";") if text.strip()]
+        if not texts:
+            QMessageBox.warning(self, "警告", "请输入位点组成，如 Fe2:0.5 Fe3:0.5。")
+            return
+        try:
+            x = parse_values(self.x_input.text()) if self.x_input.text().strip() else None
+            labels, components, weights = composition_matrix(texts, x)
+            missing = [f"{elem}{valence}" for elem, valence, _ in components
+                       if (elem, str(valence)) not in self.engine.ion_index]
+            if missing:
+                raise KeyError(f"数据库中没有离子：{' '.join(dict.fromkeys(missing))}")
+        except (ValueError, KeyError) as e:
+            QMessageBox.warning(self, "警告", f"位点组成或 x 无效：{e}")
+            return
+        grid = self._read_grid()
+        if grid is None:
+            QMessageBox.warning(self, "警告", "请输入有效的波长和θ范围参数。")
+            return
+        n_values = grid_size(*grid[1:]) * len(labels)
+        if not self._confirm_points(n_values, f"共 {len(labels)} 个组成，"):
+            return
+        self._start_worker(lambda result: self._draw_mixture(labels, *result),
+                           evaluate_mixture_grid, self.engine, components, weights, *grid)
+
+    def _draw_mixture(self, labels, s, f):
+        # 颜色区分组成（x 系列按顺序渐变）
+        self.ensure_canvas()
+        palette = self._palette(labels)
+        colors = [palette[label] for label in labels]
+        entries = self._legend_entries([(label, palette[label]) for label in labels], "compositions")
+        self.view.show_collection(s, f, colors, ["-"] * len(labels), entries,
+                                  title=f"Site form factor ({len(labels)} compositions)",
+                                  xlabel="s = sinθ / λ (Å⁻¹)", ylabel="f(s)", log=self.log_cb.isChecked())
+        self.last_plot_data = ("mixture", s, labels, f)
+
+    def on_plot(self):
+        if not self.data_ready():
+            QMessageBox.information(self, "提示", "数据仍在加载，请稍候。")
+            return
+        if self.get_category() == "磁性形状因子" and self.dipole_cb.isChecked():
+            self._plot_dipole()
+            return
+        if self.get_category() == "磁性形状因子" and self.tof_cb.isChecked():
+            self._plot_tof()
+            return
+        if self.get_category() == "磁性形状因子" and self.mixture_cb.isChecked():
+            self._plot_mixture()
+            return
+        if self.get_category() == "磁性形状因子" and self.compare_cb.isChecked():
+            self._plot_comparison()
+            return
+        if self.get_category() == "磁性形状因子":
+            elem = self.selected_element
+            valence = self.valence_combo.currentText()
+            jtypes = self._selected_jtypes()
+            if not elem or not valence or not jtypes:
+                QMessageBox.warning(self, "警告", "请先选择元素、价态和j类型。")
+                return
+            grid = self._read_grid()
+            if grid is None:
+                QMessageBox.warning(self, "警告", "请输入有效的波长和θ范围参数。")
+                return
+            if self._plot_from_cache(elem, valence, jtypes, grid):
+                return
+            w, theta_min, theta_max, theta_step = grid
+            from form_factor_engine import evaluate_grid, grid_size
+
+            n_points = grid_size(theta_min, theta_max, theta_step)
+            if not self._confirm_points(n_points, "θ网格共 "):
+                return
+
+            # 只计算缓存中缺少的j类型，并复用同一网格已缓存的 s；已缓存的曲线在此持有引用，计算期间被淘汰也不影响绘图
+            cached = {jt: self.curve_cache.get(elem, valence, jt, grid) for jt in jtypes}
+            missing = [jt for jt, y in cached.items() if y is None]
+            cached = {jt: y for jt, y in cached.items() if y is not None}
+            self._start_worker(
+                lambda result: self._on_curves_ready(elem, valence, grid, jtypes, cached, result),
+                evaluate_grid, self.engine, elem, valence, missing, w, theta_min, theta_max, theta_step,
+                s=self.curve_cache.get_grid(grid))
+        else:
+            # X射线形状因子已在on_element_clicked中绘制，无需重复
+            pass
+
+    def clear_figure(self, redraw=False):
+        if self.view is None:
+            return
+        self.view.end_live(redraw=False)
+        self.view.clear(redraw)
+
+    def _draw_magnetic(self, elem, valence, s, jtypes, curves):
+        # 计算结果到达后才更新画布；坐标轴与曲线对象复用，只替换数据
+        # 画布只显示按像素抽取的包络，last_plot_data 保留全分辨率数据
+        self.ensure_canvas()
+        plot_data = [(jt, s, y) for jt, y in zip(jtypes, curves)]
+        curves = [(jt, s, y, {}) for jt, s, y in plot_data]
+        if not self.view.update(curves):
+            self.view.show(curves, title=f"{elem} {valence}+  Form Factor", xlabel="s = sinθ / λ (Å⁻¹)",
+                           ylabel="Form Factor", log=self.log_cb.isChecked())
+        self.last_plot_data = ("magnetic", elem, valence, plot_data)
+
+    # ---------- λ/θ 实时调节 ----------
+    def _set_slider(self, slider, spec, value):
+        lo, hi, per_unit = spec
+        slider.blockSignals(True)
+        slider.setValue(int(round(min(max(value, lo), hi) * per_unit)))
+        slider.blockSignals(False)
+
+    def on_slider_moved(self, slider):
+        # 滑块 -> 输入框；θmin 与 θmax 交叉时推动另一个滑块
+        if slider is self.w_slider:
+            self.w_input.setText(f"{slider.value() / WAVELENGTH_SLIDER[2]:g}")
+        else:
+            lo, hi = self.theta_min_slider.value(), self.theta_max_slider.value()
+            if lo >= hi:
+                if slider is self.theta_min_slider:
+                    hi = min(lo + 1, self.theta_max_slider.maximum())
+                    lo = hi - 1
+                else:
+                    lo = max(hi - 1, self.theta_min_slider.minimum())
+                    hi = lo + 1
+                for s, v in ((self.theta_min_slider, lo), (self.theta_max_slider, hi)):
+                    s.blockSignals(True)
+                    s.setValue(v)
+                    s.blockSignals(False)
+            self.theta_min.setText(f"{lo / THETA_SLIDER[2]:g}")
+            self.theta_max.setText(f"{hi / THETA_SLIDER[2]:g}")
+        # 同一轮事件中的多次变化合并为一次重绘
+        if not self._live_timer.isActive():
+            self._live_timer.start(0)
+
+    def on_slider_pressed(self):
+        if self.view is not None and self._live_target() is not None:
+            self.view.begin_live()
+
+    def on_slider_released(self):
+        self._live_timer.stop()
+        self._live_update(final=True)
+
+    def on_grid_edited(self):
+        # 输入框 -> 滑块，并直接重绘当前曲线
+        grid = self._read_grid()
+        if grid is None:
+            return
+        w, theta_min, theta_max, _ = grid
+        self._set_slider(self.w_slider, WAVELENGTH_SLIDER, w)
+        self._set_slider(self.theta_min_slider, THETA_SLIDER, theta_min)
+        self._set_slider(self.theta_max_slider, THETA_SLIDER, theta_max)
+        self._live_update(final=True)
+
+    def _live_target(self):
+        # 当前显示的磁性曲线 (元素, 价态, j类型列表)，没有时返回 None
+        data = self.last_plot_data
+        if self.get_category() != "磁性形状因子" or not data or data[0] != "magnetic" or self.db is None:
+            return None
+        return data[1], data[2], [jt for jt, _, _ in data[3]]
+
+    def _live_update(self, final=False):
+        target = self._live_target()
+        grid = self._read_grid()
+        if target is None or grid is None or self._worker is not None:
+            if final and self.view is not None:
+                self.view.end_live()
+            return
+        elem, valence, jtypes = target
+        from form_factor_engine import grid_size, theta_grid
+        if grid_size(*grid[1:]) > LIVE_MAX_POINTS:
+            # 点数过多时拖动中不重算，松开后走后台计算
+            if final:
+                self.view.end_live()
+                self.on_plot()
+            return
+        if final:
+            self.view.end_live(redraw=False)
+            if self._plot_from_cache(elem, valence, jtypes, grid):
+                return
+        with PERF.span("live.eval") as sp:
+            s = self.curve_cache.get_grid(grid) if final else None
+            if s is None:
+                _, s = theta_grid(*grid)
+            curves = list(self.engine.evaluate(s, [(elem, valence)], jtypes)[0])
+            sp.add(points=len(s) * len(jtypes))
+        if final:
+            # 只缓存松开滑块时的结果，拖动中的中间网格不进入缓存
+            for jt, y in zip(jtypes, curves):
+                s = self.curve_cache.put(elem, valence, jt, grid, s, y)
+        self._draw_magnetic(elem, valence, s, jtypes, curves)
+
+    def _start_worker(self, on_finished, fn, *args, on_aborted=None, **kwargs):
+        if self._worker is not None:
+            QMessageBox.information(self, "提示", "已有任务在运行，请等待完成或取消。")
+            return False
+        worker = Worker(fn, *args, **kwargs)
+        if on_aborted is not None:
+            worker.signals.cancelled.connect(on_aborted)
+            worker.signals.failed.connect(on_aborted)
+        worker.signals.progress.connect(lambda frac: self.progress_bar.setValue(int(frac * 100)))
+        worker.signals.finished.connect(on_finished)
+        worker.signals.failed.connect(lambda msg: QMessageBox.warning(self, "警告", f"任务失败：{msg}"))
+        for signal in (worker.signals.finished, worker.signals.failed, worker.signals.cancelled):
+            signal.connect(self._on_worker_done)
+        self._worker = worker
+        self.plot_btn.setEnabled(False)
+        self.export_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.thread_pool.start(worker)
+        return True
+
+    def _on_worker_done(self, *_):
+        self._worker = None
+        self.plot_btn.setEnabled(True)
+        self.export_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+
+    def on_cancel(self):
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def on_export(self):
+        if not self.last_plot_data:
+            QMessageBox.warning(self, "警告", "请先绘制曲线后再导出。")
+            return
+        img_path, _ = QFileDialog.getSaveFileName(self, "保存图片", "", "PNG图片 (*.png)")
+        if img_path:
+            with PERF.span("export.png") as sp:
+                self.fig.savefig(img_path)
+                sp.add(bytes=os.path.getsize(img_path) if os.path.exists(img_path) else 0)
+        dat_path, selected = QFileDialog.getSaveFileName(self, "保存数据", "", DATA_FILTERS)
+        if dat_path:
+            # 未写扩展名时按所选过滤器补全
+            from exporters import FORMATS
+            if os.path.splitext(dat_path)[1].lower() not in FORMATS:
+                dat_path += FILTER_EXT.get(selected, ".dat")
+            # 取消或失败时删除写了一半的文件
+            self._start_worker(
+                lambda _: QMessageBox.information(self, "提示", "导出完成！"),
+                write_plot_data, dat_path, self.last_plot_data,
+                on_aborted=lambda *_: self._remove_partial(dat_path))
+            return
+        QMessageBox.information(self, "提示", "导出完成！")
+
+    @staticmethod
+    def _remove_partial(path):
+        for p in (path, path + ".json"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def show_help(self):
+        dlg = HelpDialog(self)
+        dlg.exec_()
+
+    def show_perf(self):
+        # 非模态，便于边操作边观察
+        if self.perf_dialog is None:
+            self.perf_dialog = PerfDialog(self)
+        self.perf_dialog.show()
+        self.perf_dialog.raise_()
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    win = MainWindow()
+    win.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class CurveCache:
+    # 计算结果的 LRU 缓存，键为 (元素, 价态, j类型, 网格)，网格 = (λ, θmin, θmax, θstep)；
+    # 同一网格的曲线共用一个 s 数组，s 在最后一条引用它的曲线被淘汰时释放
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._curves = OrderedDict()  # {键: y数组}
+        self._grids = {}  # {网格: [s数组, 引用数]}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._curves)
+
+    def get_grid(self, grid):
+        # 返回已缓存的 s 数组，没有时返回 None
+        with self._lock:
+            entry = self._grids.get(grid)
+            return entry[0] if entry else None
+
+    def get(self, elem, valence, j_type, grid):
+        key = (elem, valence, j_type, grid)
+        with self._lock:
+            y = self._curves.get(key)
+            if y is None:
+                self.misses += 1
+                return None
+            self._curves.move_to_end(key)
+            self.hits += 1
+            return y
+
+    def put(self, elem, valence, j_type, grid, s, y):
+        # 返回该网格共用的 s（可能是先前缓存的那个）
+        key = (elem, valence, j_type, grid)
+        with self._lock:
+            if key in self._curves:
+                self._curves.move_to_end(key)
+                return self._grids[grid][0]
+            entry = self._grids.get(grid)
+            if entry is None:
+                entry = self._grids[grid] = [s, 0]
+                self.nbytes += s.nbytes
+            entry[1] += 1
+            # 引擎返回的是整块 (离子, j类型, 点) 结果的行视图，直接缓存会让整块常驻且 nbytes 只计一行，故存独立副本
+            if y.base is not None:
+                y = y.copy()
+            self._curves[key] = y
+            self.nbytes += y.nbytes
+            # 至少保留刚放入的这一条
+            while self.nbytes > self.max_bytes and len(self._curves) > 1:
+                self._evict_oldest()
+            return entry[0]
+
+    def _evict_oldest(self):
+        (_, _, _, grid), y = self._curves.popitem(last=False)
+        self.nbytes -= y.nbytes
+        entry = self._grids[grid]
+        entry[1] -= 1
+        if entry[1] == 0:
+            self.nbytes -= entry[0].nbytes
+            del self._grids[grid]
+
+    def clear(self):
+        with self._lock:
+            self._curves.clear()
+            self._grids.clear()
+            self.nbytes = 0
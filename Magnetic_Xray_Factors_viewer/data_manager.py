@@ -1,123 +1,665 @@
-import os
-import re
-import glob
-
-class MagneticFormFactorDB:
-    def __init__(self, data_dir):
-        self.data_dir = data_dir
-        self.data = {}  # {元素: {价态: {j类型: 参数dict}}}
-        self.j_types = {}  # {j类型: 文件首行描述}
-        self._parse_all_tables()
-
-    def _parse_all_tables(self):
-        table_files = glob.glob(os.path.join(self.data_dir, "Table*.txt"))
-        for file in table_files:
-            with open(file, encoding='utf-8') as f:
-                lines = f.readlines()
-            if not lines or len(lines) < 2:
-                continue
-            # 识别j类型
-            header = lines[0].strip()
-            j_match = re.search(r'<(j\d)>', header)
-            if not j_match:
-                continue
-            j_type = j_match.group(1)
-            # 识别参数列
-            columns = [col.strip() for col in lines[1].split('\t') if col.strip()]
-            # 逐行解析
-            for line in lines[2:]:
-                if not line.strip():
-                    continue
-                parts = [p.strip() for p in line.split('\t')]
-                if len(parts) < 8:
-                    continue
-                ion = parts[0]
-                m = re.match(r"([A-Za-z]+)(\d+)", ion)
-                if not m:
-                    continue
-                elem, valence = m.group(1), m.group(2)
-                params = dict(zip(columns[1:], map(float, parts[1:])))
-                self.data.setdefault(elem, {}).setdefault(valence, {})[j_type] = params
-                self.j_types[j_type] = header
-
-    def get_elements(self):
-        return sorted(self.data.keys())
-
-    def get_valences(self, elem):
-        return sorted(self.data.get(elem, {}).keys(), key=int)
-
-    def get_j_types(self, elem, valence):
-        return sorted(self.data.get(elem, {}).get(valence, {}).keys())
-
-    def get_params(self, elem, valence, j_type):
-        return self.data.get(elem, {}).get(valence, {}).get(j_type, None)
-
-    def get_j_type_desc(self, j_type):
-        return self.j_types.get(j_type, "")
-
-# 新增 X 射线形状因子数据库
-class XRayFormFactorDB:
-    def __init__(self, data_dir):
-        self.data_dir = data_dir
-        self.data = {}  # {元素: {'method': str, 'points': [(x, y)]}}
-        self._parse_all_tables()
-
-    def _parse_all_tables(self):
-        table_files = glob.glob(os.path.join(self.data_dir, "Table_*.txt"))
-        for file in table_files:
-            with open(file, encoding='utf-8') as f:
-                lines = [line.strip() for line in f if line.strip()]
-            if len(lines) < 4:
-                continue
-            # 第一行：元素名（首列为"Element"，需跳过）
-            header = lines[0].split('\t')
-            elements = [e.strip() for e in header[1:] if e.strip()]
-            # 第二行：原子序数（首列为"Z"，需跳过）
-            # 第三行：method（首列为"Method"，需跳过）
-            method_line = lines[2].split('\t')
-            methods = [m.strip() for m in method_line[1:len(elements)+1]]
-            # 数据区
-            for idx, elem in enumerate(elements):
-                points = []
-                for line in lines[3:]:
-                    parts = line.split('\t')
-                    if len(parts) < idx + 2:
-                        continue
-                    x_str = parts[0].strip()
-                    y_str = parts[idx + 1].strip()
-                    if not x_str or not y_str:
-                        continue
-                    try:
-                        x = float(x_str)
-                        y = float(y_str)
-                        points.append((x, y))
-                    except ValueError:
-                        continue
-                if points:
-                    self.data[elem] = {'method': methods[idx], 'points': points}
-
-    def has_data(self, elem):
-        return elem in self.data
-
-    def get_method(self, elem):
-        return self.data.get(elem, {}).get('method', '')
-
-    def get_points(self, elem):
-        return self.data.get(elem, {}).get('points', [])
-
-    def get_all_elements(self):
-        return set(self.data.keys())
-
-#主程序不会运行下述代码，仅作为测试用
-#注意，该路径不会加载入主程序中，请确保主程序中的路径也修改正确
-if __name__ == "__main__":
-    db = MagneticFormFactorDB(r"D:\\study\\Program\\XRD_Form_Factors\\Magnetic_Form_factor_data")
-    print("所有有数据的元素：", db.get_elements())
-    print("Fe的所有价态：", db.get_valences("Fe"))
-    print("Fe2的所有j类型：", db.get_j_types("Fe", "2"))
-    print("Fe2, j0的参数：", db.get_params("Fe", "2", "j0"))
-
-    xdb = XRayFormFactorDB(r"D:\\study\\Program\\XRD_Form_Factors\\Xray_scatter_data")
-    print("X射线有数据的元素：", xdb.get_all_elements())
-    print("H的method：", xdb.get_method("H"))
+import os
+import re
+import glob
+import json
+import hashlib
+import threading
+import numpy as np
+from perf import PERF
+
+CACHE_DIR_NAME = "__ffcache__"
+CACHE_VERSION = 2
+
+# 由表头识别电子系列，如 "<j0> Form factors for 3d transition elements and their ions"
+SERIES_KEYWORDS = (
+    ("3d", "3d"),
+    ("4d", "4d"),
+    ("rare earth", "rare earth"),
+    ("actinide", "actinide"),
+)
+
+# 按原子序数排列的元素符号，用于按系列的 Z 范围判断某元素可能出现在哪个表格
+ELEMENT_SYMBOLS = (
+    "H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe Co Ni Cu Zn "
+    "Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn Sb Te I Xe Cs Ba "
+    "La Ce Pr Nd Pm Sm Eu Gd Tb Dy Ho Er Tm Yb Lu Hf Ta W Re Os Ir Pt Au Hg Tl Pb Bi Po At Rn "
+    "Fr Ra Ac Th Pa U Np Pu Am Cm Bk Cf Es Fm Md No Lr"
+).split()
+ELEMENT_Z = {symbol: z for z, symbol in enumerate(ELEMENT_SYMBOLS, 1)}
+SERIES_Z_RANGES = {
+    "3d": (21, 30),
+    "4d": (39, 48),
+    "rare earth": (57, 71),
+    "actinide": (89, 103),
+}
+
+
+def series_from_header(header):
+    text = header.lower()
+    for keyword, name in SERIES_KEYWORDS:
+        if keyword in text:
+            return name
+    # 未知系列时取 "for" 之后的描述
+    m = re.search(r'for\s+(.+)', header, re.IGNORECASE)
+    return m.group(1).strip() if m else header.strip()
+
+
+class TableCache:
+    # 已解析表格的二进制缓存：每个表格的数组存为 .npy（可内存映射零拷贝加载），
+    # 索引 index_<kind>.json 记录文件大小、mtime 与 sha1，文件变化时只重新解析该表格
+    def __init__(self, data_dir, kind):
+        self.cache_dir = os.path.join(data_dir, CACHE_DIR_NAME)
+        self.kind = kind
+        self.index_path = os.path.join(self.cache_dir, f"index_{kind}.json")
+        self.index = self._read_index()
+        self.dirty = False
+        self.seen = set()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get("version") != CACHE_VERSION:
+            return {}
+        return index.get("tables", {})
+
+    @staticmethod
+    def _file_hash(file):
+        h = hashlib.sha1()
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _array_path(self, name, key):
+        return os.path.join(self.cache_dir, f"{self.kind}_{name}_{key}.npy")
+
+    def load(self, file):
+        # 命中返回 (meta, arrays)，未命中返回 None
+        name = os.path.basename(file)
+        self.seen.add(name)
+        entry = self.index.get(name)
+        if entry is None:
+            return None
+        st = os.stat(file)
+        if st.st_size != entry["size"]:
+            return None
+        if st.st_mtime_ns != entry["mtime_ns"]:
+            # mtime变化但内容未变（如拷贝到其他机器）时仍可复用
+            if self._file_hash(file) != entry["sha1"]:
+                return None
+            entry["mtime_ns"] = st.st_mtime_ns
+            self.dirty = True
+        try:
+            arrays = {key: np.load(self._array_path(name, key), mmap_mode='r')
+                      for key in entry["arrays"]}
+        except (OSError, ValueError):
+            return None
+        return entry["meta"], arrays
+
+    def store(self, file, meta, arrays):
+        name = os.path.basename(file)
+        self.seen.add(name)
+        st = os.stat(file)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for key, arr in arrays.items():
+                np.save(self._array_path(name, key), np.ascontiguousarray(arr))
+        except OSError:
+            return
+        self.index[name] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha1": self._file_hash(file),
+            "meta": meta,
+            "arrays": sorted(arrays),
+        }
+        self.dirty = True
+
+    def keep(self, files):
+        # 延迟加载时只解析部分表格，先登记全部现存文件，避免 flush 误删其他表格的缓存
+        self.seen.update(os.path.basename(file) for file in files)
+
+    def flush(self):
+        # 删除已不存在的表格条目，并原子地写回索引
+        for name in set(self.index) - self.seen:
+            for key in self.index.pop(name)["arrays"]:
+                try:
+                    os.remove(self._array_path(name, key))
+                except OSError:
+                    pass
+            self.dirty = True
+        if not self.dirty:
+            return
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump({"version": CACHE_VERSION, "tables": self.index}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            return
+        self.dirty = False
+
+
+def _load_table(cache, file, parse, kind):
+    # 返回一个表格的 (meta, arrays)，缓存未命中时调用 parse 解析文本
+    with PERF.span(f"parse.{kind}", tables=1) as sp:
+        hit = cache.load(file) if cache else None
+        if hit is not None:
+            sp.add(cache_hits=1)
+            return hit
+        meta, arrays = parse(file)
+        sp.add(bytes=os.path.getsize(file))
+        if cache:
+            cache.store(file, meta, arrays)
+        return meta, arrays
+
+
+def _load_tables(data_dir, pattern, kind, parse, use_cache):
+    # 依次返回每个表格的 (meta, arrays)
+    table_files = sorted(glob.glob(os.path.join(data_dir, pattern)))
+    cache = TableCache(data_dir, kind) if use_cache else None
+    for file in table_files:
+        meta, arrays = _load_table(cache, file, parse, kind)
+        if meta:
+            yield meta, arrays
+    if cache:
+        cache.flush()
+
+
+def _read_head(file, n):
+    # 读取前 n 个非空行，供延迟模式只扫描表头
+    lines = []
+    with open(file, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                lines.append(line.rstrip('\r\n'))
+                if len(lines) == n:
+                    break
+    return lines
+
+
+def scan_magnetic_header(file):
+    # 只读首行，返回 {"header", "j_type", "series"}，无法识别时返回 None
+    lines = _read_head(file, 1)
+    if not lines:
+        return None
+    header = lines[0].strip()
+    j_match = re.search(r'<(j\d)>', header)
+    if not j_match:
+        return None
+    return {"header": header, "j_type": j_match.group(1), "series": series_from_header(header)}
+
+
+def parse_magnetic_table(file):
+    # 解析一个 <jl> 系数表，返回 (meta, {"params": (离子数, 参数数) 数组})，无法识别时 meta 为 None
+    with open(file, encoding='utf-8') as f:
+        lines = f.readlines()
+    if not lines or len(lines) < 2:
+        return None, {}
+    # 识别j类型
+    header = lines[0].strip()
+    j_match = re.search(r'<(j\d)>', header)
+    if not j_match:
+        return None, {}
+    # 识别参数列
+    columns = [col.strip() for col in lines[1].split('\t') if col.strip()]
+    ions, rows = [], []
+    # 逐行解析
+    for line in lines[2:]:
+        if not line.strip():
+            continue
+        parts = [p.strip() for p in line.split('\t')]
+        if len(parts) < 8:
+            continue
+        if not re.match(r"([A-Za-z]+)(\d+)", parts[0]):
+            continue
+        ions.append(parts[0])
+        rows.append([float(p) for p in parts[1:len(columns)]])
+    meta = {"header": header, "j_type": j_match.group(1), "columns": columns, "ions": ions}
+    return meta, {"params": np.array(rows, dtype=float).reshape(len(rows), len(columns) - 1)}
+
+
+def _split_cells(line, width):
+    parts = line.split('\t')[:width]
+    return [p.strip() or 'nan' for p in parts] + ['nan'] * (width - len(parts))
+
+
+def _xray_header(lines):
+    # 解析前三行，返回 (列数, 元素所在列, 元素, 原子序数, method)
+    # 第一行：元素名（首列为"Element"，需跳过）；按实际列位置取元素，
+    # 以跳过 Table_1-10.txt 中 B 与 C 之间的空列
+    header = lines[0].split('\t')
+    width = len(header)
+    cols = [i for i in range(1, width) if header[i].strip()]
+    elements = [header[i].strip() for i in cols]
+    # 第二行：原子序数（首列为"Z"，需跳过）
+    z_line = _split_cells(lines[1], width)
+    z = [int(z_line[i]) if z_line[i].isdigit() else ELEMENT_Z.get(elem, 0) for i, elem in zip(cols, elements)]
+    # 第三行：method（首列为"Method"，需跳过）
+    method_line = _split_cells(lines[2], width)
+    methods = [method_line[i] if method_line[i] != 'nan' else '' for i in cols]
+    return width, cols, elements, z, methods
+
+
+def scan_xray_header(file):
+    # 只读前三行，返回 {"elements", "z", "methods"}，无法识别时返回 None
+    lines = _read_head(file, 3)
+    if len(lines) < 3:
+        return None
+    _, _, elements, z, methods = _xray_header(lines)
+    return {"elements": elements, "z": z, "methods": methods}
+
+
+def parse_xray_table(file):
+    # 单次切分整个 Table_*.txt，返回 (meta, {"s": 公共sinθ/λ轴, "f": (元素数, 点数) 矩阵})
+    # 空白单元格记为 NaN
+    with open(file, encoding='utf-8') as f:
+        lines = [line.rstrip('\r\n') for line in f if line.strip()]
+    if len(lines) < 4:
+        return None, {}
+    width, cols, elements, _, methods = _xray_header(lines)
+    # 数据区
+    cells = [_split_cells(line, width) for line in lines[3:]]
+    try:
+        table = np.array(cells).astype(float)
+    except ValueError:
+        # 含非数值行时逐行剔除
+        rows = []
+        for row in cells:
+            try:
+                rows.append([float(c) for c in row])
+            except ValueError:
+                continue
+        table = np.array(rows, dtype=float).reshape(len(rows), width)
+    table = table[~np.isnan(table[:, 0])]
+    meta = {"elements": elements, "methods": methods}
+    return meta, {"s": table[:, 0].copy(), "f": np.ascontiguousarray(table[:, cols].T)}
+
+
+class IonRecord:
+    # 离子注册表中的一条记录；系数存于 IonRegistry.params 的第 index 行
+    __slots__ = ("index", "elem", "valence", "label", "z", "series", "j_types")
+
+    def __init__(self, index, elem, valence, series, j_types):
+        self.index = index
+        self.elem = elem
+        self.valence = valence
+        self.label = f"{elem}{valence}"
+        self.z = ELEMENT_Z.get(elem, 0)
+        self.series = series  # 该离子出现的系列（元组）
+        self.j_types = j_types  # 有参数的 j类型（已排序元组）
+
+    def __repr__(self):
+        return f"IonRecord({self.label})"
+
+
+class IonRegistry:
+    # 加载完成后一次性构建的离子注册表：预排序视图 + 反向索引，查询均为字典/元组访问，不再排序。
+    # params[离子, j类型, 系数] 为连续数组，缺失的 (离子, j类型) 填 NaN，present 标记是否存在
+    def __init__(self, data, series, tables):
+        # data: {元素: {价态: {j类型: 参数dict}}}；series: {系列: {(元素, 价态)}}；tables: {表头: [(元素, 价态)]}
+        j_types, names = set(), []
+        for valences in data.values():
+            for jmap in valences.values():
+                j_types.update(jmap)
+                for params in jmap.values():
+                    names.extend(name for name in params if name not in names)
+        self.j_types = tuple(sorted(j_types))
+        self.j_index = {jt: k for k, jt in enumerate(self.j_types)}
+        self.coeff_names = tuple(names)
+
+        ion_series = {}
+        for name in sorted(series):
+            for ion in series[name]:
+                ion_series.setdefault(ion, []).append(name)
+        self.elements = tuple(sorted(data))
+        self.element_set = frozenset(self.elements)
+        records = []
+        for elem in self.elements:
+            for valence in sorted(data[elem], key=int):
+                records.append(IonRecord(len(records), elem, valence,
+                                         tuple(ion_series.get((elem, valence), ())),
+                                         tuple(sorted(data[elem][valence]))))
+        self.records = tuple(records)
+
+        n = len(records)
+        self.params = np.full((n, len(self.j_types), len(self.coeff_names)), np.nan)
+        self.present = np.zeros((n, len(self.j_types)), dtype=bool)
+        col = {name: c for c, name in enumerate(self.coeff_names)}
+        for rec in records:
+            for jt, params in data[rec.elem][rec.valence].items():
+                k = self.j_index[jt]
+                self.present[rec.index, k] = True
+                for name, value in params.items():
+                    self.params[rec.index, k, col[name]] = value
+
+        self.by_ion = {(rec.elem, rec.valence): rec for rec in records}
+        self.by_label = {}
+        for rec in records:
+            self.by_label[rec.label] = rec
+            self.by_label[rec.label + "+"] = rec
+        self.by_element = self._group(records, lambda rec: (rec.elem,))
+        self.by_valence = self._group(records, lambda rec: (rec.valence,))
+        self.by_j_type = self._group(records, lambda rec: rec.j_types)
+        self.by_series = self._group(records, lambda rec: rec.series)
+        # 按表头（即具体的表格）索引
+        self.by_header = {header: tuple(self.by_ion[ion] for ion in ions) for header, ions in tables.items()}
+        self.valences = {elem: tuple(rec.valence for rec in recs) for elem, recs in self.by_element.items()}
+        self.series_ions = {name: tuple((rec.elem, rec.valence) for rec in recs)
+                            for name, recs in self.by_series.items()}
+
+    @staticmethod
+    def _group(records, keys):
+        groups = {}
+        for rec in records:
+            for key in keys(rec):
+                groups.setdefault(key, []).append(rec)
+        return {key: tuple(recs) for key, recs in groups.items()}
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, key):
+        # key 可为 (元素, 价态) 或 "Fe2" / "Fe2+" 标签
+        return (key in self.by_label) if isinstance(key, str) else (tuple(key) in self.by_ion)
+
+    def get(self, key):
+        if isinstance(key, str):
+            return self.by_label.get(key.strip())
+        return self.by_ion.get((key[0], str(key[1])))
+
+    def lookup(self, key):
+        rec = self.get(key)
+        if rec is None:
+            raise KeyError(f"数据库中没有离子：{key}")
+        return rec
+
+    def coeffs(self, key, j_type):
+        # 返回某离子某 j类型 的系数行（视图），缺失时返回 None
+        rec = self.get(key)
+        k = self.j_index.get(j_type)
+        if rec is None or k is None or not self.present[rec.index, k]:
+            return None
+        return self.params[rec.index, k]
+
+
+class MagneticFormFactorDB:
+    # lazy=True 时构造只读各表格首行，建立 j类型/系列 索引，某离子首次被访问时才解析相应表格；
+    # 需要全部离子的方法（get_elements、get_series_ions、data）会解析全部表格
+    def __init__(self, data_dir, use_cache=True, lazy=False):
+        self.data_dir = data_dir
+        self.use_cache = use_cache
+        self.lazy = lazy
+        self._data = {}  # {元素: {价态: {j类型: 参数dict}}}
+        self.j_types = {}  # {j类型: 文件首行描述}
+        self.series = {}  # {系列: {(元素, 价态)}}
+        self.table_ions = {}  # {表头: [(元素, 价态)]}
+        self.index = []  # 延迟模式的表头索引 [{'file', 'header', 'j_type', 'series', 'loaded'}]
+        self._registry = None
+        self._cache = None
+        self._lock = threading.Lock()
+        if lazy:
+            self._scan_headers()
+        else:
+            self._parse_all_tables()
+
+    @property
+    def data(self):
+        self._ensure_all()
+        return self._data
+
+    @property
+    def registry(self):
+        # 全部表格加载后构建一次的 IonRegistry
+        if self._registry is None:
+            self._ensure_all()
+            with PERF.span("registry.build"):
+                self._registry = IonRegistry(self._data, self.series, self.table_ions)
+        return self._registry
+
+    def _views(self):
+        # 延迟模式下尚未加载全部表格时返回 None，查询退回逐次排序
+        if self._registry is None and self.lazy and not all(info["loaded"] for info in self.index):
+            return None
+        return self.registry
+
+    def _add_table(self, meta, arrays):
+        j_type = meta["j_type"]
+        names = meta["columns"][1:]
+        members = self.series.setdefault(series_from_header(meta["header"]), set())
+        table = self.table_ions.setdefault(meta["header"], [])
+        for ion, row in zip(meta["ions"], arrays["params"].tolist()):
+            m = re.match(r"([A-Za-z]+)(\d+)", ion)
+            elem, valence = m.group(1), m.group(2)
+            params = dict(zip(names, row))
+            self._data.setdefault(elem, {}).setdefault(valence, {})[j_type] = params
+            members.add((elem, valence))
+            table.append((elem, valence))
+        self.j_types[j_type] = meta["header"]
+        self._registry = None
+
+    def _parse_all_tables(self):
+        with PERF.span("load.magnetic"):
+            tables = _load_tables(self.data_dir, "Table*.txt", "magnetic", parse_magnetic_table, self.use_cache)
+            for meta, arrays in tables:
+                self._add_table(meta, arrays)
+            with PERF.span("registry.build"):
+                self._registry = IonRegistry(self._data, self.series, self.table_ions)
+
+    def _scan_headers(self):
+        files = sorted(glob.glob(os.path.join(self.data_dir, "Table*.txt")))
+        for file in files:
+            info = scan_magnetic_header(file)
+            if info is None:
+                continue
+            info.update(file=file, loaded=False)
+            self.index.append(info)
+            self.j_types[info["j_type"]] = info["header"]
+            self.series.setdefault(info["series"], set())
+        if self.use_cache:
+            self._cache = TableCache(self.data_dir, "magnetic")
+            self._cache.keep(files)
+
+    def _tables_for(self, elem, j_type=None):
+        # 按 j类型 与系列的 Z 范围挑出可能含该元素的表格；
+        # 某 j类型 没有该元素所属系列的表格时（如 4d 表中附带的稀土 <j2>），取该 j类型 的全部表格
+        z = ELEMENT_Z.get(elem)
+        j_list = [j_type] if j_type else sorted({info["j_type"] for info in self.index})
+        tables = []
+        for jt in j_list:
+            candidates = [info for info in self.index if info["j_type"] == jt]
+            own = [info for info in candidates
+                   if z is None or info["series"] not in SERIES_Z_RANGES
+                   or SERIES_Z_RANGES[info["series"]][0] <= z <= SERIES_Z_RANGES[info["series"]][1]]
+            tables.extend(own or candidates)
+        return tables
+
+    def _ensure(self, tables):
+        pending = [info for info in tables if not info["loaded"]]
+        if not pending:
+            return
+        with self._lock:
+            for info in pending:
+                if info["loaded"]:
+                    continue
+                meta, arrays = _load_table(self._cache, info["file"], parse_magnetic_table, "magnetic")
+                if meta:
+                    self._add_table(meta, arrays)
+                info["loaded"] = True
+            if self._cache:
+                self._cache.flush()
+
+    def _ensure_all(self):
+        if self.lazy:
+            self._ensure(self.index)
+
+    def _ensure_elem(self, elem, j_type=None):
+        if self.lazy:
+            self._ensure(self._tables_for(elem, j_type))
+
+    # 以下查询返回注册表中预排序的元组，调用方不应修改
+    def get_elements(self):
+        return self.registry.elements
+
+    def get_valences(self, elem):
+        views = self._views()
+        if views is not None:
+            return views.valences.get(elem, ())
+        self._ensure_elem(elem)
+        return tuple(sorted(self._data.get(elem, {}).keys(), key=int))
+
+    def get_j_types(self, elem, valence):
+        views = self._views()
+        if views is not None:
+            rec = views.by_ion.get((elem, valence))
+            return rec.j_types if rec is not None else ()
+        self._ensure_elem(elem)
+        return tuple(sorted(self._data.get(elem, {}).get(valence, {}).keys()))
+
+    def get_params(self, elem, valence, j_type):
+        self._ensure_elem(elem, j_type)
+        return self._data.get(elem, {}).get(valence, {}).get(j_type, None)
+
+    def get_j_type_desc(self, j_type):
+        return self.j_types.get(j_type, "")
+
+    def get_series(self):
+        return sorted(self.series.keys())
+
+    def get_series_ions(self, series):
+        return self.registry.series_ions.get(series, ())
+
+# 新增 X 射线形状因子数据库
+class XRayFormFactorDB:
+    # lazy=True 时构造只读各表格前三行（元素、Z、method），元素首次被访问时才解析其所在表格；
+    # tables、data 与 get_all_elements 会解析全部表格
+    def __init__(self, data_dir, use_cache=True, lazy=False):
+        self.data_dir = data_dir
+        self.use_cache = use_cache
+        self.lazy = lazy
+        self._tables = []  # [{'s': 公共s轴, 'f': (元素数, 点数) 矩阵, 'elements': [...], 'methods': [...]}]
+        self._data = {}  # {元素: {'method': str, 'table': 表序号, 'row': 行号, 'points': (s视图, f视图)}}
+        self.index = []  # 延迟模式的表头索引 [{'file', 'elements', 'z', 'methods', 'loaded'}]
+        self.element_table = {}  # 延迟模式 {元素: 表序号}
+        self._element_set = None
+        self._cache = None
+        self._lock = threading.Lock()
+        if lazy:
+            self._scan_headers()
+        else:
+            self._parse_all_tables()
+
+    @property
+    def tables(self):
+        self._ensure_all()
+        return self._tables
+
+    @property
+    def data(self):
+        self._ensure_all()
+        return self._data
+
+    def _add_table(self, k, meta, arrays):
+        s, f = arrays["s"], arrays["f"]
+        self._tables[k] = {'s': s, 'f': f, 'elements': meta["elements"], 'methods': meta["methods"]}
+        valid = ~np.isnan(f)
+        counts = valid.sum(axis=1)
+        for row, (elem, method) in enumerate(zip(meta["elements"], meta["methods"])):
+            n = int(counts[row])
+            if not n:
+                continue
+            if valid[row, :n].all():
+                # 空白只出现在末尾时直接返回视图
+                points = (s[:n], f[row, :n])
+            else:
+                points = (s[valid[row]], f[row, valid[row]])
+            self._data[elem] = {'method': method, 'table': k, 'row': row, 'points': points}
+        self._element_set = None
+
+    def _parse_all_tables(self):
+        with PERF.span("load.xray"):
+            tables = _load_tables(self.data_dir, "Table_*.txt", "xray", parse_xray_table, self.use_cache)
+            for meta, arrays in tables:
+                self._tables.append(None)
+                self._add_table(len(self._tables) - 1, meta, arrays)
+
+    def _scan_headers(self):
+        files = sorted(glob.glob(os.path.join(self.data_dir, "Table_*.txt")))
+        for file in files:
+            info = scan_xray_header(file)
+            if info is None:
+                continue
+            info.update(file=file, loaded=False)
+            for elem in info["elements"]:
+                self.element_table[elem] = len(self.index)
+            self.index.append(info)
+            self._tables.append({'s': np.empty(0), 'f': np.empty((0, 0)), 'elements': [], 'methods': []})
+        if self.use_cache:
+            self._cache = TableCache(self.data_dir, "xray")
+            self._cache.keep(files)
+
+    def _ensure(self, ks):
+        pending = [k for k in ks if not self.index[k]["loaded"]]
+        if not pending:
+            return
+        with self._lock:
+            for k in pending:
+                info = self.index[k]
+                if info["loaded"]:
+                    continue
+                meta, arrays = _load_table(self._cache, info["file"], parse_xray_table, "xray")
+                if meta:
+                    self._add_table(k, meta, arrays)
+                info["loaded"] = True
+            if self._cache:
+                self._cache.flush()
+
+    def _ensure_all(self):
+        if self.lazy:
+            self._ensure(range(len(self.index)))
+
+    def _ensure_elem(self, elem):
+        if self.lazy and elem in self.element_table:
+            self._ensure([self.element_table[elem]])
+
+    def has_data(self, elem):
+        self._ensure_elem(elem)
+        return elem in self._data
+
+    def get_method(self, elem):
+        if self.lazy and elem in self.element_table:
+            info = self.index[self.element_table[elem]]
+            return info["methods"][info["elements"].index(elem)]
+        return self._data.get(elem, {}).get('method', '')
+
+    def get_points(self, elem):
+        # 返回 (sinθ/λ, 散射因子) 两个数组视图
+        self._ensure_elem(elem)
+        entry = self._data.get(elem)
+        if entry is None:
+            return np.empty(0), np.empty(0)
+        return entry['points']
+
+    def get_all_elements(self):
+        # 预先构建的 frozenset，供界面频繁查询
+        if self._element_set is None:
+            self._ensure_all()
+            self._element_set = frozenset(self._data)
+        return self._element_set
+
+#主程序不会运行下述代码，仅作为测试用
+#注意，该路径不会加载入主程序中，请确保主程序中的路径也修改正确
+if __name__ == "__main__":
+    db = MagneticFormFactorDB(r"D:\\study\\Program\\XRD_Form_Factors\\Magnetic_Form_factor_data")
+    print("所有有数据的元素：", db.get_elements())
+    print("Fe的所有价态：", db.get_valences("Fe"))
+    print("Fe2的所有j类型：", db.get_j_types("Fe", "2"))
+    print("Fe2, j0的参数：", db.get_params("Fe", "2", "j0"))
+
+    xdb = XRayFormFactorDB(r"D:\\study\\Program\\XRD_Form_Factors\\Xray_scatter_data")
+    print("X射线有数据的元素：", xdb.get_all_elements())
+    print("H的method：", xdb.get_method("H"))
     print("H的数据点：", xdb.get_points("H"))
\ No newline at end of file
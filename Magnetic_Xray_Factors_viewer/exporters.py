@@ -0,0 +1,245 @@
+import os
+import json
+import numpy as np
+from perf import PERF
+
+# 曲线数据导出：整块数组写出（export_columns）或逐块流式写出（export_stream），支持
+#   .dat/.txt  Tab 分隔文本（与原 on_export 格式一致，"# " 开头的表头 + %.6f 数据）
+#   .npy       (点数, 列数) float64 数组
+#   .npz       每列一个数组，另含 header / columns
+#   .bin       原始小端 float64（C 顺序，可 np.memmap），旁附 .json 描述 dtype/shape/列名
+TEXT_FORMATS = (".dat", ".txt")
+BINARY_FORMATS = (".npy", ".npz", ".bin")
+FORMATS = TEXT_FORMATS + BINARY_FORMATS
+
+_CHUNK_ROWS = 1 << 18
+_MAX_FAST = 9e12  # 超出此范围（或非有限值）时回退到逐值格式化
+
+
+def format_fixed(arr, decimals=6):
+    # 向量化的 "%.{decimals}f" 格式化，二维数组按行输出，列间 Tab、行末换行
+    arr = np.asarray(arr, dtype=float)
+    n, m = arr.shape
+    if n == 0:
+        return b""
+    if not np.all(np.isfinite(arr)) or np.abs(arr).max() >= _MAX_FAST:
+        row = "\t".join([f"%.{decimals}f"] * m) + "\n"
+        return ((row * n) % tuple(arr.ravel().tolist())).encode("ascii")
+
+    scale = 10 ** decimals
+    # 整数与小数部分分开舍入，避免大数乘以 10^decimals 后丢失精度；
+    # rint 四舍六入五成双，与 printf 对精确 .5 的处理一致
+    a = np.abs(arr).ravel()
+    whole = np.floor(a)
+    scaled = (a - whole) * scale
+    frac = np.rint(scaled).astype(np.int64)
+    carry = frac >= scale
+    ip = whole.astype(np.int64) + carry
+    fp = np.where(carry, 0, frac)
+    # 接近 .5 的值取决于精确的十进制展开，这些少数值交给 printf
+    ties = np.nonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)[0]
+    for i in ties:
+        int_str, frac_str = (f"%.{decimals}f" % a[i]).split(".")
+        ip[i], fp[i] = int(int_str), int(frac_str)
+    neg = np.signbit(arr).ravel()
+
+    n_int = 1
+    while n_int < 19 and (ip >= 10 ** n_int).any():
+        n_int += 1
+    width = 1 + n_int + 1 + decimals + 1  # 符号 + 整数 + 小数点 + 小数 + 分隔符
+    buf = np.zeros((a.size, width), dtype=np.uint8)
+
+    for k in range(decimals):
+        fp, digit = np.divmod(fp, 10)
+        buf[:, width - 2 - k] = digit + 48
+    buf[:, width - 2 - decimals] = ord(".")
+    int_end = width - 3 - decimals
+    digits = np.ones(a.size, dtype=np.int64)
+    for k in range(n_int):
+        ip, digit = np.divmod(ip, 10)
+        if k == 0:
+            buf[:, int_end] = digit + 48
+        else:
+            present = (ip > 0) | (digit > 0)
+            buf[present, int_end - k] = digit[present] + 48
+            digits += present
+    # 负号紧贴最高位数字
+    rows = np.nonzero(neg)[0]
+    buf[rows, int_end - digits[rows]] = ord("-")
+
+    sep = buf.reshape(n, m, width)
+    sep[:, :-1, -1] = ord("\t")
+    sep[:, -1, -1] = ord("\n")
+    flat = buf.ravel()
+    return flat[flat != 0].tobytes()
+
+
+def format_rows(arr, decimals=6, int_columns=0):
+    # 前 int_columns 列按整数输出（如 h k l mult），其余列 "%.{decimals}f"
+    arr = np.asarray(arr, dtype=float)
+    if not int_columns or not len(arr):
+        return format_fixed(arr, decimals)
+    left = format_fixed(np.rint(arr[:, :int_columns]), 0).replace(b".", b"")
+    if arr.shape[1] == int_columns:
+        return left
+    right = format_fixed(arr[:, int_columns:], decimals)
+    return b"".join(a + b"\t" + b + b"\n" for a, b in zip(left.split(b"\n")[:-1], right.split(b"\n")[:-1]))
+
+
+def write_text(path, header_lines, data, decimals=6, progress=None, int_columns=0):
+    # progress(完成比例) 每写完一块调用一次，可抛出异常以中止
+    data = np.asarray(data, dtype=float)
+    with open(path, "wb") as f:
+        for line in header_lines:
+            f.write(f"# {line}\n".encode("utf-8"))
+        for start in range(0, len(data), _CHUNK_ROWS):
+            f.write(format_rows(data[start:start + _CHUNK_ROWS], decimals, int_columns))
+            if progress:
+                progress(min(1.0, (start + _CHUNK_ROWS) / len(data)))
+
+
+def write_raw(path, header_lines, columns, data):
+    # 原始 float64 + JSON 描述，读取见 load_raw
+    data = np.ascontiguousarray(data, dtype="<f8")
+    mm = np.memmap(path, dtype="<f8", mode="w+", shape=data.shape) if data.size else None
+    if mm is not None:
+        mm[:] = data
+        mm.flush()
+        del mm
+    else:
+        open(path, "wb").close()
+    meta = {"dtype": "<f8", "shape": list(data.shape), "order": "C",
+            "columns": list(columns), "header": list(header_lines)}
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+
+def load_raw(path, mode="r"):
+    with open(path + ".json", encoding="utf-8") as f:
+        meta = json.load(f)
+    shape = tuple(meta["shape"])
+    if not all(shape):
+        return np.empty(shape, dtype=meta["dtype"]), meta
+    return np.memmap(path, dtype=meta["dtype"], mode=mode, shape=shape, order=meta.get("order", "C")), meta
+
+
+def _written_bytes(path, fmt):
+    # np.save / np.savez 会自动补扩展名，.bin 另有 .json 描述文件
+    paths = [path] if path.endswith(fmt) or fmt in TEXT_FORMATS else [path + fmt]
+    if fmt == ".bin":
+        paths.append(path + ".json")
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def export_columns(path, header_lines, columns, arrays, fmt=None, progress=None, int_columns=0):
+    # columns: 列名；arrays: 等长一维数组列表；fmt 缺省时由扩展名决定；
+    # 前 int_columns 列为整数：文本中不带小数，.npz 中保留整数类型
+    fmt = (fmt or os.path.splitext(path)[1] or ".dat").lower()
+    if not fmt.startswith("."):
+        fmt = "." + fmt
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式：{fmt}")
+    with PERF.span(f"export{fmt}", points=sum(len(a) for a in arrays)) as sp:
+        _export_columns(path, header_lines, columns, arrays, fmt, progress, int_columns)
+        sp.add(bytes=_written_bytes(path, fmt))
+
+
+def _export_columns(path, header_lines, columns, arrays, fmt, progress, int_columns=0):
+    if fmt == ".npz":
+        np.savez(path, header=np.array(header_lines), columns=np.array(columns),
+                 **{name: np.asarray(a, dtype=np.int64 if k < int_columns else float)
+                    for k, (name, a) in enumerate(zip(columns, arrays))})
+        return
+    data = np.column_stack([np.asarray(a, dtype=float) for a in arrays])
+    if fmt in TEXT_FORMATS:
+        write_text(path, header_lines, data, progress=progress, int_columns=int_columns)
+        return
+    elif fmt == ".npy":
+        np.save(path, data)
+    else:
+        write_raw(path, header_lines, columns, data)
+    if progress:
+        progress(1.0)
+
+
+def export_stream(path, header_lines, columns, n_rows, chunks, fmt=None, progress=None):
+    # 流式导出：chunks 逐块给出 (行数, 列数) 数组，总行数 n_rows 预先给定；文本逐块追加，
+    # .npy/.bin 写入内存映射文件，内存占用只与块大小有关。.npz 需要整列数组，不支持流式写出
+    fmt = (fmt or os.path.splitext(path)[1] or ".dat").lower()
+    if not fmt.startswith("."):
+        fmt = "." + fmt
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的导出格式：{fmt}")
+    if fmt == ".npz":
+        raise ValueError(".npz 不支持流式导出，请改用 .npy 或 .bin")
+    shape = (n_rows, len(columns))
+    with PERF.span(f"export.stream{fmt}", points=n_rows * len(columns)) as sp:
+        if fmt in TEXT_FORMATS:
+            f = open(path, "wb")
+            for line in header_lines:
+                f.write(f"# {line}\n".encode("utf-8"))
+            out = None
+        elif fmt == ".npy":
+            # 与 np.save 一致，自动补扩展名
+            if not path.endswith(".npy"):
+                path += ".npy"
+            out = np.lib.format.open_memmap(path, mode="w+", dtype="<f8", shape=shape)
+        else:
+            out = np.memmap(path, dtype="<f8", mode="w+", shape=shape) if n_rows else None
+            if out is None:
+                open(path, "wb").close()
+            with open(path + ".json", "w", encoding="utf-8") as meta:
+                json.dump({"dtype": "<f8", "shape": list(shape), "order": "C",
+                           "columns": list(columns), "header": list(header_lines)}, meta, ensure_ascii=False, indent=1)
+        row = 0
+        try:
+            for rows in chunks:
+                if out is None:
+                    f.write(format_fixed(rows))
+                else:
+                    out[row:row + len(rows)] = rows
+                row += len(rows)
+                if progress:
+                    progress(row / n_rows if n_rows else 1.0)
+        finally:
+            if out is None:
+                f.close()
+            else:
+                out.flush()
+                del out
+        if row != n_rows:
+            raise ValueError(f"流式导出行数不符：预期 {n_rows}，实际 {row}")
+        sp.add(bytes=_written_bytes(path, fmt))
+
+
+def magnetic_header(elem, valence, jtypes):
+    return [f"{elem} {valence}+ Form Factor", "s\t" + "\t".join(jtypes)]
+
+
+def export_magnetic(path, elem, valence, s, jtypes, curves, fmt=None, progress=None):
+    header = magnetic_header(elem, valence, jtypes)
+    export_columns(path, header, ["s"] + list(jtypes), [s] + list(curves), fmt, progress)
+
+
+def export_comparison(path, s, curves, ys, fmt=None, progress=None):
+    # 多离子对比导出为一张宽表：s 列后每条曲线一列，列名如 Fe2+_j0；curves 为 [(元素, 价态, j类型)]
+    columns = [f"{elem}{valence}+_{jt}" for elem, valence, jt in curves]
+    header = [f"Form Factor comparison ({len(columns)} curves)", "s\t" + "\t".join(columns)]
+    export_columns(path, header, ["s"] + columns, [s] + list(ys), fmt, progress)
+
+
+def export_dipole(path, s, ions, labels, f, fmt=None, progress=None):
+    # 偶极近似 F(s)：s 列后每个离子 × 每组权重一列，列名如 Fe2+_g=1.5；f 为 (离子, 组数, 点数)
+    columns = [f"{elem}{valence}+_{label}" for elem, valence in ions for label in labels]
+    header = [f"Dipole form factor F = <j0> + C2<j2> + C4<j4> + C6<j6> ({len(columns)} curves)",
+              "s\t" + "\t".join(columns)]
+    export_columns(path, header, ["s"] + columns, [s] + list(np.reshape(f, (len(columns), -1))), fmt, progress)
+
+def export_mixtures(path, s, labels, f, fmt=None, progress=None):
+    # 混合价态/部分占位：s 列后每个组成一列，列名为组成写法（如 Fe2+:0.5 Fe3+:0.5）；f 为 (组成数, 点数)
+    header = [f"Site form factors ({len(labels)} compositions)", "s\t" + "\t".join(labels)]
+    export_columns(path, header, ["s"] + list(labels), [s] + list(f), fmt, progress)
+
+def export_xray(path, elem, method, x, y, fmt=None, progress=None):
+    header = [f"{elem} X射线散射因子", f"{method}", "(sinθ)/λ (Å⁻¹)\t散射因子 (count)"]
+    export_columns(path, header, ["s", "f"], [x, y], fmt, progress)
@@ -0,0 +1,394 @@
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+# 性能基准：解析、计算、绘图、导出各阶段的耗时与峰值内存，输出 JSON 便于跨版本比较
+# 用法示例：
+#   python ff_bench.py --out bench.json
+#   python ff_bench.py --ions 20000 --points 2000000 --stages parse eval export --out big.json
+#   python ff_bench.py --out new.json --compare old.json
+# 数据来源：随程序提供的 Magnetic_Form_factor_data / Xray_scatter_data，以及临时生成的合成表格
+# 绘图与界面阶段使用 offscreen Qt 平台，无需显示器
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STAGES = ("parse", "eval", "draw", "export", "gui")
+SYNTHETIC_SERIES = ("3d transition elements", "4d atoms", "rare earth ions", "actinide ions")
+
+
+def _rss_mb():
+    # 进程历史最大常驻内存（MB），不支持的平台返回 None
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+class Bench:
+    # 收集各阶段结果；每个阶段重复 repeat 次取最小与中位耗时，
+    # 峰值内存另外单独运行一次、由 tracemalloc 统计（tracemalloc 会拖慢纯 Python 代码，不计入耗时）
+    def __init__(self, repeat=3, trace=True, log=sys.stderr):
+        self.repeat = repeat
+        self.trace = trace
+        self.log = log
+        self.results = []
+
+    def run(self, name, fn, repeat=None, **info):
+        times = []
+        result = None
+        for _ in range(repeat or self.repeat):
+            gc.collect()
+            t0 = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - t0)
+        peak = 0
+        if self.trace:
+            result = None
+            gc.collect()
+            tracemalloc.start()
+            result = fn()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        entry = {
+            "name": name,
+            "seconds_min": min(times),
+            "seconds_median": float(np.median(times)),
+            "repeat": len(times),
+            "peak_alloc_mb": peak / (1024 * 1024) if self.trace else None,
+            "max_rss_mb": _rss_mb(),
+        }
+        entry.update(info)
+        if "points" in info:
+            entry["points_per_sec"] = info["points"] / max(min(times), 1e-12)
+        self.results.append(entry)
+        if self.log:
+            mem = f"，峰值 {entry['peak_alloc_mb']:.1f} MB" if self.trace else ""
+            print(f"{name:<32s} {entry['seconds_min'] * 1e3:10.2f} ms{mem}", file=self.log)
+        return result
+
+
+def _synthetic_names(n, prefix="Q"):
+    # 生成 n 个不重复的 "字母" 元素名，满足数据文件中 [A-Za-z]+ 的要求
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    names = []
+    for i in range(n):
+        name = ""
+        while True:
+            i, r = divmod(i, 26)
+            name = letters[r] + name
+            if i == 0:
+                break
+        names.append(prefix + name)
+    return names
+
+
+def write_synthetic_magnetic(data_dir, n_ions, seed=0):
+    # 按原始 TableN.txt 格式生成 4 个系列 × 4 种 j类型 的系数表，n_ions 个离子平均分配到各系列
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    valences = 5
+    names = _synthetic_names((n_ions + valences - 1) // valences)
+    ions = [f"{name}{v}" for name in names for v in range(valences)][:n_ions]
+    per_series = np.array_split(np.arange(len(ions)), len(SYNTHETIC_SERIES))
+    table = 0
+    for j_type in ("j0", "j2", "j4", "j6"):
+        for series, members in zip(SYNTHETIC_SERIES, per_series):
+            table += 1
+            params = np.column_stack([
+                rng.uniform(-0.5, 1.0, len(members)), rng.uniform(1.0, 100.0, len(members)),
+                rng.uniform(-0.5, 1.0, len(members)), rng.uniform(0.5, 40.0, len(members)),
+                rng.uniform(-0.5, 1.0, len(members)), rng.uniform(0.1, 15.0, len(members)),
+                rng.uniform(-0.05, 0.05, len(members)),
+            ])
+            lines = [f"<{j_type}> form factors for {series}" + "\t" * 7,
+                     "Ion\tA\ta\tB\tb\tC\tc\tD"]
+            lines += [ions[i] + "".join(f"\t{v:.4f}" for v in row) for i, row in zip(members, params)]
+            with open(os.path.join(data_dir, f"Table{table}.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+    return len(ions)
+
+
+def write_synthetic_xray(data_dir, n_elements, n_points=62, per_table=10, seed=0):
+    # 按原始 Table_*.txt 格式生成 n_elements 个元素的散射因子表，每个文件 per_table 列
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    names = _synthetic_names(n_elements, prefix="X")
+    s = np.concatenate([np.linspace(0, 2, n_points - 12), np.linspace(2.2, 6, 12)])[:n_points]
+    for start in range(0, n_elements, per_table):
+        cols = names[start:start + per_table]
+        z = np.arange(start + 1, start + len(cols) + 1)
+        # 单调下降的高斯和，形状与真实散射因子相近
+        a = rng.uniform(0.5, 10, (len(cols), 4))
+        b = rng.uniform(0.1, 60, (len(cols), 4))
+        f = (a[:, :, None] * np.exp(-b[:, :, None] * s ** 2)).sum(axis=1) + 0.1
+        lines = ["Element\t" + "\t".join(cols),
+                 "Z\t" + "\t".join(f"{v} " for v in z),
+                 "Method\t" + "\t".join("RHF" for _ in cols)]
+        lines += [f"{s[i]:.2f}\t" + "\t".join(f"{v:.3f}" for v in f[:, i]) for i in range(len(s))]
+        name = f"Table_{z[0]}-{z[-1]}.txt"
+        with open(os.path.join(data_dir, name), "w", encoding="utf-8") as out:
+            out.write("\n".join(lines) + "\n")
+    return n_elements
+
+
+def bench_parse(bench, label, mag_dir, xray_dir, work_dir):
+    from data_manager import MagneticFormFactorDB, XRayFormFactorDB, CACHE_DIR_NAME
+    # 拷贝到临时目录，避免读写数据目录下的缓存
+    mag = os.path.join(work_dir, f"{label}_magnetic")
+    xray = os.path.join(work_dir, f"{label}_xray")
+    shutil.copytree(mag_dir, mag, ignore=shutil.ignore_patterns(CACHE_DIR_NAME))
+    shutil.copytree(xray_dir, xray, ignore=shutil.ignore_patterns(CACHE_DIR_NAME))
+
+    def cold(cls, path):
+        shutil.rmtree(os.path.join(path, CACHE_DIR_NAME), ignore_errors=True)
+        return cls(path)
+
+    db = bench.run(f"parse.{label}.magnetic.text", lambda: MagneticFormFactorDB(mag, use_cache=False))
+    bench.run(f"parse.{label}.magnetic.cold_cache", lambda: cold(MagneticFormFactorDB, mag))
+    bench.run(f"parse.{label}.magnetic.warm_cache", lambda: MagneticFormFactorDB(mag))
+    first = db.registry.records[0]
+    bench.run(f"parse.{label}.magnetic.lazy_one_ion",
+              lambda: MagneticFormFactorDB(mag, lazy=True).get_params(first.elem, first.valence, "j0"))
+    xdb = bench.run(f"parse.{label}.xray.text", lambda: XRayFormFactorDB(xray, use_cache=False))
+    bench.run(f"parse.{label}.xray.cold_cache", lambda: cold(XRayFormFactorDB, xray))
+    bench.run(f"parse.{label}.xray.warm_cache", lambda: XRayFormFactorDB(xray))
+    return db, xdb
+
+
+def bench_eval(bench, label, db, xdb, n_points):
+    from form_factor_engine import MagneticFormFactorEngine, XRayFormFactorEngine, evaluate_grid, theta_grid
+    engine = bench.run(f"eval.{label}.magnetic.engine_build", lambda: MagneticFormFactorEngine(db))
+    xengine = bench.run(f"eval.{label}.xray.engine_build", lambda: XRayFormFactorEngine(xdb))
+    n_ions = len(engine)
+
+    # 单个离子、n_points 点的 θ 网格（即 GUI on_plot 的计算路径）
+    elem, valence = engine.ions[0]
+    step = 90.0 / (n_points - 1)
+    bench.run(f"eval.{label}.magnetic.one_ion_grid",
+              lambda: evaluate_grid(engine, elem, valence, ["j0", "j2", "j4", "j6"], 1.5, 0.0, 90.0, step),
+              points=4 * n_points)
+    # 全部离子 × 4 种 j类型，结果数限制在约 800 万个以内
+    s_all = np.linspace(0, 1.5, max(2, min(n_points, 8_000_000 // (4 * max(n_ions, 1)))))
+    bench.run(f"eval.{label}.magnetic.all_ions", lambda: engine.evaluate(s_all),
+              points=4 * n_ions * len(s_all), ions=n_ions)
+    # X 射线 PCHIP：全部元素在同一 s 网格上
+    n_elem = len(xengine.elements)
+    s_x = np.linspace(0, 2, max(2, min(n_points, 8_000_000 // max(n_elem, 1))))
+    bench.run(f"eval.{label}.xray.all_elements", lambda: xengine.evaluate(s_x),
+              points=n_elem * len(s_x), elements=n_elem)
+    _, s = theta_grid(1.5, 0.0, 90.0, step)
+    curves = engine.evaluate(s, [(elem, valence)], ["j0", "j2", "j4"])[0]
+    return s, curves
+
+
+def bench_draw(bench, s, curves):
+    from PyQt5.QtWidgets import QApplication
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+    from matplotlib.figure import Figure
+    from plot_lod import LODPlotter
+    app = QApplication.instance() or QApplication(sys.argv)
+    fig = Figure(figsize=(8, 6), dpi=100)
+    canvas = FigureCanvas(fig)
+    canvas.resize(800, 600)
+
+    def draw(lod):
+        fig.clear()
+        ax = fig.add_subplot(111)
+        plotter = LODPlotter(ax) if lod else None
+        for y in curves:
+            if lod:
+                plotter.plot(s, y)
+            else:
+                ax.plot(s, y)
+        canvas.draw()
+        if plotter:
+            plotter.disconnect()
+
+    points = curves.size
+    bench.run("draw.lod", lambda: draw(True), points=points)
+    bench.run("draw.full_resolution", lambda: draw(False), repeat=1, points=points)
+    app.processEvents()
+
+
+def bench_export(bench, s, curves, work_dir):
+    from exporters import export_magnetic
+    jtypes = ["j0", "j2", "j4"][:len(curves)]
+    for fmt in (".dat", ".npy", ".bin"):
+        path = os.path.join(work_dir, "export" + fmt)
+        bench.run(f"export{fmt}", lambda: export_magnetic(path, "Fe", "2", s, jtypes, curves, fmt),
+                  points=curves.size)
+        bench.results[-1]["bytes"] = os.path.getsize(path)
+
+
+def bench_gui(bench, n_points):
+    # 完整界面路径：窗口显示 → 后台加载数据 → on_plot（工作线程计算 + 绘图）
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    from PyQt5.QtCore import QThreadPool
+    import Magnetic_Xray_gui as gui
+    app = QApplication.instance() or QApplication(sys.argv)
+    gui.MAGNETIC_DATA_DIR = os.path.join(HERE, "Magnetic_Form_factor_data")
+    gui.XRAY_DATA_DIR = os.path.join(HERE, "Xray_scatter_data")
+    QMessageBox.question = staticmethod(lambda *a, **k: QMessageBox.Yes)
+
+    def report(parent, title, text, *a, **k):
+        # 基准中不弹出模态对话框
+        print(f"{title}: {text}", file=sys.stderr)
+    QMessageBox.information = QMessageBox.warning = staticmethod(report)
+
+    def wait(done):
+        # 处理事件直到条件满足（后台加载由 QTimer 在事件循环中启动）
+        pool = QThreadPool.globalInstance()
+        while not done():
+            pool.waitForDone(20)
+            app.processEvents()
+
+    windows = []
+
+    def startup():
+        while windows:
+            windows.pop().close()
+        win = gui.MainWindow()
+        win.show()
+        windows.append(win)
+        wait(lambda: win.db is not None and win.xdb is not None)
+        return win
+
+    win = bench.run("gui.startup", startup, repeat=1)
+    win.on_element_clicked("Fe")
+    win.w_input.setText("1.5")
+    win.max_points_input.setText(str(n_points))
+    win.theta_step.setText(repr(90.0 / (n_points - 1)))
+    win.theta_min.setText("0")
+    win.theta_max.setText("90")
+
+    def plot():
+        win.curve_cache.clear()
+        win.last_plot_data = None
+        win.on_plot()
+        wait(lambda: win._worker is None)
+        if win.last_plot_data is None:
+            raise RuntimeError("on_plot 未生成曲线")
+
+    bench.run("gui.on_plot", plot, points=n_points)
+    win.close()
+
+
+def compare(results, old_path, log=sys.stderr):
+    # 与旧结果逐阶段比较最小耗时
+    with open(old_path, encoding="utf-8") as f:
+        old = {entry["name"]: entry for entry in json.load(f)["stages"]}
+    print(f"{'阶段':<32s} {'旧 (ms)':>10s} {'新 (ms)':>10s} {'比值':>7s}", file=log)
+    for entry in results:
+        prev = old.get(entry["name"])
+        if prev is None:
+            continue
+        ratio = entry["seconds_min"] / max(prev["seconds_min"], 1e-12)
+        print(f"{entry['name']:<32s} {prev['seconds_min'] * 1e3:10.2f} {entry['seconds_min'] * 1e3:10.2f} "
+              f"{ratio:7.2f}", file=log)
+
+
+def environment():
+    import matplotlib
+    info = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        from PyQt5.QtCore import QT_VERSION_STR
+        info["qt"] = QT_VERSION_STR
+    except ImportError:
+        info["qt"] = None
+    return info
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Magia_Form_Factor_Viewer 性能基准")
+    parser.add_argument("--out", help="JSON 结果文件，缺省输出到标准输出")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="要运行的阶段，默认全部")
+    parser.add_argument("--ions", type=int, default=10000, help="合成磁性表格的离子数")
+    parser.add_argument("--xray-elements", type=int, default=1000, help="合成X射线表格的元素数")
+    parser.add_argument("--points", type=int, default=1_000_000, help="θ 网格点数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段的重复次数")
+    parser.add_argument("--no-synthetic", action="store_true", help="只使用随程序提供的数据")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="不统计峰值内存（省去每个阶段额外的一次运行）")
+    parser.add_argument("--compare", help="与此前的 JSON 结果比较")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "Magnetic_Form_factor_data"))
+    parser.add_argument("--xray-data-dir", default=os.path.join(HERE, "Xray_scatter_data"))
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    sys.path.insert(0, HERE)
+    bench = Bench(repeat=args.repeat, trace=not args.no_tracemalloc)
+    work_dir = tempfile.mkdtemp(prefix="ff_bench_")
+    try:
+        datasets = [("bundled", args.data_dir, args.xray_data_dir)]
+        if not args.no_synthetic:
+            mag = os.path.join(work_dir, "synthetic_magnetic_src")
+            xray = os.path.join(work_dir, "synthetic_xray_src")
+            write_synthetic_magnetic(mag, args.ions)
+            write_synthetic_xray(xray, args.xray_elements)
+            datasets.append(("synthetic", mag, xray))
+
+        s = curves = None
+        for label, mag, xray in datasets:
+            if "parse" in args.stages or "eval" in args.stages:
+                db, xdb = bench_parse(bench, label, mag, xray, work_dir)
+                if "eval" in args.stages:
+                    s, curves = bench_eval(bench, label, db, xdb, args.points)
+        if s is None and ("draw" in args.stages or "export" in args.stages):
+            from form_factor_engine import theta_grid
+            _, s = theta_grid(1.5, 0.0, 90.0, 90.0 / (args.points - 1))
+            s2 = s * s
+            curves = np.stack([np.exp(-10 * s2), np.exp(-5 * s2) * s2, np.exp(-3 * s2) * s2])
+        if "draw" in args.stages:
+            bench_draw(bench, s, curves)
+        if "export" in args.stages:
+            bench_export(bench, s, curves, work_dir)
+        if "gui" in args.stages:
+            bench_gui(bench, args.points)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "config": {
+            "stages": args.stages,
+            "ions": args.ions,
+            "xray_elements": args.xray_elements,
+            "points": args.points,
+            "repeat": args.repeat,
+            "synthetic": not args.no_synthetic,
+            "tracemalloc": not args.no_tracemalloc,
+        },
+        "stages": bench.results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        compare(bench.results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import numpy as np
+from exporters import FORMATS, export_magnetic, export_xray, export_dipole, export_stream, magnetic_header
+from data_manager import MagneticFormFactorDB, XRayFormFactorDB
+from form_factor_engine import (
+    MagneticFormFactorEngine, XRayFormFactorEngine, GaussianXRayEngine, DipoleFormFactorEngine, StreamingEvaluator, J_TYPES, EVAL_CHUNK,
+    ion_label, theta_grid, grid_size, parse_values, dipole_weights, dipole_labels,
+)
+
+# 无界面批量生成曲线：离子 × 波长 × θ范围 扫描，逐条计算并立即写出
+# 用法示例：
+#   python ff_cli.py --ions 3d Gd3 --j j0 j2 --wavelength 1.5 2.4 --theta 0:80:0.05 --out curves
+#   python ff_cli.py --spec sweep.json
+#   python ff_cli.py --ions rare\ earth --g 0.5:2:0.1 --c4 0.01 --wavelength 2.4 --theta 0:80:0.05 --out dipole
+# sweep.json 的键与命令行参数同名：ions, j_types, wavelengths, theta_ranges, xray_elements, xray_model, output_dir,
+# format, stream, g, c2, c4, c6；给出 g 或 c2 时磁性部分改为输出偶极近似 F(s)（每个离子一个文件，每个 g 或 C2 一列），不再输出各 <jl>
+# θ网格超过 STREAM_POINTS 点（或指定 --stream）时磁性曲线逐块计算并写出，内存占用与网格大小无关（.npz 除外）
+# X射线散射因子默认由数据表 PCHIP 插值（--xray-model pchip），--xray-model gaussian 改用 xray_fitting
+# 拟合的 Cromer–Mann 系数表（Xray_gaussian_coeffs.txt，可用 --xray-coeffs 指定）闭式计算
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ION_CHUNK = 64  # 每次向量化计算的离子数，限制内存占用
+STREAM_POINTS = 4 * EVAL_CHUNK
+XRAY_MODELS = ("pchip", "gaussian")
+GAUSSIAN_COEFFS = os.path.join(HERE, "Xray_gaussian_coeffs.txt")
+
+
+def parse_theta_range(text):
+    # "min:max:step" -> (min, max, step)
+    parts = [float(p) for p in str(text).split(":")]
+    if len(parts) != 3:
+        raise ValueError(f"θ范围格式应为 min:max:step，得到 {text}")
+    return tuple(parts)
+
+
+def check_grid(w, theta_min, theta_max, theta_step):
+    # 与 GUI on_plot 相同的参数校验
+    if w <= 0 or theta_min < 0 or theta_max > 180 or theta_min >= theta_max or theta_step <= 0:
+        raise ValueError(f"无效的波长/θ范围：λ={w}, θ={theta_min}:{theta_max}:{theta_step}")
+
+
+def make_xray_engine(model="pchip", data_dir=None, coeffs=None, xdb=None):
+    # 返回 (X射线引擎, 元素 -> 方法说明)；pchip 为数据表插值，gaussian 为拟合系数闭式计算
+    if model == "gaussian":
+        engine = GaussianXRayEngine.from_file(coeffs or GAUSSIAN_COEFFS)
+        return engine, lambda elem: engine.method
+    if model != "pchip":
+        raise ValueError(f"未知的X射线模型：{model}（可选 {' '.join(XRAY_MODELS)}）")
+    xdb = xdb or XRayFormFactorDB(data_dir or os.path.join(HERE, "Xray_scatter_data"))
+    return XRayFormFactorEngine(xdb), xdb.get_method
+
+
+def resolve_ions(db, specs):
+    # 支持 "all"、系列名（"3d", "4d", "rare earth", "actinide"，可写作 "all 3d"）、
+    # 元素（"Fe" 即全部价态）、离子（"Fe2" / "Fe2+"）及通配符（"Fe*", "*3"）
+    registry = db.registry
+    all_ions = list(registry.by_ion)
+    labels = {rec.label: ion for ion, rec in registry.by_ion.items()}
+    series = {name.lower(): name for name in db.get_series()}
+    result = []
+    for spec in specs:
+        key = spec.strip()
+        lowered = key.lower()
+        if lowered.startswith("all "):
+            lowered = lowered[4:].strip()
+        if lowered == "all":
+            matched = all_ions
+        elif lowered in series:
+            matched = db.get_series_ions(series[lowered])
+        elif key in registry.by_element:
+            matched = [(rec.elem, rec.valence) for rec in registry.by_element[key]]
+        elif key in registry.by_label:
+            rec = registry.by_label[key]
+            matched = [(rec.elem, rec.valence)]
+        else:
+            matched = [labels[label] for label in fnmatch.filter(labels, key.rstrip("+"))]
+        if not matched:
+            raise ValueError(f"没有匹配的离子：{spec}")
+        result.extend(matched)
+    # 去重并保持顺序
+    return list(dict.fromkeys(result))
+
+
+def stream_magnetic(engine, path, elem, valence, jtypes, grid, fmt, chunk=EVAL_CHUNK):
+    # 单个离子的超大网格：StreamingEvaluator 逐块计算，拼成 (行, s + j类型) 后流式写出
+    evaluator = StreamingEvaluator(engine, [(elem, valence)], jtypes, chunk)
+    rows = np.empty((chunk, 1 + len(jtypes)))
+
+    def chunks():
+        for _, _, s, y in evaluator.stream(*grid):
+            m = len(s)
+            rows[:m, 0] = s
+            rows[:m, 1:] = y[0].T
+            yield rows[:m]
+    export_stream(path, magnetic_header(elem, valence, jtypes), ["s"] + list(jtypes),
+                  grid_size(*grid[1:]), chunks(), fmt)
+
+
+def spec_dipole_weights(spec):
+    # 从 spec 的 g / c2 / c4 / c6 得到 (权重, 标签)；g、c2 可为数值列表或 "min:max:step"，未给出时返回 None
+    g, c2 = spec.get("g"), spec.get("c2")
+    if g is None and c2 is None:
+        return None
+
+    def values(v):
+        if v is None:
+            return None
+        items = [v] if isinstance(v, (str, int, float)) else list(v)
+        return np.concatenate([parse_values(x) if isinstance(x, str) else np.atleast_1d(float(x)) for x in items])
+    g, c2 = values(g), values(c2)
+    weights = dipole_weights(g=g, c2=c2, c4=float(spec.get("c4") or 0.0), c6=float(spec.get("c6") or 0.0))
+    return weights, dipole_labels(weights, g)
+
+
+def run_dipole(engine, ions, weights, labels, grid, path_for, fmt):
+    # 偶极近似：离子分块，每块一次计算全部离子 × 全部权重组；返回 (曲线数, 点数)
+    dipole = DipoleFormFactorEngine(engine)
+    _, s = theta_grid(*grid)
+    n_curves = n_points = 0
+    step = max(1, ION_CHUNK // len(weights))
+    for start in range(0, len(ions), step):
+        chunk = ions[start:start + step]
+        block = dipole.evaluate(s, chunk, weights)
+        for (elem, valence), f in zip(chunk, block):
+            if np.isnan(f).all():
+                continue
+            export_dipole(path_for(elem, valence), s, [(elem, valence)], labels, f[None], fmt)
+            n_curves += len(labels)
+            n_points += len(labels) * len(s)
+    return n_curves, n_points
+
+
+def run_sweep(spec, db=None, xdb=None, log=sys.stderr):
+    out_dir = spec.get("output_dir", ".")
+    os.makedirs(out_dir, exist_ok=True)
+    wavelengths = [float(w) for w in spec.get("wavelengths", [])]
+    fmt = "." + spec.get("format", "dat").lstrip(".")
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的输出格式：{fmt}")
+    ranges = [parse_theta_range(r) if isinstance(r, str) else tuple(r) for r in spec.get("theta_ranges", [])]
+    if not wavelengths or not ranges:
+        raise ValueError("至少需要一个波长和一个θ范围")
+    for w in wavelengths:
+        for r in ranges:
+            check_grid(w, *r)
+
+    n_curves = n_points = 0
+    t0 = time.perf_counter()
+
+    ions = spec.get("ions", [])
+    if ions:
+        db = db or MagneticFormFactorDB(spec.get("data_dir", os.path.join(HERE, "Magnetic_Form_factor_data")))
+        engine = MagneticFormFactorEngine(db)
+        ions = resolve_ions(db, ions)
+        jtypes = list(spec.get("j_types") or J_TYPES)
+        dipole = spec_dipole_weights(spec)
+        for w in wavelengths:
+            for theta_min, theta_max, theta_step in ranges:
+                if dipole is not None:
+                    curves, points = run_dipole(
+                        engine, ions, *dipole, (w, theta_min, theta_max, theta_step),
+                        lambda elem, valence: os.path.join(out_dir, f"{ion_label(elem, valence)}_dipole_lambda{w:g}"
+                                                                    f"_theta{theta_min:g}-{theta_max:g}{fmt}"), fmt)
+                    n_curves += curves
+                    n_points += points
+                    continue
+                n = grid_size(theta_min, theta_max, theta_step)
+                if fmt != ".npz" and (spec.get("stream") or n > STREAM_POINTS):
+                    for elem, valence in ions:
+                        present = [jt for jt in jtypes if engine.has(elem, valence, jt)]
+                        if not present:
+                            continue
+                        name = f"{ion_label(elem, valence)}_lambda{w:g}_theta{theta_min:g}-{theta_max:g}{fmt}"
+                        stream_magnetic(engine, os.path.join(out_dir, name), elem, valence, present,
+                                        (w, theta_min, theta_max, theta_step), fmt)
+                        n_curves += len(present)
+                        n_points += len(present) * n
+                    continue
+                _, s = theta_grid(w, theta_min, theta_max, theta_step)
+                for start in range(0, len(ions), ION_CHUNK):
+                    chunk = ions[start:start + ION_CHUNK]
+                    block = engine.evaluate(s, chunk, jtypes)
+                    for (elem, valence), curves in zip(chunk, block):
+                        present = [k for k, jt in enumerate(jtypes) if engine.has(elem, valence, jt)]
+                        if not present:
+                            continue
+                        name = f"{ion_label(elem, valence)}_lambda{w:g}_theta{theta_min:g}-{theta_max:g}{fmt}"
+                        export_magnetic(os.path.join(out_dir, name), elem, valence, s,
+                                        [jtypes[k] for k in present], curves[present], fmt)
+                        n_curves += len(present)
+                        n_points += len(present) * len(s)
+
+    xray_elements = spec.get("xray_elements", [])
+    if xray_elements:
+        xengine, get_method = make_xray_engine(spec.get("xray_model", "pchip"), spec.get("xray_data_dir"),
+                                               spec.get("xray_coeffs"), xdb)
+        if any(e.lower() == "all" for e in xray_elements):
+            xray_elements = xengine.elements
+        for w in wavelengths:
+            for theta_min, theta_max, theta_step in ranges:
+                _, s = theta_grid(w, theta_min, theta_max, theta_step)
+                block = xengine.evaluate(s, xray_elements)
+                for elem, y in zip(xray_elements, block):
+                    name = f"{elem}_xray_lambda{w:g}_theta{theta_min:g}-{theta_max:g}{fmt}"
+                    export_xray(os.path.join(out_dir, name), elem, get_method(elem), s, y, fmt)
+                    n_curves += 1
+                    n_points += len(s)
+
+    elapsed = time.perf_counter() - t0
+    if log:
+        print(f"共生成 {n_curves} 条曲线，{n_points} 个点，用时 {elapsed:.2f} s，输出目录 {out_dir}", file=log)
+    return n_curves, n_points
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Magia_Form_Factor_Viewer 批量曲线生成")
+    parser.add_argument("--spec", help="JSON 格式的扫描描述文件，命令行参数会覆盖其中同名项")
+    parser.add_argument("--ions", nargs="+", help="离子、元素、系列或通配符，如 3d Fe2 Gd 'Co*'")
+    parser.add_argument("--j", dest="j_types", nargs="+", choices=J_TYPES, help="j类型，默认全部")
+    parser.add_argument("--wavelength", dest="wavelengths", nargs="+", type=float, help="波长 λ (Å)")
+    parser.add_argument("--theta", dest="theta_ranges", nargs="+", help="θ范围 min:max:step (度)")
+    parser.add_argument("--xray", dest="xray_elements", nargs="+", help="同时输出这些元素的X射线散射因子，all 表示全部")
+    parser.add_argument("--xray-model", choices=XRAY_MODELS, help="X射线散射因子的计算方式，默认 pchip（数据表插值）")
+    parser.add_argument("--xray-coeffs", help="--xray-model gaussian 使用的系数表，默认 Xray_gaussian_coeffs.txt")
+    parser.add_argument("--out", dest="output_dir", help="输出目录")
+    parser.add_argument("--format", choices=[f.lstrip(".") for f in FORMATS], help="输出格式，默认 dat")
+    parser.add_argument("--stream", action="store_true", default=None, help="磁性曲线逐块计算并写出（超大网格自动启用）")
+    parser.add_argument("--g", nargs="+", help="偶极近似的 Landé g 因子（数值或 min:max:step），C2 = 2/g − 1")
+    parser.add_argument("--c2", nargs="+", help="直接给出偶极近似的 C2（数值或 min:max:step），与 --g 二选一")
+    parser.add_argument("--c4", type=float, help="偶极近似中 <j4> 的系数，默认 0")
+    parser.add_argument("--c6", type=float, help="偶极近似中 <j6> 的系数，默认 0")
+    parser.add_argument("--data-dir", help="磁性形状因子数据目录")
+    parser.add_argument("--xray-data-dir", help="X射线散射因子数据目录")
+    parser.add_argument("--perf", action="store_true", help="结束后输出各阶段耗时统计")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    spec = {}
+    if args.spec:
+        with open(args.spec, encoding="utf-8") as f:
+            spec = json.load(f)
+    for key, value in vars(args).items():
+        if key not in ("spec", "perf") and value is not None:
+            spec[key] = value
+    try:
+        run_sweep(spec)
+    except (ValueError, KeyError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    finally:
+        if args.perf:
+            from perf import PERF
+            print(PERF.summary_text(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+import json
+import urllib.request
+import urllib.error
+
+# ff_server.py 的客户端，只依赖标准库，可直接复制到其他工具中使用：
+#   from ff_client import FormFactorClient
+#   client = FormFactorClient()
+#   r = client.evaluate(["Fe2", "Gd3"], s=[0.0, 0.1, 0.2], j_types=["j0"])
+#   r["magnetic"][离子][j类型][点]，无数据为 None
+DEFAULT_URL = "http://127.0.0.1:8765"
+
+
+class FormFactorError(Exception):
+    pass
+
+
+class FormFactorClient:
+    def __init__(self, url=DEFAULT_URL, timeout=30.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        req = urllib.request.Request(self.url + path, data=data,
+                                     headers={"Content-Type": "application/json"} if data else {})
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise FormFactorError(f"{e.code}: {message}") from None
+
+    def evaluate(self, ions=None, s=None, j_types=None, xray=None, wavelength=None, theta=None):
+        # s 与 (wavelength, theta) 二选一；theta 可为 θ 列表或 "min:max:step"
+        payload = {}
+        if ions:
+            payload["ions"] = list(ions)
+        if j_types:
+            payload["j_types"] = list(j_types)
+        if xray:
+            payload["xray"] = list(xray)
+        if s is not None:
+            payload["s"] = [float(v) for v in s]
+        else:
+            payload["wavelength"] = wavelength
+            payload["theta"] = theta if isinstance(theta, str) else [float(v) for v in theta]
+        return self._request("/evaluate", payload)
+
+    def ions(self):
+        return self._request("/ions")
+
+    def stats(self):
+        return self._request("/stats")
+
+    def health(self):
+        return self._request("/health")
@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from exporters import FORMATS, export_columns
+from data_manager import MagneticFormFactorDB
+from form_factor_engine import MagneticFormFactorEngine, J_TYPES
+from ff_cli import HERE, XRAY_MODELS, resolve_ions, make_xray_engine
+from perf import PERF
+
+# 反射列表模式：由晶胞参数 (a, b, c, α, β, γ) 与 hkl 范围（或 hkl 文件）一次性求出全部反射的
+# d 与 s = 1/(2d)，合并对称等效的反射（记多重度），再在这些 s 上计算所选离子的 <jl>（及X射线 f），
+# 输出每行一个反射的表格：h k l mult d s [2θ] 各形状因子列，可直接交给精修程序
+# 等效按晶胞度规的对称操作（晶格的完全形 Laue 群，含 Friedel 对）判断：s 偶然相同但不等效的反射
+# （如立方晶胞的 333 与 511）保留为不同的行；晶体实际对称低于晶格时请用 --no-merge
+# 用法示例：
+#   python ff_hkl.py --cell 5.43 5.43 5.43 90 90 90 --d-min 0.8 --ions Fe2 Fe3 --j j0 j2 --out fe.dat
+#   python ff_hkl.py --cell 3.9 3.9 12.7 90 90 120 --hkl 6 6 20 --wavelength 2.4 --ions Nd3 --xray Nd --out nd.dat
+#   python ff_hkl.py --cell 5.43 5.43 5.43 90 90 90 --d-min 0.5 --xray Si --xray-model gaussian --out si.dat
+#   python ff_hkl.py --cell 5 6 7 90 101 90 --hkl-file refl.hkl --no-merge --ions Mn3 --out mn.npy
+# hkl 文件每行前三列为 h k l（"#" 开头为注释，其余列忽略）
+
+METRIC_TOL = 1e-6  # 变换后度规张量的相对差小于此值的操作视为晶格对称操作
+
+
+class UnitCell:
+    def __init__(self, a, b, c, alpha, beta, gamma):
+        self.params = (float(a), float(b), float(c), float(alpha), float(beta), float(gamma))
+        if min(self.params[:3]) <= 0:
+            raise ValueError(f"晶格常数必须为正：{self.params[:3]}")
+        if not all(0 < x < 180 for x in self.params[3:]):
+            raise ValueError(f"晶胞角度应在 0～180° 之间：{self.params[3:]}")
+        ca, cb, cg = np.cos(np.deg2rad(self.params[3:]))
+        a, b, c = self.params[:3]
+        # 实空间度规张量 G，倒易度规 G* = G⁻¹，1/d² = hᵀ·G*·h
+        self.metric = np.array([[a * a, a * b * cg, a * c * cb],
+                                [a * b * cg, b * b, b * c * ca],
+                                [a * c * cb, b * c * ca, c * c]])
+        if np.linalg.det(self.metric) <= 0:
+            raise ValueError(f"无效的晶胞角度：{self.params[3:]}")
+        self.reciprocal_metric = np.linalg.inv(self.metric)
+
+    @property
+    def volume(self):
+        return float(np.sqrt(np.linalg.det(self.metric)))
+
+    def inv_d2(self, hkl):
+        # hkl: (N, 3)，逐项展开二次型，避免构造 (N, 3, 3) 中间数组
+        g = self.reciprocal_metric
+        h, k, l = (np.asarray(hkl, dtype=float)[:, i] for i in range(3))
+        return (g[0, 0] * h * h + g[1, 1] * k * k + g[2, 2] * l * l
+                + 2 * (g[0, 1] * h * k + g[0, 2] * h * l + g[1, 2] * k * l))
+
+    def s_values(self, hkl):
+        # s = sinθ/λ = 1/(2d)
+        return 0.5 * np.sqrt(self.inv_d2(hkl))
+
+    def laue_operations(self, tol=METRIC_TOL):
+        # 保持倒易度规不变的整数矩阵 R（Rᵀ·G*·R = G*），作用于列向量 hkl；返回 (操作数, 3, 3)
+        # 元素取 -1/0/1 即可覆盖常规晶胞的全部晶格对称操作（立方 48 个，六方 24 个）
+        entries = np.array([-1, 0, 1])
+        ops = np.stack(np.meshgrid(*[entries] * 9, indexing="ij"), axis=-1).reshape(-1, 3, 3)
+        ops = ops[np.abs(np.rint(np.linalg.det(ops))) == 1]
+        g = self.reciprocal_metric
+        diff = np.abs(np.einsum("nji,jk,nkl->nil", ops, g, ops) - g).max(axis=(1, 2))
+        return ops[diff <= tol * np.abs(g).max()]
+
+    def hkl_limits(self, s_max):
+        # |h| = |r·a| ≤ |r|·a = 2·s_max·a，b、c 同理
+        return tuple(int(np.floor(2 * s_max * x + 1e-9)) for x in self.params[:3])
+
+
+def generate_hkl(h_max, k_max, l_max):
+    # -h_max..h_max × -k_max..k_max × -l_max..l_max 的全部 hkl（不含 000），(N, 3) int 数组
+    grid = np.mgrid[-h_max:h_max + 1, -k_max:k_max + 1, -l_max:l_max + 1].reshape(3, -1).T
+    return grid[np.any(grid != 0, axis=1)]
+
+
+def load_hkl(path):
+    hkl = np.loadtxt(path, comments="#", ndmin=2, usecols=(0, 1, 2))
+    if not np.array_equal(hkl, np.rint(hkl)):
+        raise ValueError(f"hkl 文件中有非整数指标：{path}")
+    return hkl.astype(int)
+
+
+def merge_equivalent(hkl, s, ops):
+    # 每个反射在全部对称操作下的像中取 (h, k, l) 字典序最大者（如 111 而非 -1-1-1）作为代表，
+    # 代表相同即等效；返回 (代表 hkl, s, 多重度)，按 s 升序
+    if not len(s):
+        return hkl.reshape(0, 3), s, np.zeros(0, dtype=int)
+    # 像的各分量不超过 3·max|h|，hkl 编码为单个整数键，字典序即键的大小
+    offset = 3 * int(np.abs(hkl).max())
+    width = 2 * offset + 1
+    key = np.full(len(hkl), -1, dtype=np.int64)
+    for op in ops:
+        image = hkl @ op.T + offset
+        np.maximum(key, (image[:, 0].astype(np.int64) * width + image[:, 1]) * width + image[:, 2], out=key)
+    key, first, mult = np.unique(key, return_index=True, return_counts=True)
+    order = np.argsort(s[first], kind="stable")
+    key, first, mult = key[order], first[order], mult[order]
+    rest, l = np.divmod(key, width)
+    h, k = np.divmod(rest, width)
+    rep = np.column_stack([h, k, l]) - offset
+    return rep, s[first], mult
+
+
+def build_reflections(cell, hkl, s_max=None, merge=True):
+    # 返回 {"hkl", "mult", "d", "s"}，各为按 s 升序的数组
+    hkl = np.asarray(hkl, dtype=int).reshape(-1, 3)
+    hkl = hkl[np.any(hkl != 0, axis=1)]
+    with PERF.span("hkl.reflections", hkl=len(hkl)) as sp:
+        s = cell.s_values(hkl)
+        if s_max is not None:
+            keep = s <= s_max * (1 + 1e-8)
+            hkl, s = hkl[keep], s[keep]
+        if merge:
+            hkl, s, mult = merge_equivalent(hkl, s, cell.laue_operations())
+        else:
+            order = np.argsort(s)
+            hkl, s, mult = hkl[order], s[order], np.ones(len(s), dtype=int)
+        sp.add(reflections=len(s))
+    return {"hkl": hkl, "mult": mult, "d": 0.5 / s, "s": s}
+
+
+def two_theta(s, wavelength):
+    # 2θ (度)；λ·s > 1 的反射不可达，记为 NaN
+    x = s * wavelength
+    return np.where(x <= 1, 2 * np.rad2deg(np.arcsin(np.minimum(x, 1))), np.nan)
+
+
+def evaluate_reflections(refl, engine=None, ions=(), jtypes=J_TYPES, xengine=None, xray_elements=(),
+                         wavelength=None):
+    # 返回 (列名, 列数组)；磁性列名如 Fe2+_j0（与多离子对比导出一致），无数据的组合不输出
+    s = refl["s"]
+    columns = ["h", "k", "l", "mult", "d", "s"]
+    arrays = [refl["hkl"][:, 0], refl["hkl"][:, 1], refl["hkl"][:, 2], refl["mult"], refl["d"], s]
+    if wavelength:
+        columns.append("2theta")
+        arrays.append(two_theta(s, wavelength))
+    if ions:
+        block = engine.evaluate(s, ions, jtypes)
+        for (elem, valence), curves in zip(ions, block):
+            for jt, y in zip(jtypes, curves):
+                if engine.has(elem, valence, jt):
+                    columns.append(f"{elem}{valence}+_{jt}")
+                    arrays.append(y)
+    if xray_elements:
+        for elem, y in zip(xray_elements, xengine.evaluate(s, xray_elements)):
+            columns.append(f"{elem}_xray")
+            arrays.append(y)
+    return columns, arrays
+
+
+def export_reflections(path, cell, columns, arrays, fmt=None):
+    a, b, c, alpha, beta, gamma = cell.params
+    header = [f"Reflection list ({len(arrays[0])} reflections)",
+              f"cell a={a:g} b={b:g} c={c:g} alpha={alpha:g} beta={beta:g} gamma={gamma:g}",
+              "\t".join(columns)]
+    export_columns(path, header, columns, arrays, fmt, int_columns=4)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Magia_Form_Factor_Viewer 反射列表形状因子")
+    parser.add_argument("--cell", nargs=6, type=float, required=True, metavar=("A", "B", "C", "ALPHA", "BETA", "GAMMA"),
+                        help="晶胞参数 a b c (Å) α β γ (度)")
+    parser.add_argument("--hkl", nargs=3, type=int, metavar=("H", "K", "L"), help="hkl 范围上限，生成 -H..H × -K..K × -L..L")
+    parser.add_argument("--hkl-file", help="hkl 列表文件")
+    parser.add_argument("--d-min", type=float, help="只保留 d ≥ d_min 的反射；未给出 hkl 范围时据此确定范围")
+    parser.add_argument("--wavelength", type=float, help="波长 λ (Å)：输出 2θ 列并去掉 2θ 超过 180° 的反射")
+    parser.add_argument("--no-merge", action="store_true", help="不合并对称等效的反射")
+    parser.add_argument("--ions", nargs="+", help="离子、元素、系列或通配符，如 3d Fe2 Gd 'Co*'")
+    parser.add_argument("--j", dest="j_types", nargs="+", choices=J_TYPES, help="j类型，默认全部")
+    parser.add_argument("--xray", dest="xray_elements", nargs="+", help="同时输出这些元素的X射线散射因子")
+    parser.add_argument("--out", required=True, help=f"输出文件，格式由扩展名决定：{' '.join(FORMATS)}")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "Magnetic_Form_factor_data"), help="磁性形状因子数据目录")
+    parser.add_argument("--xray-data-dir", default=os.path.join(HERE, "Xray_scatter_data"), help="X射线散射因子数据目录")
+    parser.add_argument("--xray-model", choices=XRAY_MODELS, default="pchip",
+                        help="X射线散射因子的计算方式：pchip（数据表插值，默认）或 gaussian（拟合系数）")
+    parser.add_argument("--xray-coeffs", help="--xray-model gaussian 使用的系数表，默认 Xray_gaussian_coeffs.txt")
+    parser.add_argument("--perf", action="store_true", help="结束后输出各阶段耗时统计")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        t0 = time.perf_counter()
+        cell = UnitCell(*args.cell)
+        s_max = 0.5 / args.d_min if args.d_min else None
+        if args.wavelength:
+            if args.wavelength <= 0:
+                raise ValueError(f"无效的波长：{args.wavelength}")
+            s_max = min(s_max or np.inf, 1 / args.wavelength)
+        if args.hkl_file:
+            hkl = load_hkl(args.hkl_file)
+        elif args.hkl:
+            hkl = generate_hkl(*(abs(h) for h in args.hkl))
+        elif s_max is not None:
+            hkl = generate_hkl(*cell.hkl_limits(s_max))
+        else:
+            raise ValueError("需要 --hkl、--hkl-file，或用 --d-min / --wavelength 限定范围")
+        refl = build_reflections(cell, hkl, s_max, merge=not args.no_merge)
+
+        engine = xengine = None
+        ions = []
+        if args.ions:
+            db = MagneticFormFactorDB(args.data_dir)
+            engine = MagneticFormFactorEngine(db)
+            ions = resolve_ions(db, args.ions)
+        if args.xray_elements:
+            xengine, _ = make_xray_engine(args.xray_model, args.xray_data_dir, args.xray_coeffs)
+        columns, arrays = evaluate_reflections(refl, engine, ions, list(args.j_types or J_TYPES),
+                                               xengine, args.xray_elements or (), args.wavelength)
+        export_reflections(args.out, cell, columns, arrays)
+        print(f"共 {len(hkl)} 个 hkl，{len(refl['s'])} 个反射，{len(columns) - 6 - bool(args.wavelength)} 个形状因子列，"
+              f"用时 {time.perf_counter() - t0:.3f} s，输出 {args.out}", file=sys.stderr)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    finally:
+        if args.perf:
+            print(PERF.summary_text(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
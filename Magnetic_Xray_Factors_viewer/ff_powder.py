@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from exporters import FORMATS, export_columns
+from data_manager import MagneticFormFactorDB
+from form_factor_engine import (
+    MagneticFormFactorEngine, DipoleFormFactorEngine, J_TYPES, EVAL_CHUNK, dipole_weights, split_ion_label,
+)
+from ff_cli import HERE, parse_theta_range
+from ff_hkl import UnitCell, generate_hkl, build_reflections
+from perf import PERF
+
+# 磁性粉末衍射谱模拟：对反射列表的每个峰
+#   I = scale · mult · |F_M|² · f(s)² · L(θ)，L = 1 / (sinθ·sin2θ)（恒定波长粉末 Lorentz 因子）
+# f(s) 取所选离子的 <jl> 或偶极近似 F(s)，峰形为 Gaussian 或 pseudo-Voigt（FWHM 固定或按 Caglioti U V W），
+# 每个峰只累加到其 ±window·FWHM 范围内的网格点（稀疏累加，不构造 峰数 × 网格点 的矩阵）
+# 用法示例：
+#   python ff_powder.py --peaks peaks.txt --cell 5.43 5.43 5.43 90 90 90 --ion Fe2 --wavelength 2.4 --two-theta 5:150:0.01 --out fe.dat
+#   python ff_powder.py --cell 8 9 10 90 95 90 --d-min 0.9 --ion Mn3 --g 2 --eta 0.3 --uvw 0.02 -0.01 0.01 --wavelength 1.5 --two-theta 5:160:0.0016 --out mn.dat
+# 峰文件：给出 --cell 时每行为 h k l mult |F_M|，否则为 d mult |F_M|；不给峰文件时用 --cell 与 --d-min 生成全部反射，|F_M| = 1
+
+GAUSS_WINDOW = 3.0  # Gaussian 成分的截断范围（FWHM 倍数，约 ±7σ）
+VOIGT_WINDOW = 20.0  # Lorentz 成分的截断范围（FWHM 倍数），之外的面积约 1.6%
+ACCUMULATE_CHUNK = EVAL_CHUNK  # 每次累加的 (峰, 网格点) 对数上限，工作数组保持在缓存友好的大小
+
+
+def load_peaks(path, cell=None):
+    # 返回 (s, mult, |F_M|)
+    data = np.loadtxt(path, comments="#", ndmin=2)
+    if cell is not None:
+        if data.shape[1] < 5:
+            raise ValueError(f"峰文件每行应为 h k l mult |F_M|：{path}")
+        return cell.s_values(data[:, :3]), data[:, 3], data[:, 4]
+    if data.shape[1] < 3:
+        raise ValueError(f"峰文件每行应为 d mult |F_M|：{path}")
+    if np.any(data[:, 0] <= 0):
+        raise ValueError(f"峰文件中有非正的 d：{path}")
+    return 0.5 / data[:, 0], data[:, 1], data[:, 2]
+
+
+def caglioti_fwhm(two_theta, u, v, w):
+    # H² = U·tan²θ + V·tanθ + W（度²）
+    t = np.tan(np.deg2rad(two_theta) / 2)
+    h2 = u * t * t + v * t + w
+    if np.any(h2 <= 0):
+        raise ValueError("Caglioti 参数在部分峰位给出非正的 FWHM²")
+    return np.sqrt(h2)
+
+
+def lorentz_factor(two_theta):
+    theta = np.deg2rad(two_theta) / 2
+    return 1.0 / (np.sin(theta) * np.sin(2 * theta))
+
+
+def _accumulate(out, x0, step, lo, counts, centers, inv_half, amp, lorentz, chunk):
+    # 各峰窗口拼接为一维 (峰, 网格点) 对，按块计算 u = 2(x - 中心)/H 后用 bincount 累加；
+    # 每峰参数用 np.repeat 展开，避免逐对的花式索引
+    n = len(out)
+    ends = np.cumsum(counts)
+    first = 0
+    while first < len(counts):
+        # 本块包含的峰：窗口总长不超过 chunk（单峰超过时单独成块）
+        base = ends[first - 1] if first else 0
+        last = max(first + 1, int(np.searchsorted(ends, base + chunk, side="right")))
+        c = counts[first:last]
+        total = int(ends[last - 1] - base)
+        if total:
+            block = slice(first, last)
+            # 网格下标：各峰从 lo 起连续递增
+            idx = np.arange(total)
+            idx += np.repeat(lo[block] - (np.cumsum(c) - c), c)
+            u = idx * np.repeat(step * inv_half[block], c)
+            u += np.repeat((x0 - centers[block]) * inv_half[block], c)
+            u *= u
+            if lorentz:
+                u += 1
+                np.reciprocal(u, out=u)
+            else:
+                u *= -np.log(2)
+                np.exp(u, out=u)
+            u *= np.repeat(amp[block], c)
+            out += np.bincount(idx, weights=u, minlength=n)
+        first = last
+
+
+def accumulate_peaks(x0, step, n, centers, fwhm, areas, eta=0.0, window=None, out=None, chunk=ACCUMULATE_CHUNK):
+    # 在等间隔网格 x0 + k·step (k < n) 上累加归一化峰形（面积为 areas）：
+    #   G = sqrt(4ln2/π)/H · exp(-4ln2·x²/H²)，L = 2/(πH) / (1 + 4x²/H²)，pV = η·L + (1-η)·G
+    # Gaussian 与 Lorentz 成分各按自己的截断范围累加（window 给出时两者相同），工作量与窗口总长成正比
+    if out is None:
+        out = np.zeros(n)
+    centers = np.asarray(centers, dtype=float)
+    fwhm = np.broadcast_to(np.asarray(fwhm, dtype=float), centers.shape)
+    areas = np.asarray(areas, dtype=float)
+    inv_half = 2 / fwhm
+    parts = []
+    if eta < 1:
+        parts.append((False, areas * (1 - eta) * np.sqrt(4 * np.log(2) / np.pi) / fwhm, window or GAUSS_WINDOW))
+    if eta > 0:
+        parts.append((True, areas * eta * 2 / (np.pi * fwhm), window or VOIGT_WINDOW))
+    for lorentz, amp, width in parts:
+        half = width * fwhm
+        lo = np.clip(np.ceil((centers - half - x0) / step), 0, n).astype(np.int64)
+        hi = np.clip(np.floor((centers + half - x0) / step) + 1, 0, n).astype(np.int64)
+        counts = np.maximum(hi - lo, 0)
+        with PERF.span("powder.lorentz" if lorentz else "powder.gauss", peaks=len(centers), pairs=int(counts.sum())):
+            _accumulate(out, x0, step, lo, counts, centers, inv_half, amp, lorentz, chunk)
+    return out
+
+
+def peak_form_factor(engine, ion, s, j_type="j0", g=None, c4=0.0, c6=0.0):
+    # 各峰位的 f(s)：给出 g 时为偶极近似 F(s)，否则为单个 <jl>
+    if g is not None:
+        return DipoleFormFactorEngine(engine).evaluate(s, [ion], dipole_weights(g=g, c4=c4, c6=c6))[0, 0]
+    return engine.evaluate(s, [ion], [j_type])[0, 0]
+
+
+def simulate_pattern(two_theta_range, wavelength, s, mult, f_m, form_factor, fwhm=None, uvw=None, eta=0.0,
+                     scale=1.0, window=None):
+    # 返回 (2θ 网格, 强度, 峰表 {"two_theta", "s", "intensity", "fwhm"})；λ·s ≥ 1 的峰不可达（2θ = 180° 处 Lorentz 因子发散），直接略去
+    t_min, t_max, t_step = two_theta_range
+    grid = np.arange(t_min, t_max + t_step, t_step)
+    x = np.asarray(s, dtype=float) * wavelength
+    ok = (x > 0) & (x < 1) & np.isfinite(form_factor)
+    two_theta = 2 * np.rad2deg(np.arcsin(x[ok]))
+    intensity = (scale * np.asarray(mult, dtype=float)[ok] * np.asarray(f_m, dtype=float)[ok] ** 2
+                 * form_factor[ok] ** 2 * lorentz_factor(two_theta))
+    if uvw is not None:
+        width = caglioti_fwhm(two_theta, *uvw)
+    elif fwhm is not None:
+        if not fwhm > 0:
+            raise ValueError(f"FWHM 应大于 0：{fwhm}")
+        width = np.full(len(two_theta), float(fwhm))
+    else:
+        raise ValueError("需要给出 FWHM 或 Caglioti U V W")
+    # 实际步长取 np.arange 使用的值，保证峰位与网格一致
+    step = (t_min + t_step) - t_min
+    pattern = accumulate_peaks(t_min, step, len(grid), two_theta, width, intensity, eta, window)
+    peaks = {"two_theta": two_theta, "s": np.asarray(s, dtype=float)[ok], "intensity": intensity, "fwhm": width}
+    return grid, pattern, peaks
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Magia_Form_Factor_Viewer 磁性粉末衍射谱模拟")
+    parser.add_argument("--peaks", help="峰文件：给出 --cell 时每行 h k l mult |F_M|，否则每行 d mult |F_M|")
+    parser.add_argument("--cell", nargs=6, type=float, metavar=("A", "B", "C", "ALPHA", "BETA", "GAMMA"),
+                        help="晶胞参数 a b c (Å) α β γ (度)")
+    parser.add_argument("--d-min", type=float, help="不给峰文件时，用 --cell 生成 d ≥ d_min 的全部反射（|F_M| = 1）")
+    parser.add_argument("--ion", required=True, help="磁性离子，如 Fe2")
+    parser.add_argument("--j", dest="j_type", choices=J_TYPES, default="j0", help="形状因子所用的 j类型，默认 j0")
+    parser.add_argument("--g", type=float, help="改用偶极近似 F(s)，C2 = 2/g − 1")
+    parser.add_argument("--c4", type=float, default=0.0, help="偶极近似中 <j4> 的系数")
+    parser.add_argument("--c6", type=float, default=0.0, help="偶极近似中 <j6> 的系数")
+    parser.add_argument("--wavelength", type=float, required=True, help="波长 λ (Å)")
+    parser.add_argument("--two-theta", required=True, help="2θ 网格 min:max:step (度)")
+    parser.add_argument("--fwhm", type=float, help="固定峰宽 FWHM (度)")
+    parser.add_argument("--uvw", nargs=3, type=float, metavar=("U", "V", "W"), help="Caglioti 峰宽参数 (度²)")
+    parser.add_argument("--eta", type=float, default=0.0, help="pseudo-Voigt 中 Lorentz 成分比例，0 为 Gaussian")
+    parser.add_argument("--window", type=float, help=f"峰形截断范围（FWHM 倍数），默认 Gaussian 成分 {GAUSS_WINDOW:g}、"
+                                                     f"Lorentz 成分 {VOIGT_WINDOW:g}")
+    parser.add_argument("--scale", type=float, default=1.0, help="强度比例因子")
+    parser.add_argument("--out", required=True, help=f"输出文件（2θ 与强度两列），格式由扩展名决定：{' '.join(FORMATS)}")
+    parser.add_argument("--peaks-out", help="另存峰表（2θ s 强度 FWHM）")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "Magnetic_Form_factor_data"), help="磁性形状因子数据目录")
+    parser.add_argument("--perf", action="store_true", help="结束后输出各阶段耗时统计")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.wavelength <= 0:
+            raise ValueError(f"无效的波长：{args.wavelength}")
+        if not 0 <= args.eta <= 1:
+            raise ValueError(f"η 应在 0～1 之间：{args.eta}")
+        if args.fwhm is not None and not args.fwhm > 0:
+            raise ValueError(f"FWHM 应大于 0：{args.fwhm}")
+        two_theta_range = parse_theta_range(args.two_theta)
+        t_min, t_max, t_step = two_theta_range
+        if t_min < 0 or t_max > 180 or t_min >= t_max or t_step <= 0:
+            raise ValueError(f"无效的 2θ 范围：{args.two_theta}")
+        cell = UnitCell(*args.cell) if args.cell else None
+        if args.peaks:
+            s, mult, f_m = load_peaks(args.peaks, cell)
+        elif cell is not None and args.d_min:
+            refl = build_reflections(cell, generate_hkl(*cell.hkl_limits(0.5 / args.d_min)), 0.5 / args.d_min)
+            s, mult, f_m = refl["s"], refl["mult"], np.ones(len(refl["s"]))
+        else:
+            raise ValueError("需要 --peaks，或 --cell 与 --d-min")
+        engine = MagneticFormFactorEngine(MagneticFormFactorDB(args.data_dir))
+        ion = split_ion_label(args.ion.rstrip("+"))
+        t0 = time.perf_counter()
+        f = peak_form_factor(engine, ion, s, args.j_type, args.g, args.c4, args.c6)
+        if np.isnan(f).all():
+            raise ValueError(f"{args.ion} 没有所需j类型的数据")
+        grid, pattern, peaks = simulate_pattern(two_theta_range, args.wavelength, s, mult, f_m, f, args.fwhm,
+                                                args.uvw, args.eta, args.scale, args.window)
+        elapsed = time.perf_counter() - t0
+        header = [f"{args.ion} magnetic powder pattern, lambda={args.wavelength:g}, {len(peaks['s'])} peaks",
+                  "2theta\tintensity"]
+        export_columns(args.out, header, ["2theta", "intensity"], [grid, pattern])
+        if args.peaks_out:
+            export_columns(args.peaks_out, [f"{args.ion} peak list", "2theta\ts\tintensity\tfwhm"],
+                           ["2theta", "s", "intensity", "fwhm"],
+                           [peaks["two_theta"], peaks["s"], peaks["intensity"], peaks["fwhm"]])
+        print(f"共 {len(peaks['s'])} 个峰，{len(grid)} 个网格点，模拟用时 {elapsed:.3f} s，输出 {args.out}", file=sys.stderr)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    finally:
+        if args.perf:
+            print(PERF.summary_text(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
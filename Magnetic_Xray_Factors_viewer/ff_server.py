@@ -0,0 +1,442 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import ipaddress
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from data_manager import MagneticFormFactorDB, XRayFormFactorDB
+from form_factor_engine import (
+    MagneticFormFactorEngine, XRayFormFactorEngine, J_TYPES, evaluate_block, evaluate_pairs, ion_label, theta_grid,
+    grid_size,
+)
+from ff_cli import HERE, parse_theta_range, resolve_ions
+from perf import PERF
+
+# 本机形状因子计算服务（asyncio + 标准库 HTTP/1.1，只监听回环地址）：
+# 启动时加载一次磁性与X射线数据库，之后各客户端以 JSON 请求任意离子在任意 s 上的值。
+# 同一时间窗口内到达的请求合并为一次向量化计算（离子取并集、s 首尾相接），再按请求切分返回。
+#   python ff_server.py --port 8765
+# 接口：
+#   POST /evaluate  {"ions": ["Fe2", "3d"], "j_types": ["j0"], "xray": ["Fe"],
+#                    "s": [...] 或 "wavelength": 1.5, "theta": "0:80:0.1" / [θ...]}
+#                   -> {"s": [...], "ions": [...], "j_types": [...], "magnetic": [[[...]]], "xray": {"Fe": [...]}}
+#                   无数据的组合返回 null；结果超过 MAX_REQUEST_VALUES 个值（点数 × 曲线数，可用 --max-request 修改）时返回 413
+#   GET  /ions      全部离子及其 j类型、X射线元素
+#   GET  /stats     请求数、批次数、合并率、延迟分位数及各阶段耗时
+#   GET  /health
+# 客户端见 ff_client.py（仅依赖标准库）
+
+DEFAULT_PORT = 8765
+BATCH_WINDOW = 0.002  # 收集同一批请求的等待时间（秒）
+MAX_BATCH_VALUES = 8_000_000  # 单批计算结果元素数上限，超过则立即计算
+MAX_REQUEST_VALUES = 50_000_000  # 单个请求结果元素数（点数 × 曲线数）上限，超过时返回 413
+MAX_BODY = 64 * 1024 * 1024
+LATENCY_SAMPLES = 2000
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def nan_to_none(y):
+    # JSON 不支持 NaN，无数据的点输出为 null
+    y = np.asarray(y, dtype=float)
+    mask = np.isnan(y)
+    if not mask.any():
+        return y.tolist()
+    obj = y.astype(object)
+    obj[mask] = None
+    return obj.tolist()
+
+
+class ParsedRequest:
+    __slots__ = ("s", "ions", "ion_idx", "j_types", "j_idx", "xray", "values")
+
+    def __init__(self, s, ions, ion_idx, j_types, j_idx, xray):
+        self.s = s
+        self.ions = ions
+        self.ion_idx = ion_idx
+        self.j_types = j_types
+        self.j_idx = j_idx
+        self.xray = xray
+        self.values = len(s) * (len(ion_idx) * len(J_TYPES) + len(xray))
+
+
+class Stats:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = {}  # {路径: 次数}
+        self.errors = 0
+        self.evaluations = 0
+        self.batches = 0
+        self.passes = 0  # 向量化计算次数（每批磁性一次，X射线每个元素一次）
+        self.points = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.batch_sizes = deque(maxlen=LATENCY_SAMPLES)
+
+    def snapshot(self):
+        lat = np.sort(np.asarray(self.latencies)) * 1e3
+        pct = {f"p{q}": float(np.percentile(lat, q)) for q in (50, 90, 99)} if len(lat) else {}
+        if len(lat):
+            pct["max"] = float(lat[-1])
+        return {
+            "uptime_s": time.time() - self.started,
+            "requests": dict(self.requests),
+            "errors": self.errors,
+            "evaluations": self.evaluations,
+            "batches": self.batches,
+            "passes": self.passes,
+            "requests_per_batch": self.evaluations / self.batches if self.batches else 0.0,
+            "recent_batch_max": max(self.batch_sizes, default=0),
+            "points": self.points,
+            "latency_ms": pct,
+            "spans": PERF.snapshot()["spans"],
+        }
+
+
+class FormFactorService:
+    def __init__(self, db, xdb=None, window=BATCH_WINDOW, max_values=MAX_BATCH_VALUES, max_request=MAX_REQUEST_VALUES):
+        self.db = db
+        self.engine = MagneticFormFactorEngine(db)
+        self.xdb = xdb
+        self.xengine = XRayFormFactorEngine(xdb) if xdb is not None else None
+        self.window = window
+        self.max_values = max_values
+        self.max_request = max_request
+        self.stats = Stats()
+        self._pending = []  # [(ParsedRequest, Future)]
+        self._pending_values = 0
+        self._timer = None
+        # 单线程执行计算：事件循环不被阻塞，且各批按顺序进行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ff-eval")
+
+    # ---------- 请求解析 ----------
+    def parse(self, payload):
+        # 先解析离子、j类型与X射线元素，再由点数估算结果大小，超过 max_request 时不生成网格、直接拒绝
+        if not isinstance(payload, dict):
+            raise RequestError("请求体应为 JSON 对象")
+        specs = payload.get("ions") or []
+        if isinstance(specs, str):
+            specs = [specs]
+        if not isinstance(specs, list):
+            raise RequestError("ions 应为字符串或列表")
+        labels = []
+        for spec in specs:
+            if isinstance(spec, str):
+                labels.append(spec)
+            elif isinstance(spec, list) and len(spec) == 2 and all(isinstance(x, (str, int)) for x in spec):
+                labels.append(ion_label(*spec))
+            else:
+                raise RequestError(f"无效的离子：{spec!r}（应为 \"Fe2\" 或 [\"Fe\", 2]）")
+        ions = resolve_ions(self.db, labels) if labels else []
+        j_types = payload.get("j_types") or list(J_TYPES)
+        if not isinstance(j_types, list) or not all(isinstance(jt, str) for jt in j_types):
+            raise RequestError("j_types 应为字符串列表")
+        unknown = [jt for jt in j_types if jt not in J_TYPES]
+        if unknown:
+            raise RequestError(f"未知的 j类型：{unknown}")
+
+        xray = payload.get("xray") or []
+        if isinstance(xray, str):
+            xray = [xray]
+        if not isinstance(xray, list) or not all(isinstance(e, str) for e in xray):
+            raise RequestError("xray 应为元素符号（字符串）列表")
+        if xray:
+            if self.xengine is None:
+                raise RequestError("服务未加载X射线数据")
+            if any(e.lower() == "all" for e in xray):
+                xray = list(self.xengine.elements)
+            missing = [e for e in xray if not self.xengine.has(e)]
+            if missing:
+                raise RequestError(f"没有X射线散射因子数据：{missing}")
+        xray = list(dict.fromkeys(xray))
+        if not ions and not xray:
+            raise RequestError("至少需要 ions 或 xray 之一")
+        curves = len(ions) * len(j_types) + len(xray)
+
+        if "s" in payload:
+            s = np.asarray(payload["s"], dtype=float).reshape(-1)
+            self._check_size(len(s), curves)
+        elif "wavelength" in payload and "theta" in payload:
+            w = float(payload["wavelength"])
+            if w <= 0:
+                raise RequestError(f"无效的波长：{w}")
+            theta = payload["theta"]
+            if isinstance(theta, str):
+                theta_min, theta_max, theta_step = parse_theta_range(theta)
+                if theta_step <= 0 or theta_min >= theta_max:
+                    raise RequestError(f"无效的θ范围：{theta}")
+                self._check_size(grid_size(theta_min, theta_max, theta_step), curves)
+                _, s = theta_grid(w, theta_min, theta_max, theta_step)
+            else:
+                theta = np.asarray(theta, dtype=float).reshape(-1)
+                self._check_size(len(theta), curves)
+                s = np.sin(np.deg2rad(theta)) / w
+        else:
+            raise RequestError("需要 s，或 wavelength 与 theta")
+        if not np.all(np.isfinite(s)):
+            raise RequestError("s 中含有非有限值")
+        return ParsedRequest(s, ions, self.engine.ion_indices(ions) if ions else np.empty(0, dtype=np.intp),
+                             j_types, self.engine.j_indices(j_types), xray)
+
+    def _check_size(self, n_points, curves):
+        if n_points * curves > self.max_request:
+            raise RequestError(f"结果过大：{n_points} 个点 × {curves} 条曲线，超过单个请求上限 {self.max_request} 个值，"
+                               "请缩小范围或分批请求", 413)
+
+    # ---------- 合并计算 ----------
+    async def evaluate(self, payload):
+        req = self.parse(payload)
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((req, fut))
+        self._pending_values += req.values
+        if self._pending_values >= self.max_values:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_values = self._pending, [], 0
+        if batch:
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self.compute, [req for req, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    def compute(self, requests):
+        # 整批只做一次磁性计算：离子集合相近时取并集 × 全部 s 广播计算；
+        # 差别大时（并集远超各请求所需）改为逐点配对计算，只算各请求实际需要的 (离子, s)
+        mag_reqs = [r for r in requests if len(r.ion_idx)]
+        mag = {}
+        with PERF.span("server.batch", requests=len(requests)) as sp:
+            if mag_reqs:
+                s_all = np.concatenate([r.s for r in mag_reqs])
+                ion_union = np.unique(np.concatenate([r.ion_idx for r in mag_reqs]))
+                needed = sum(len(r.s) * len(r.ion_idx) for r in mag_reqs)
+                sp.add(points=len(s_all), values=needed * len(J_TYPES))
+                if len(ion_union) * len(s_all) <= 2 * needed:
+                    block = evaluate_block(self.engine.coeffs, self.engine.valid, ion_union,
+                                           np.arange(len(J_TYPES)), s_all)
+                    start = 0
+                    for r in mag_reqs:
+                        rows = np.searchsorted(ion_union, r.ion_idx)
+                        mag[id(r)] = block[np.ix_(rows, r.j_idx)][..., start:start + len(r.s)]
+                        start += len(r.s)
+                else:
+                    ion_flat = np.concatenate([np.repeat(r.ion_idx, len(r.s)) for r in mag_reqs])
+                    s_flat = np.concatenate([np.tile(r.s, len(r.ion_idx)) for r in mag_reqs])
+                    flat = evaluate_pairs(self.engine.coeffs, self.engine.valid, ion_flat, s_flat)
+                    start = 0
+                    for r in mag_reqs:
+                        stop = start + len(r.ion_idx) * len(r.s)
+                        # (j类型, 离子×点) -> (离子, j类型, 点)
+                        mag[id(r)] = flat[r.j_idx, start:stop].reshape(len(r.j_idx), len(r.ion_idx), len(r.s)).transpose(1, 0, 2)
+                        start = stop
+                self.stats.passes += 1
+
+            # X射线按元素合并：每个元素在需要它的请求的 s 上计算一次
+            xray = {}
+            for elem in dict.fromkeys(e for r in requests for e in r.xray):
+                users = [r for r in requests if elem in r.xray]
+                y = self.xengine.evaluate(np.concatenate([r.s for r in users]), [elem])[0]
+                start = 0
+                for r in users:
+                    xray[id(r), elem] = y[start:start + len(r.s)]
+                    start += len(r.s)
+                self.stats.passes += 1
+
+        results = []
+        for r in requests:
+            out = {"s": r.s.tolist()}
+            if len(r.ion_idx):
+                out["ions"] = [ion_label(elem, valence) for elem, valence in r.ions]
+                out["j_types"] = r.j_types
+                out["magnetic"] = nan_to_none(mag[id(r)])
+            if r.xray:
+                out["xray"] = {elem: nan_to_none(xray[id(r), elem]) for elem in r.xray}
+            results.append(out)
+
+        stats = self.stats
+        stats.batches += 1
+        stats.evaluations += len(requests)
+        stats.points += sum(len(r.s) for r in requests)
+        stats.batch_sizes.append(len(requests))
+        return results
+
+    # ---------- 其他接口 ----------
+    def ions(self):
+        registry = self.db.registry
+        out = {"ions": [{"label": rec.label, "element": rec.elem, "valence": rec.valence,
+                         "j_types": list(rec.j_types), "series": list(rec.series)} for rec in registry.records],
+               "j_types": list(J_TYPES)}
+        if self.xengine is not None:
+            out["xray"] = list(self.xengine.elements)
+        return out
+
+    async def dispatch(self, method, path, body):
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        if path == "/evaluate":
+            if method != "POST":
+                raise RequestError("请使用 POST", 405)
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError as e:
+                raise RequestError(f"JSON 解析失败：{e}")
+            return await self.evaluate(payload)
+        if method != "GET":
+            raise RequestError("请使用 GET", 405)
+        if path == "/ions":
+            return self.ions()
+        if path == "/stats":
+            return self.stats.snapshot()
+        if path == "/health":
+            return {"status": "ok", "ions": len(self.engine.ions),
+                    "xray_elements": len(self.xengine.elements) if self.xengine else 0}
+        raise RequestError(f"未知路径：{path}", 404)
+
+    # ---------- HTTP ----------
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                t0 = time.perf_counter()
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                except ValueError:
+                    await self._send(writer, 400, {"error": "无效的请求行"}, close=True)
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = h.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = headers.get("content-length", "") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await self._send(writer, 400, {"error": f"无效的 Content-Length：{length}"}, close=True)
+                    break
+                length = int(length)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                if length > MAX_BODY:
+                    await self._send(writer, 413, {"error": "请求体过大"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                name = target.split("?", 1)[0]
+                self.stats.requests[name] = self.stats.requests.get(name, 0) + 1
+                try:
+                    status, result = 200, await self.dispatch(method.upper(), target, body)
+                except RequestError as e:
+                    status, result = e.status, {"error": str(e)}
+                except (ValueError, KeyError, TypeError) as e:
+                    status, result = 400, {"error": str(e)}
+                except Exception as e:
+                    status, result = 500, {"error": f"{type(e).__name__}: {e}"}
+                if status != 200:
+                    self.stats.errors += 1
+                await self._send(writer, status, result, close=not keep_alive)
+                self.stats.latencies.append(time.perf_counter() - t0)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, result, close=False):
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+def check_loopback(host):
+    # 服务没有鉴权，只允许绑定回环地址
+    if host == "localhost":
+        return
+    try:
+        if ipaddress.ip_address(host).is_loopback:
+            return
+    except ValueError:
+        pass
+    raise ValueError(f"只允许监听本机回环地址（127.0.0.1 / ::1 / localhost），得到 {host}")
+
+
+async def serve(service, host="127.0.0.1", port=DEFAULT_PORT, ready=None):
+    check_loopback(host)
+    server = await asyncio.start_server(service.handle, host, port)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Magia_Form_Factor_Viewer 本机形状因子计算服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，只能是回环地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"端口，默认 {DEFAULT_PORT}")
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW * 1e3, help="请求合并窗口（毫秒）")
+    parser.add_argument("--max-request", type=int, default=MAX_REQUEST_VALUES, help="单个请求结果元素数上限，超过返回 413")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "Magnetic_Form_factor_data"), help="磁性形状因子数据目录")
+    parser.add_argument("--xray-data-dir", default=os.path.join(HERE, "Xray_scatter_data"), help="X射线散射因子数据目录")
+    parser.add_argument("--no-xray", action="store_true", help="不加载X射线数据")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        check_loopback(args.host)
+        t0 = time.perf_counter()
+        db = MagneticFormFactorDB(args.data_dir)
+        xdb = None if args.no_xray else XRayFormFactorDB(args.xray_data_dir)
+        service = FormFactorService(db, xdb, window=args.window / 1e3, max_request=args.max_request)
+    except (ValueError, OSError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    ready = lambda server: print(f"数据加载用时 {time.perf_counter() - t0:.2f} s，"
+                                 f"{len(service.engine.ions)} 个离子；监听 http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        asyncio.run(serve(service, args.host, args.port, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
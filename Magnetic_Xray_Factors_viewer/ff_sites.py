@@ -0,0 +1,153 @@
+import os
+import sys
+import ast
+import time
+import argparse
+import numpy as np
+from exporters import FORMATS, export_mixtures
+from data_manager import MagneticFormFactorDB
+from form_factor_engine import (
+    MagneticFormFactorEngine, J_TYPES, split_ion_label, theta_grid, evaluate_mixtures, parse_values,
+)
+from ff_cli import HERE, parse_theta_range, check_grid
+from perf import PERF
+
+# 混合价态 / 部分占位的位点形状因子：每个位点（组成）是若干 (离子, j类型) 分量按占位加权之和，
+#   f_site(s) = Σ w_k·<jl>_k(s)
+# 全部组成的权重排成 (组成数, 分量数) 矩阵，与一次计算的 (分量, s) 数据块做一次矩阵乘
+# 组成写法："Fe2:0.5 Fe3:0.5"，分量可写 "Fe3@j2:0.1" 指定 j类型（默认 j0），省略权重为 1；
+# 权重可以是含 x 的算式（如 "Mn3:1-x Mn4:x"），配合 --x min:max:step 一次得到整个掺杂系列
+# 用法示例：
+#   python ff_sites.py --site "Fe2:0.5 Fe3:0.5" --site "Co2:0.8" --wavelength 2.4 --theta 0:80:0.05 --out sites.dat
+#   python ff_sites.py --site "Mn3:1-x Mn4:x" --x 0:1:0.05 --wavelength 2.4 --theta 0:80:0.05 --out doping.npy
+#   python ff_sites.py --sites compositions.txt --normalize --wavelength 1.5 --theta 0:90:0.01 --out sites.dat
+# compositions.txt 每行一个组成，"#" 开头为注释
+
+_ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant, ast.Name, ast.Load,
+                  ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.USub, ast.UAdd)
+
+
+def parse_weight(text):
+    # 占位权重：数值或只含 x 与 + - * / ** 的算式，返回可对 x 数组求值的语法树
+    # 常数一律转为浮点数，避免 9**9**9 这样的整数幂长时间计算（浮点溢出时报错）
+    try:
+        tree = ast.parse(text.strip(), mode="eval")
+    except SyntaxError:
+        raise ValueError(f"无法识别的权重：{text}") from None
+    for node in ast.walk(tree):
+        if not isinstance(node, _ALLOWED_NODES) or (isinstance(node, ast.Name) and node.id != "x") or \
+                (isinstance(node, ast.Constant) and (type(node.value) not in (int, float))):
+            raise ValueError(f"权重只能包含数值、x 与 + - * / **：{text}")
+        if isinstance(node, ast.Constant):
+            node.value = float(node.value)
+    return compile(tree, "<weight>", "eval")
+
+
+def uses_x(code):
+    return "x" in code.co_names
+
+
+def weight_values(code, x, text=""):
+    try:
+        with np.errstate(all="ignore"):
+            w = np.asarray(eval(code, {"__builtins__": {}}, {"x": x}), dtype=float)
+    except (OverflowError, ZeroDivisionError) as e:
+        raise ValueError(f"权重无法计算：{text}（{e}）") from None
+    if not np.all(np.isfinite(w)):
+        raise ValueError(f"权重不是有限值：{text}")
+    return np.broadcast_to(w, np.shape(x))
+
+
+def parse_composition(text):
+    # "Fe2:0.5 Fe3+@j2:0.5" -> [((元素, 价态, j类型), 权重语法树, 权重原文)]，逗号或空白分隔
+    terms = []
+    for item in text.replace(",", " ").split():
+        name, _, weight = item.partition(":")
+        name, _, jt = name.partition("@")
+        jt = jt or "j0"
+        if jt not in J_TYPES:
+            raise ValueError(f"未知的j类型：{jt}")
+        elem, valence = split_ion_label(name.rstrip("+"))
+        weight = weight or "1"
+        terms.append(((elem, valence, jt), parse_weight(weight), weight))
+    if not terms:
+        raise ValueError("组成为空")
+    return terms
+
+
+def composition_matrix(texts, x=None):
+    # 返回 (各行标签, 分量列表, (行数, 分量数) 权重矩阵)；给出 x 数组时每个组成展开为 len(x) 行
+    parsed = [parse_composition(text) for text in texts]
+    if x is None:
+        used = [w for terms in parsed for _, code, w in terms if uses_x(code)]
+        if used:
+            raise ValueError(f"权重含 x（{used[0]}），需要给出 x 的取值")
+    components = list(dict.fromkeys(comp for terms in parsed for comp, _, _ in terms))
+    column = {comp: k for k, comp in enumerate(components)}
+    xs = np.zeros(1) if x is None else np.asarray(x, dtype=float)
+    weights = np.zeros((len(parsed), len(xs), len(components)))
+    labels = []
+    for row, (text, terms) in enumerate(zip(texts, parsed)):
+        for comp, code, w in terms:
+            weights[row, :, column[comp]] += weight_values(code, xs, w)
+        name = " ".join(f"{elem}{valence}+{'' if jt == 'j0' else '@' + jt}:{w}" for (elem, valence, jt), _, w in terms)
+        labels.extend([name] if x is None else [f"{name} (x={v:g})" for v in xs])
+    return labels, components, weights.reshape(-1, len(components))
+
+
+def normalize_weights(weights):
+    # 每行除以权重和（占位分数归一为 1），权重和为 0 的行保持不变
+    total = weights.sum(axis=1, keepdims=True)
+    return np.divide(weights, total, out=weights.copy(), where=total != 0)
+
+
+def load_compositions(path):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Magia_Form_Factor_Viewer 混合价态/部分占位位点形状因子")
+    parser.add_argument("--site", dest="sites", action="append", default=[],
+                        help="一个位点的组成，如 \"Fe2:0.5 Fe3:0.5\"，可重复给出")
+    parser.add_argument("--sites", dest="sites_file", help="组成文件，每行一个组成")
+    parser.add_argument("--x", help="掺杂系列 x 的取值：数值列表（逗号分隔）或 min:max:step")
+    parser.add_argument("--normalize", action="store_true", help="各组成的权重归一化为和为 1")
+    parser.add_argument("--wavelength", type=float, required=True, help="波长 λ (Å)")
+    parser.add_argument("--theta", required=True, help="θ范围 min:max:step (度)")
+    parser.add_argument("--out", required=True, help=f"输出文件（s + 每个组成一列），格式由扩展名决定：{' '.join(FORMATS)}")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "Magnetic_Form_factor_data"), help="磁性形状因子数据目录")
+    parser.add_argument("--perf", action="store_true", help="结束后输出各阶段耗时统计")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        texts = list(args.sites) + (load_compositions(args.sites_file) if args.sites_file else [])
+        if not texts:
+            raise ValueError("需要 --site 或 --sites")
+        grid = (args.wavelength,) + parse_theta_range(args.theta)
+        check_grid(*grid)
+        labels, components, weights = composition_matrix(texts, parse_values(args.x) if args.x else None)
+        if args.normalize:
+            weights = normalize_weights(weights)
+        engine = MagneticFormFactorEngine(MagneticFormFactorDB(args.data_dir))
+        _, s = theta_grid(*grid)
+        t0 = time.perf_counter()
+        f = evaluate_mixtures(engine, components, weights, s)
+        elapsed = time.perf_counter() - t0
+        export_mixtures(args.out, s, labels, f)
+        print(f"共 {len(labels)} 个组成（{len(components)} 个分量）× {len(s)} 个点，计算用时 {elapsed:.3f} s，"
+              f"输出 {args.out}", file=sys.stderr)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    finally:
+        if args.perf:
+            print(PERF.summary_text(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import numpy as np
+from data_manager import MagneticFormFactorDB
+from form_factor_engine import MagneticFormFactorEngine, J_TYPES, evaluate_block, ion_label, theta_grid
+from ff_cli import HERE, parse_theta_range, check_grid, resolve_ions
+from perf import PERF
+
+# 多进程参数扫描：离子 × j类型 × 波长 × θ网格，结果为一个 (波长, 离子, j类型, θ点) 的规则数组
+# 系数表只在主进程解析一次，连同 sinθ 网格放入 multiprocessing.shared_memory，
+# 工作进程按名称挂接后直接计算，不再读取数据文件；各任务把结果写入预分配的输出数组
+# （共享内存，或 --out 指定的 .npy 内存映射文件），主进程只收集计数并报告吞吐量（点/秒）
+# 用法示例：
+#   python ff_sweep.py --ions all --wavelength 1.0 1.5 2.4 --theta 0:90:0.001 --out sweep.npy
+#   python ff_sweep.py --ions 3d --j j0 j2 --wavelength 2.4 --theta 0:80:0.01 --processes 8 --dtype float32
+# 输出文件旁的 .json 记录各轴含义（ions, j_types, wavelengths, theta）
+
+TASK_BYTES = 32 * 1024 * 1024  # 单个任务计算块的大小上限（float64）
+REPORT_INTERVAL = 1.0  # 进度与吞吐量输出间隔（秒）
+
+# 工作进程内的共享状态，由 _init_worker 设置
+_SHARED = {}
+
+
+class SharedArrays:
+    # 把若干 ndarray 放进同一块共享内存，layout 可 pickle，供工作进程 attach 重建视图
+    def __init__(self, shm, layout, owner):
+        self.shm = shm
+        self.layout = layout  # [(名称, 形状, dtype, 偏移)]
+        self.owner = owner
+        self.arrays = {key: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+                       for key, shape, dtype, offset in layout}
+
+    @classmethod
+    def empty(cls, specs):
+        # specs: {名称: (形状, dtype)}，只分配不填充
+        layout = []
+        size = 0
+        for key, (shape, dtype) in specs.items():
+            dtype = np.dtype(dtype)
+            size = (size + 63) // 64 * 64  # 按 64 字节对齐
+            layout.append((key, tuple(shape), dtype.str, size))
+            size += int(np.prod(shape)) * dtype.itemsize
+        return cls(shared_memory.SharedMemory(create=True, size=max(size, 1)), layout, owner=True)
+
+    @classmethod
+    def create(cls, arrays):
+        self = cls.empty({key: (arr.shape, arr.dtype) for key, arr in arrays.items()})
+        for key, arr in arrays.items():
+            self.arrays[key][...] = arr
+        return self
+
+    @classmethod
+    def attach(cls, name, layout):
+        return cls(shared_memory.SharedMemory(name=name), layout, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _init_worker(name, layout, out_name, out_layout, out_path):
+    shared = SharedArrays.attach(name, layout)
+    _SHARED["inputs"] = shared
+    if out_path:
+        _SHARED["out"] = np.load(out_path, mmap_mode="r+")
+    else:
+        _SHARED["out_shm"] = SharedArrays.attach(out_name, out_layout)
+        _SHARED["out"] = _SHARED["out_shm"]["out"]
+
+
+def _close_worker():
+    _SHARED.pop("out", None)
+    _SHARED.pop("inputs").close()
+    out_shm = _SHARED.pop("out_shm", None)
+    if out_shm is not None:
+        out_shm.close()
+
+
+def _run_task(task):
+    # task = (波长序号, 离子起止, θ起止)，结果写入 out[w, i0:i1, :, t0:t1]
+    w, i0, i1, t0, t1 = task
+    shared = _SHARED["inputs"]
+    s = shared["sin_theta"][t0:t1] / shared["wavelengths"][w]
+    block = evaluate_block(shared["coeffs"], shared["valid"], shared["ion_index"][i0:i1], shared["j_index"], s)
+    _SHARED["out"][w, i0:i1, :, t0:t1] = block
+    return block.size
+
+
+def plan_tasks(n_wavelengths, n_ions, n_j, n_points, task_bytes=None):
+    # 先按 θ 切分保证单离子块不超限，再按离子数合并
+    points_per_task = max(1, (task_bytes or TASK_BYTES) // (8 * n_j))
+    theta_chunk = min(n_points, points_per_task)
+    ion_chunk = max(1, min(n_ions, points_per_task // theta_chunk))
+    return [(w, i0, min(i0 + ion_chunk, n_ions), t0, min(t0 + theta_chunk, n_points))
+            for w in range(n_wavelengths)
+            for i0 in range(0, n_ions, ion_chunk)
+            for t0 in range(0, n_points, theta_chunk)]
+
+
+def run_pool_sweep(engine, ions, j_types, wavelengths, theta_range, out_path=None,
+                   processes=None, dtype="float64", log=sys.stderr, consume=None):
+    # 返回 (结果, 元数据)；out_path 给出时结果为 .npy 内存映射。否则结果留在共享内存中，
+    # 在释放前调用 consume(数组) 并返回其返回值（不复制整个数组；未给出 consume 时为 None）
+    wavelengths = np.asarray(wavelengths, dtype=float)
+    for w in wavelengths:
+        check_grid(w, *theta_range)
+    theta_min, theta_max, theta_step = theta_range
+    # 与 GUI/ff_cli 相同的 θ 网格；λ=1 时 s 即 sinθ
+    theta, sin_theta = theta_grid(1.0, theta_min, theta_max, theta_step)
+    ion_index = engine.ion_indices(ions)
+    j_index = engine.j_indices(j_types)
+    shape = (len(wavelengths), len(ion_index), len(j_index), len(theta))
+    meta = {"shape": list(shape), "dtype": np.dtype(dtype).str,
+            "axes": ["wavelength", "ion", "j_type", "theta"],
+            "ions": [ion_label(elem, valence) for elem, valence in ions], "j_types": list(j_types),
+            "wavelengths": wavelengths.tolist(), "theta": [theta_min, theta_max, theta_step]}
+
+    tasks = plan_tasks(*shape)
+    workers = processes or os.cpu_count() or 1
+    workers = min(workers, len(tasks))
+    inputs = SharedArrays.create({
+        "coeffs": engine.coeffs, "valid": engine.valid,
+        "sin_theta": sin_theta, "wavelengths": wavelengths,
+        "ion_index": np.asarray(ion_index, dtype=np.intp), "j_index": np.asarray(j_index, dtype=np.intp),
+    })
+    out_shm = None
+    if out_path:
+        out = np.lib.format.open_memmap(out_path, mode="w+", dtype=dtype, shape=shape)
+        with open(out_path + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        out_args = (None, None, out_path)
+    else:
+        out_shm = SharedArrays.empty({"out": (shape, dtype)})
+        out = out_shm["out"]
+        out_args = (out_shm.name, out_shm.layout, None)
+
+    done = 0
+    total = int(np.prod(shape))
+    t0 = last = time.perf_counter()
+    try:
+        with PERF.span("sweep.pool", points=total, tasks=len(tasks), processes=workers):
+            if workers <= 1:
+                # 单进程直接在当前进程执行，便于调试与对照
+                _init_worker(inputs.name, inputs.layout, *out_args)
+                try:
+                    for task in tasks:
+                        done += _run_task(task)
+                finally:
+                    _close_worker()
+            else:
+                with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                         initargs=(inputs.name, inputs.layout) + out_args) as pool:
+                    for fut in as_completed([pool.submit(_run_task, task) for task in tasks]):
+                        done += fut.result()
+                        now = time.perf_counter()
+                        if log and now - last >= REPORT_INTERVAL:
+                            last = now
+                            print(f"  {done / total:6.1%}  {done / (now - t0):,.0f} 点/秒", file=log)
+        elapsed = time.perf_counter() - t0
+        if out_path:
+            out.flush()
+        else:
+            out = consume(out) if consume else None
+    finally:
+        inputs.close()
+        if out_shm is not None:
+            out_shm.close()
+
+    meta["elapsed"] = elapsed
+    meta["points_per_second"] = total / elapsed if elapsed > 0 else float("inf")
+    if log:
+        print(f"共计算 {total:,} 个点（{shape[0]} 波长 × {shape[1]} 离子 × {shape[2]} j类型 × {shape[3]} θ），"
+              f"{len(tasks)} 个任务，{workers} 个进程，用时 {elapsed:.2f} s，{meta['points_per_second']:,.0f} 点/秒"
+              + (f"，输出 {out_path}" if out_path else ""), file=log)
+    return out, meta
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Magia_Form_Factor_Viewer 多进程参数扫描")
+    parser.add_argument("--ions", nargs="+", default=["all"], help="离子、元素、系列或通配符，默认 all")
+    parser.add_argument("--j", dest="j_types", nargs="+", choices=J_TYPES, help="j类型，默认全部")
+    parser.add_argument("--wavelength", dest="wavelengths", nargs="+", type=float, required=True, help="波长 λ (Å)")
+    parser.add_argument("--theta", required=True, help="θ范围 min:max:step (度)")
+    parser.add_argument("--out", help="输出 .npy 文件（内存映射写入），省略时只计算并报告吞吐量")
+    parser.add_argument("--processes", type=int, help="进程数，默认 CPU 核数，1 表示在当前进程执行")
+    parser.add_argument("--dtype", choices=("float64", "float32"), default="float64", help="输出精度")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "Magnetic_Form_factor_data"), help="磁性形状因子数据目录")
+    parser.add_argument("--perf", action="store_true", help="结束后输出各阶段耗时统计")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        db = MagneticFormFactorDB(args.data_dir)
+        engine = MagneticFormFactorEngine(db)
+        ions = resolve_ions(db, args.ions)
+        run_pool_sweep(engine, ions, list(args.j_types or J_TYPES), args.wavelengths,
+                       parse_theta_range(args.theta), args.out, args.processes, args.dtype)
+    except (ValueError, KeyError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    finally:
+        if args.perf:
+            print(PERF.summary_text(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from exporters import FORMATS, export_columns, export_stream
+from data_manager import MagneticFormFactorDB
+from form_factor_engine import MagneticFormFactorEngine, StreamingEvaluator, J_TYPES, ion_label
+from ff_cli import HERE, resolve_ions
+from perf import PERF
+
+# 飞行时间（TOF）模式：每个探测器组 (bank) 的 2θ 与飞行路径 L1 + L2 固定，波长随 TOF 通道变化
+#   λ (Å) = TOF_CONSTANT · t (μs) / (L1 + L2) (m)，s = sinθ / λ
+# 各 bank 的 s 只差一个系数（bank_factors），形状因子按 bank 逐行写入 (离子, j类型, bank, 通道) 数组
+# 用法示例：
+#   python ff_tof.py --banks banks.txt --tof 1000:20000:2 --ions Fe2 Fe3 --j j0 j2 --out tof.npy
+#   python ff_tof.py --banks banks.txt --tof 1000:20000 --dt-over-t 0.001 --ions Gd3 --out gd.dat
+# banks.txt 每行为 L1 L2 2θ（米、米、度），"#" 开头为注释；.npy 输出为 4 维数组并附 .json 轴说明，
+# 其他格式输出长表：每行一个 (bank, 通道)，列为 bank 2theta tof lambda d s 及各形状因子
+
+TOF_CONSTANT = 3.956034e-3  # h / m_n，单位 Å·m/μs
+
+
+def load_banks(path):
+    banks = np.loadtxt(path, comments="#", ndmin=2, usecols=(0, 1, 2))
+    check_banks(banks)
+    return banks
+
+
+def check_banks(banks):
+    banks = np.asarray(banks, dtype=float)
+    if banks.ndim != 2 or banks.shape[1] != 3:
+        raise ValueError(f"bank 参数应为 (bank 数, 3) 的 L1 L2 2θ，得到形状 {banks.shape}")
+    if np.any(banks[:, 0] + banks[:, 1] <= 0) or np.any((banks[:, 2] <= 0) | (banks[:, 2] > 180)):
+        raise ValueError("bank 的飞行路径必须为正，2θ 应在 0～180° 之间")
+
+
+def tof_channels(t_min, t_max, step=None, dt_over_t=None):
+    # 等间隔通道（step，μs）或等 Δt/t 的对数通道（dt_over_t），均含起点、不超过 t_max
+    if t_min <= 0 or t_max <= t_min:
+        raise ValueError(f"无效的 TOF 范围：{t_min}～{t_max}")
+    if dt_over_t is not None:
+        if dt_over_t <= 0:
+            raise ValueError(f"无效的 Δt/t：{dt_over_t}")
+        n = int(np.floor(np.log(t_max / t_min) / np.log1p(dt_over_t) + 1e-9)) + 1
+        return t_min * np.exp(np.arange(n) * np.log1p(dt_over_t))
+    if not step or step <= 0:
+        raise ValueError(f"无效的 TOF 步长：{step}")
+    return t_min + step * np.arange(int(np.floor((t_max - t_min) / step + 1e-9)) + 1)
+
+
+def parse_tof(text, dt_over_t=None):
+    # "min:max:step"，或给出 dt_over_t 时为 "min:max"（写了 step 也只取 min:max）
+    parts = [float(p) for p in str(text).split(":")]
+    if len(parts) in (2, 3) and dt_over_t is not None:
+        return tof_channels(parts[0], parts[1], dt_over_t=dt_over_t)
+    if len(parts) != 3:
+        raise ValueError(f"TOF 范围格式应为 min:max:step（对数通道为 min:max），得到 {text}")
+    return tof_channels(*parts)
+
+
+def bank_factors(banks):
+    # s = sinθ·(L1 + L2) / (TOF_CONSTANT·t)，每个 bank 只差一个系数
+    banks = np.asarray(banks, dtype=float)
+    return np.sin(np.deg2rad(banks[:, 2] / 2)) * (banks[:, 0] + banks[:, 1]) / TOF_CONSTANT
+
+
+def tof_wavelengths(banks, tof):
+    banks = np.asarray(banks, dtype=float)
+    return np.multiply.outer(TOF_CONSTANT / (banks[:, 0] + banks[:, 1]), np.asarray(tof, dtype=float))
+
+
+def evaluate_tof(engine, ions, jtypes, banks, tof, out=None, progress=None):
+    # 返回 (离子, j类型, bank, 通道)；StreamingEvaluator 的工作区按通道数分配一次，逐个 bank 原地计算，
+    # 不产生整块 s 与中间数组。out 可为预先分配的数组（如 .npy 内存映射）
+    tof = np.asarray(tof, dtype=float)
+    factors = bank_factors(banks)
+    shape = (len(ions), len(jtypes), len(factors), len(tof))
+    if out is None:
+        out = np.empty(shape)
+    if not len(tof) or not len(ions) or not len(jtypes):
+        return out
+    inv_t = 1.0 / tof
+    evaluator = StreamingEvaluator(engine, ions, jtypes, len(tof))
+    s = np.empty(len(tof))
+    with PERF.span("eval.tof", points=int(np.prod(shape)), banks=len(factors)):
+        for b, factor in enumerate(factors):
+            np.multiply(inv_t, factor, out=s)
+            evaluator.evaluate(s, out=out[:, :, b])
+            if progress:
+                progress((b + 1) / len(factors))
+    return out
+
+
+def tof_table_chunks(banks, tof, ions, jtypes, values, present):
+    # 长表按 bank 逐块给出：bank 2theta tof lambda d s 及各形状因子列
+    banks = np.asarray(banks, dtype=float)
+    factors = bank_factors(banks)
+    lam = tof_wavelengths(banks, tof)
+    rows = np.empty((len(tof), 6 + len(present)))
+    for b in range(len(banks)):
+        rows[:, 0] = b
+        rows[:, 1] = banks[b, 2]
+        rows[:, 2] = tof
+        rows[:, 3] = lam[b]
+        rows[:, 5] = factors[b] / tof
+        rows[:, 4] = 0.5 / rows[:, 5]
+        for col, (i, k) in enumerate(present, 6):
+            rows[:, col] = values[i, k, b]
+        yield rows
+
+
+def write_tof_meta(path, banks, tof, ions, jtypes):
+    # .npy 旁的 .json 轴说明，与 ff_sweep 的输出一致
+    meta = {"shape": [len(ions), len(jtypes), len(banks), len(tof)], "axes": ["ion", "j_type", "bank", "tof"],
+            "ions": [ion_label(elem, valence) for elem, valence in ions], "j_types": list(jtypes),
+            "banks": np.asarray(banks, dtype=float).tolist(), "tof": np.asarray(tof, dtype=float).tolist()}
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+
+
+def export_tof(path, banks, tof, ions, jtypes, values, fmt=None, progress=None):
+    # .npy：(离子, j类型, bank, 通道) 数组 + .json；其他格式：长表（无数据的离子/j类型组合不输出）；
+    # .npz 需要整列数组，先拼出整张长表再按列写出，其余格式流式写出
+    fmt = (fmt or os.path.splitext(path)[1] or ".dat").lower()
+    if fmt == ".npy":
+        np.save(path, values)
+        write_tof_meta(path, banks, tof, ions, jtypes)
+        return
+    present = [(i, k) for i in range(len(ions)) for k in range(len(jtypes)) if not np.isnan(values[i, k]).all()]
+    columns = ["bank", "2theta", "tof", "lambda", "d", "s"] + \
+        [f"{ions[i][0]}{ions[i][1]}+_{jtypes[k]}" for i, k in present]
+    header = [f"TOF form factors ({len(banks)} banks x {len(tof)} channels)", "\t".join(columns)]
+    if fmt == ".npz":
+        table = np.empty((len(banks) * len(tof), len(columns)))
+        for b, rows in enumerate(tof_table_chunks(banks, tof, ions, jtypes, values, present)):
+            table[b * len(tof):(b + 1) * len(tof)] = rows
+        export_columns(path, header, columns, list(table.T), fmt, progress, int_columns=1)
+        return
+    export_stream(path, header, columns, len(banks) * len(tof),
+                  tof_table_chunks(banks, tof, ions, jtypes, values, present), fmt, progress)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Magia_Form_Factor_Viewer 飞行时间（TOF）模式")
+    parser.add_argument("--banks", required=True, help="bank 参数文件，每行 L1 L2 2θ（米、米、度）")
+    parser.add_argument("--tof", required=True, help="TOF 范围 min:max:step (μs)；配合 --dt-over-t 时为 min:max")
+    parser.add_argument("--dt-over-t", type=float, help="对数通道的 Δt/t")
+    parser.add_argument("--ions", nargs="+", required=True, help="离子、元素、系列或通配符，如 3d Fe2 Gd 'Co*'")
+    parser.add_argument("--j", dest="j_types", nargs="+", choices=J_TYPES, help="j类型，默认全部")
+    parser.add_argument("--out", required=True, help=f"输出文件，格式由扩展名决定：{' '.join(FORMATS)}")
+    parser.add_argument("--data-dir", default=os.path.join(HERE, "Magnetic_Form_factor_data"), help="磁性形状因子数据目录")
+    parser.add_argument("--perf", action="store_true", help="结束后输出各阶段耗时统计")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        banks = load_banks(args.banks)
+        tof = parse_tof(args.tof, args.dt_over_t)
+        db = MagneticFormFactorDB(args.data_dir)
+        engine = MagneticFormFactorEngine(db)
+        ions = resolve_ions(db, args.ions)
+        jtypes = list(args.j_types or J_TYPES)
+        t0 = time.perf_counter()
+        if args.out.lower().endswith(".npy"):
+            # 直接计算进 .npy 内存映射，结果大小不受内存限制
+            values = np.lib.format.open_memmap(args.out, mode="w+", dtype="<f8",
+                                               shape=(len(ions), len(jtypes), len(banks), len(tof)))
+            evaluate_tof(engine, ions, jtypes, banks, tof, out=values)
+            values.flush()
+            write_tof_meta(args.out, banks, tof, ions, jtypes)
+            elapsed = time.perf_counter() - t0
+        else:
+            values = evaluate_tof(engine, ions, jtypes, banks, tof)
+            elapsed = time.perf_counter() - t0
+            export_tof(args.out, banks, tof, ions, jtypes, values)
+        print(f"共 {len(banks)} 个 bank × {len(tof)} 个通道 × {len(ions)} 个离子 × {len(jtypes)} 种j类型，"
+              f"计算用时 {elapsed:.3f} s，输出 {args.out}", file=sys.stderr)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"错误：{e}", file=sys.stderr)
+        return 2
+    finally:
+        if args.perf:
+            print(PERF.summary_text(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,519 @@
+import re
+import numpy as np
+from perf import PERF
+
+# 无Qt依赖的磁性形状因子批量计算引擎
+# 公式与GUI保持一致：
+#   <j0> = A·exp(-a·s²) + B·exp(-b·s²) + C·exp(-c·s²)
+#   <jl> = (A·exp(-a·s²) + B·exp(-b·s²) + C·exp(-c·s²) + D)·s²   (l = 2, 4, 6)
+J_TYPES = ("j0", "j2", "j4", "j6")
+COEFF_NAMES = ("A", "a", "B", "b", "C", "c", "D")
+
+_ION_RE = re.compile(r"([A-Za-z]+)(\d+)$")
+
+
+def ion_label(elem, valence):
+    return f"{elem}{valence}"
+
+
+def split_ion_label(label):
+    m = _ION_RE.match(label.strip())
+    if not m:
+        raise ValueError(f"无法识别的离子标签：{label}")
+    return m.group(1), m.group(2)
+
+
+def evaluate_block(coeffs, valid, idx, jidx, s):
+    # coeffs: (j类型, 离子, 7)，valid: (j类型, 离子)，布局同 MagneticFormFactorEngine.coeffs/valid；
+    # 返回 (len(idx), len(jidx), *s.shape)，进程池中的工作进程直接对共享内存中的系数调用
+    s = np.asarray(s, dtype=float)
+    s2 = s * s
+    # (离子, j类型, 7)
+    c = coeffs[jidx][:, idx].transpose(1, 0, 2)
+    expand = c.shape[:2] + (1,) * s.ndim
+
+    y = np.zeros(c.shape[:2] + s.shape)
+    for t in range(3):
+        amp = c[..., 2 * t].reshape(expand)
+        width = c[..., 2 * t + 1].reshape(expand)
+        y += amp * np.exp(-width * s2)
+
+    for pos, k in enumerate(jidx):
+        if J_TYPES[k] == "j0":
+            continue
+        y[:, pos] += c[:, pos, 6].reshape((-1,) + (1,) * s.ndim)
+        y[:, pos] *= s2
+
+    missing = ~valid[jidx][:, idx].T
+    y[missing] = np.nan
+    return y
+
+
+def evaluate_pairs(coeffs, valid, ion, s):
+    # 逐点配对：第 k 个值为离子 ion[k] 在 s[k] 处的全部 j类型，返回 (j类型, 点)；
+    # 各点离子不同、无法共用一个 s 网格时使用（如合并多个请求）
+    s = np.asarray(s, dtype=float)
+    s2 = s * s
+    c = coeffs[:, ion]  # (j类型, 点, 7)
+    y = np.zeros(c.shape[:2])
+    for t in range(3):
+        y += c[..., 2 * t] * np.exp(-c[..., 2 * t + 1] * s2)
+    for k, jt in enumerate(J_TYPES):
+        if jt != "j0":
+            y[k] += c[k, :, 6]
+            y[k] *= s2
+    y[~valid[:, ion]] = np.nan
+    return y
+
+
+class MagneticFormFactorEngine:
+    def __init__(self, db):
+        # 直接取用数据库的离子注册表，离子顺序即注册表记录顺序
+        registry = db.registry
+        self.registry = registry
+        self.ions = [(rec.elem, rec.valence) for rec in registry.records]
+        self.ion_index = {ion: i for i, ion in enumerate(self.ions)}
+        n = len(self.ions)
+        # coeffs[j] 为第j种j类型的 (离子数, 7) 连续数组，列顺序同 COEFF_NAMES
+        self.coeffs = np.zeros((len(J_TYPES), n, len(COEFF_NAMES)))
+        self.valid = np.zeros((len(J_TYPES), n), dtype=bool)
+        for k, jt in enumerate(J_TYPES):
+            j = registry.j_index.get(jt)
+            if j is None:
+                continue
+            self.valid[k] = registry.present[:, j]
+            for c, name in enumerate(COEFF_NAMES):
+                if name in registry.coeff_names:
+                    col = registry.params[:, j, registry.coeff_names.index(name)]
+                    # 参数缺失的列按 0 处理
+                    self.coeffs[k, :, c] = np.where(self.valid[k] & ~np.isnan(col), col, 0.0)
+
+    def __len__(self):
+        return len(self.ions)
+
+    def ion_indices(self, ions=None):
+        # ions 可为 None（全部）、(元素, 价态) 元组或 "Fe2" 形式的标签
+        if ions is None:
+            return np.arange(len(self.ions))
+        idx = []
+        for ion in ions:
+            rec = self.registry.get(ion)
+            if rec is None:
+                key = split_ion_label(ion) if isinstance(ion, str) else (ion[0], str(ion[1]))
+                raise KeyError(f"数据库中没有离子：{ion_label(*key)}")
+            idx.append(rec.index)
+        return np.asarray(idx, dtype=np.intp)
+
+    def j_indices(self, j_types=None):
+        if j_types is None:
+            return np.arange(len(J_TYPES))
+        return np.asarray([J_TYPES.index(jt) for jt in j_types], dtype=np.intp)
+
+    def has(self, elem, valence, j_type):
+        i = self.ion_index.get((elem, str(valence)))
+        return i is not None and bool(self.valid[J_TYPES.index(j_type), i])
+
+    @PERF.timed("eval.magnetic")
+    def evaluate(self, s, ions=None, j_types=None):
+        # 一次广播计算 (离子 × j类型 × s) 数据块，缺失参数的组合填 NaN
+        return evaluate_block(self.coeffs, self.valid, self.ion_indices(ions), self.j_indices(j_types), s)
+
+    def evaluate_ion(self, elem, valence, j_type, s):
+        # 单条曲线的便捷接口，无数据时返回 None
+        if not self.has(elem, valence, j_type):
+            return None
+        return self.evaluate(s, [(elem, valence)], [j_type])[0, 0]
+
+
+EVAL_CHUNK = 1 << 18  # 分块计算时每块的点数
+
+
+class EvaluationCancelled(Exception):
+    pass
+
+
+def theta_grid(wavelength, theta_min, theta_max, theta_step):
+    # 与GUI一致的 θ 网格及 s = sinθ / λ
+    theta = np.arange(theta_min, theta_max + theta_step, theta_step)
+    s = np.sin(np.deg2rad(theta)) / wavelength
+    return theta, s
+
+
+def grid_size(theta_min, theta_max, theta_step):
+    # theta_grid 的点数，不实际生成数组（与 np.arange 的长度计算一致）
+    return max(0, int(np.ceil((theta_max + theta_step - theta_min) / theta_step)))
+
+
+class StreamingEvaluator:
+    # 固定块大小的流式计算：系数按 (离子, j类型) 预先整理，θ、s、s² 与两个 (离子, j类型, 块) 工作区
+    # 只分配一次，之后每块都以 out= 原地计算，内存占用与网格总点数无关；结果与 engine.evaluate 逐位一致
+    def __init__(self, engine, ions, jtypes, chunk=EVAL_CHUNK):
+        idx = engine.ion_indices(ions)
+        jidx = engine.j_indices(jtypes)
+        c = engine.coeffs[jidx][:, idx].transpose(1, 0, 2)  # (离子, j类型, 7)
+        self.chunk = chunk
+        self.shape = c.shape[:2]
+        self.amp = [np.ascontiguousarray(c[..., 2 * t, None]) for t in range(3)]
+        self.neg_width = [np.ascontiguousarray(-c[..., 2 * t + 1, None]) for t in range(3)]
+        self.jl = [pos for pos, k in enumerate(jidx) if J_TYPES[k] != "j0"]
+        self.const = np.ascontiguousarray(c[..., 6, None])
+        self.missing = ~engine.valid[jidx][:, idx].T
+        self._index = np.arange(chunk, dtype=float)
+        self._theta = np.empty(chunk)
+        self._s = np.empty(chunk)
+        self._s2 = np.empty(chunk)
+        self._y = np.empty(self.shape + (chunk,))
+        self._tmp = np.empty(self.shape + (chunk,))
+
+    def evaluate(self, s, out=None):
+        # s 不超过 chunk 个点；out 可为任意 (离子, j类型, len(s)) 的可写视图，缺省时写入内部缓冲区
+        n = len(s)
+        if n > self.chunk:
+            raise ValueError(f"每块最多 {self.chunk} 个点，得到 {n}")
+        s2 = np.multiply(s, s, out=self._s2[:n])
+        y = self._y[..., :n] if out is None else out
+        tmp = self._tmp[..., :n]
+        for t in range(3):
+            dst = y if t == 0 else tmp
+            np.multiply(self.neg_width[t], s2, out=dst)
+            np.exp(dst, out=dst)
+            dst *= self.amp[t]
+            if t:
+                y += tmp
+        for pos in self.jl:
+            y[:, pos] += self.const[:, pos]
+            y[:, pos] *= s2
+        if self.missing.any():
+            y[self.missing] = np.nan
+        return y
+
+    def stream(self, wavelength, theta_min, theta_max, theta_step):
+        # 逐块产生 (起始下标, θ, s, 值)，与 theta_grid 的网格逐位一致；
+        # 各数组都是内部缓冲区的视图，取下一块时即被覆盖，需要保留时自行复制或写出
+        n = grid_size(theta_min, theta_max, theta_step)
+        delta = (theta_min + theta_step) - theta_min  # np.arange 实际使用的步长
+        for start in range(0, n, self.chunk):
+            m = min(self.chunk, n - start)
+            theta = np.add(self._index[:m], start, out=self._theta[:m])
+            theta *= delta
+            theta += theta_min
+            s = np.deg2rad(theta, out=self._s[:m])
+            np.sin(s, out=s)
+            s /= wavelength
+            yield start, theta, s, self.evaluate(s)
+
+
+def evaluate_grid(engine, elem, valence, jtypes, wavelength, theta_min, theta_max, theta_step,
+                  progress=None, chunk=EVAL_CHUNK, s=None):
+    # 分块计算单个离子在 θ 网格上的曲线，返回 (s, 有数据的j类型, (j类型数, 点数) 数组)；
+    # progress(完成比例) 在每块之后调用，可抛出 EvaluationCancelled 以中止；
+    # 已有同一网格的 s 时可直接传入以免重复生成
+    if s is None:
+        _, s = theta_grid(wavelength, theta_min, theta_max, theta_step)
+    jtypes = [jt for jt in jtypes if engine.has(elem, valence, jt)]
+    curves = np.empty((len(jtypes), len(s)))
+    # 各块直接写入结果数组，不产生整块临时数组
+    evaluator = StreamingEvaluator(engine, [(elem, valence)], jtypes, min(chunk, max(len(s), 1))) if jtypes else None
+    for start in range(0, len(s), chunk):
+        stop = min(start + chunk, len(s))
+        if evaluator is not None:
+            evaluator.evaluate(s[start:stop], out=curves[None, :, start:stop])
+        if progress:
+            progress(stop / len(s))
+    return s, jtypes, curves
+
+
+def evaluate_ions(engine, ions, jtypes, wavelength, theta_min, theta_max, theta_step,
+                  progress=None, chunk=EVAL_CHUNK, s=None):
+    # 多离子对比：分块计算，每块对全部离子 × j类型做一次向量化计算；
+    # 返回 (s, 有数据的 [(元素, 价态, j类型)], (曲线数, 点数) 数组)，曲线按离子、j类型顺序排列
+    if s is None:
+        _, s = theta_grid(wavelength, theta_min, theta_max, theta_step)
+    ions = [(elem, str(valence)) for elem, valence in ions]
+    pairs = [(i, k) for i, (elem, valence) in enumerate(ions) for k, jt in enumerate(jtypes)
+             if engine.has(elem, valence, jt)]
+    rows = np.asarray([i for i, _ in pairs], dtype=np.intp)
+    cols = np.asarray([k for _, k in pairs], dtype=np.intp)
+    curves = np.empty((len(pairs), len(s)))
+    # 每块的数据量与单离子时相当
+    chunk = max(1024, chunk // max(len(ions), 1))
+    for start in range(0, len(s), chunk):
+        stop = min(start + chunk, len(s))
+        if pairs:
+            curves[:, start:stop] = engine.evaluate(s[start:stop], ions, jtypes)[rows, cols]
+        if progress:
+            progress(stop / len(s))
+    return s, [ions[i] + (jtypes[k],) for i, k in pairs], curves
+
+
+
+def parse_values(text):
+    # "1.5, 2, 2.5"（逗号或空白分隔）或 "min:max:step"（含端点，网格同 theta_grid）
+    text = str(text).strip()
+    if ":" in text:
+        parts = [float(p) for p in text.split(":")]
+        if len(parts) != 3 or parts[2] <= 0 or parts[0] > parts[1]:
+            raise ValueError(f"范围格式应为 min:max:step，得到 {text}")
+        return np.arange(parts[0], parts[1] + parts[2] / 2, parts[2])
+    values = [float(p) for p in text.replace(",", " ").split()]
+    if not values:
+        raise ValueError("没有给出数值")
+    return np.asarray(values)
+
+
+def dipole_weights(g=None, c2=None, c4=0.0, c6=0.0):
+    # 偶极近似 F(s) = <j0> + C2·<j2> + C4·<j4> + C6·<j6>，C2 = 2/g − 1；
+    # g 与 C2 二选一，各参数可为标量或等长数组，返回 (组数, 4) 权重，列顺序同 J_TYPES
+    if (g is None) == (c2 is None):
+        raise ValueError("g 与 C2 需且只需给出一个")
+    if g is not None:
+        g = np.atleast_1d(np.asarray(g, dtype=float))
+        if np.any(g == 0):
+            raise ValueError("g 因子不能为 0")
+        c2 = 2 / g - 1
+    c2, c4, c6 = np.broadcast_arrays(np.atleast_1d(np.asarray(c2, dtype=float)), c4, c6)
+    return np.column_stack([np.ones_like(c2), c2, c4, c6])
+
+
+def dipole_labels(weights, g=None):
+    # 各组权重的简短标签："g=1.5"（按 g 给出时）或 "C2=0.33"，并附上非零的 C4、C6
+    weights = np.asarray(weights).reshape(-1, len(J_TYPES))
+    heads = [f"g={v:g}" for v in np.atleast_1d(g)] if g is not None else [f"C2={w[1]:g}" for w in weights]
+    return [", ".join([head] + [f"C{l}={w[k]:g}" for k, l in ((2, 4), (3, 6)) if w[k]])
+            for head, w in zip(heads, weights)]
+
+
+class DipoleFormFactorEngine:
+    # 在 MagneticFormFactorEngine 的 <jl> 之上按权重组合：先一次计算 (离子 × 所需j类型 × s) 数据块，
+    # 再与权重做一次矩阵乘，得到全部离子 × 全部 g（或 C2/C4/C6 组合）的 F(s)
+    def __init__(self, engine):
+        self.engine = engine
+
+    @PERF.timed("eval.dipole")
+    def evaluate(self, s, ions, weights):
+        # weights: (组数, 4) 全部离子共用，或 (离子, 组数, 4) 逐离子给出；返回 (离子, 组数, *s.shape)
+        # 离子缺少某个权重非零的 j类型时该组为 NaN，权重为零的缺失项不影响结果
+        engine = self.engine
+        s = np.asarray(s, dtype=float)
+        weights = np.asarray(weights, dtype=float)
+        used = np.flatnonzero(np.any(weights.reshape(-1, len(J_TYPES)) != 0, axis=0))
+        idx = engine.ion_indices(ions)
+        block = evaluate_block(engine.coeffs, engine.valid, idx, used, s.reshape(-1))
+        missing = ~engine.valid[used][:, idx].T
+        block[missing] = 0.0
+        w = weights[..., used]
+        # (组数, j) @ (离子, j, 点) -> (离子, 组数, 点)
+        f = np.matmul(w, block)
+        bad = np.matmul((w != 0).astype(float), missing[:, :, None].astype(float))[..., 0] > 0
+        f[bad] = np.nan
+        return f.reshape(f.shape[:2] + s.shape)
+
+
+def evaluate_dipole_grid(engine, ions, weights, wavelength, theta_min, theta_max, theta_step,
+                         progress=None, chunk=EVAL_CHUNK):
+    # GUI 后台任务：与 evaluate_ions 相同的分块方式；返回 (s, 有数据的离子, (离子, 组数, 点数) 数组)
+    _, s = theta_grid(wavelength, theta_min, theta_max, theta_step)
+    ions = [(elem, str(valence)) for elem, valence in ions]
+    dipole = DipoleFormFactorEngine(engine)
+    n_groups = np.shape(weights)[-2]
+    f = np.empty((len(ions), n_groups, len(s)))
+    chunk = max(1024, chunk // max(len(ions) * n_groups, 1))
+    for start in range(0, len(s), chunk):
+        stop = min(start + chunk, len(s))
+        f[:, :, start:stop] = dipole.evaluate(s[start:stop], ions, weights)
+        if progress:
+            progress(stop / len(s))
+    keep = [i for i in range(len(ions)) if not np.isnan(f[i]).all()]
+    return s, [ions[i] for i in keep], f[keep]
+
+
+@PERF.timed("eval.mixture")
+def evaluate_mixtures(engine, components, weights, s):
+    # 混合价态/部分占位：components 为 [(元素, 价态, j类型)] 分量，weights 为 (组成数, 分量数) 占位矩阵；
+    # 先一次计算全部分量曲线 (分量, 点)，再做一次矩阵乘 weights @ block，返回 (组成数, *s.shape)
+    # 权重非零的分量缺少数据时该组成为 NaN
+    s = np.asarray(s, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    ions = list(dict.fromkeys((elem, str(valence)) for elem, valence, _ in components))
+    jtypes = list(dict.fromkeys(jt for _, _, jt in components))
+    rows = np.asarray([ions.index((elem, str(valence))) for elem, valence, _ in components], dtype=np.intp)
+    cols = np.asarray([jtypes.index(jt) for _, _, jt in components], dtype=np.intp)
+    idx = engine.ion_indices(ions)
+    jidx = engine.j_indices(jtypes)
+    block = evaluate_block(engine.coeffs, engine.valid, idx, jidx, s.reshape(-1))[rows, cols]
+    missing = ~engine.valid[jidx[cols], idx[rows]]
+    block[missing] = 0.0
+    f = weights @ block
+    f[(weights[:, missing] != 0).any(axis=1)] = np.nan
+    return f.reshape((len(weights),) + s.shape)
+
+
+def evaluate_mixture_grid(engine, components, weights, wavelength, theta_min, theta_max, theta_step,
+                          progress=None, chunk=EVAL_CHUNK):
+    # GUI 后台任务：与 evaluate_ions 相同的分块方式；返回 (s, (组成数, 点数) 数组)
+    _, s = theta_grid(wavelength, theta_min, theta_max, theta_step)
+    f = np.empty((len(weights), len(s)))
+    chunk = max(1024, chunk // max(len(components), 1))
+    for start in range(0, len(s), chunk):
+        stop = min(start + chunk, len(s))
+        f[:, start:stop] = evaluate_mixtures(engine, components, weights, s[start:stop])
+        if progress:
+            progress(stop / len(s))
+    return s, f
+
+
+def pchip_coefficients(x, y):
+    # 单调三次(Fritsch–Carlson, 与 scipy PchipInterpolator 相同的端点处理) 分段系数
+    # x: (点数,)，y: (曲线数, 点数)；返回 (曲线数, 点数-1, 4)，按 t 的 0~3 次幂排列
+    h = np.diff(x)
+    delta = np.diff(y, axis=1) / h
+    d = np.zeros_like(y)
+    if y.shape[1] == 2:
+        d[:] = delta
+    else:
+        # 内点：相邻斜率同号时取加权调和平均，否则为 0
+        w1 = 2 * h[1:] + h[:-1]
+        w2 = h[1:] + 2 * h[:-1]
+        d_prev, d_next = delta[:, :-1], delta[:, 1:]
+        same_sign = np.sign(d_prev) * np.sign(d_next) > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            harmonic = (w1 + w2) / (w1 / d_prev + w2 / d_next)
+        d[:, 1:-1] = np.where(same_sign, harmonic, 0.0)
+        d[:, 0] = _pchip_edge(h[0], h[1], delta[:, 0], delta[:, 1])
+        d[:, -1] = _pchip_edge(h[-1], h[-2], delta[:, -1], delta[:, -2])
+    coef = np.empty(y.shape[:1] + (len(h), 4))
+    coef[..., 0] = y[:, :-1]
+    coef[..., 1] = d[:, :-1]
+    coef[..., 2] = (3 * delta - 2 * d[:, :-1] - d[:, 1:]) / h
+    coef[..., 3] = (d[:, :-1] + d[:, 1:] - 2 * delta) / h ** 2
+    return coef
+
+
+def _pchip_edge(h0, h1, m0, m1):
+    d = ((2 * h0 + h1) * m0 - h0 * m1) / (h0 + h1)
+    d = np.where(np.sign(d) != np.sign(m0), 0.0, d)
+    clip = (np.sign(m0) != np.sign(m1)) & (np.abs(d) > np.abs(3 * m0))
+    return np.where(clip, 3 * m0, d)
+
+
+class XRayFormFactorEngine:
+    # 在 XRayFormFactorDB 的分立数据点上预先计算全部元素的 PCHIP 样条系数，
+    # 之后可在任意 s 数组上一次性向量化求值；超出该元素数据范围的点为 NaN
+    def __init__(self, xdb):
+        self.elements = []
+        self.element_index = {}
+        self.groups = []  # [(x轴, 系数 (元素数, 区间数, 4), 各元素在 self.elements 中的序号)]
+        self._locate = {}  # {元素: (组号, 组内行号)}
+        buckets = {}
+        for k, table in enumerate(xdb.tables):
+            for elem in table['elements']:
+                entry = xdb.data.get(elem)
+                if entry is None or entry['table'] != k:
+                    continue
+                x, y = entry['points']
+                if len(x) < 2:
+                    continue
+                # 共用同一 s 轴且有效点数相同的元素归为一组，一次计算系数
+                if len(x) == len(table['s']) or np.shares_memory(x, table['s']):
+                    key = (k, len(x))
+                else:
+                    key = (k, elem)
+                buckets.setdefault(key, (x, []))[1].append((elem, y))
+        for x, members in buckets.values():
+            x = np.asarray(x, dtype=float)
+            ys = np.array([y for _, y in members], dtype=float)
+            if not np.all(np.diff(x) > 0):
+                # 自行添加的表格 s 轴可能无序或重复，排序去重后再拟合
+                x, first = np.unique(x, return_index=True)
+                ys = ys[:, first]
+                if len(x) < 2:
+                    continue
+            rows = []
+            for row, (elem, _) in enumerate(members):
+                self._locate[elem] = (len(self.groups), row)
+                self.element_index[elem] = len(self.elements)
+                rows.append(len(self.elements))
+                self.elements.append(elem)
+            self.groups.append((x, pchip_coefficients(x, ys), np.asarray(rows, dtype=np.intp)))
+
+    def has(self, elem):
+        return elem in self._locate
+
+    @PERF.timed("eval.xray")
+    def evaluate(self, s, elements=None):
+        # 返回 (元素数, *s.shape)；每组只做一次 searchsorted
+        s = np.asarray(s, dtype=float)
+        if elements is None:
+            elements = self.elements
+        out = np.full((len(elements),) + s.shape, np.nan)
+        by_group = {}
+        for pos, elem in enumerate(elements):
+            if elem not in self._locate:
+                raise KeyError(f"没有X射线散射因子数据：{elem}")
+            g, row = self._locate[elem]
+            by_group.setdefault(g, ([], []))
+            by_group[g][0].append(pos)
+            by_group[g][1].append(row)
+        flat = s.reshape(-1)
+        for g, (positions, rows) in by_group.items():
+            x, coef, _ = self.groups[g]
+            seg = np.clip(np.searchsorted(x, flat, side='right') - 1, 0, len(x) - 2)
+            t = flat - x[seg]
+            c = coef[rows]
+            y = c[:, seg, 3]
+            for p in (2, 1, 0):
+                y *= t
+                y += c[:, seg, p]
+            y[:, (flat < x[0]) | (flat > x[-1])] = np.nan
+            out[positions] = y.reshape((len(rows),) + s.shape)
+        return out
+
+    def evaluate_element(self, elem, s):
+        return self.evaluate(s, [elem])[0]
+
+
+class GaussianXRayEngine:
+    # 用 xray_fitting 得到的 Cromer–Mann 形式系数闭式计算 X 射线散射因子：
+    #   f(s) = Σ a_i·exp(-b_i·s²) + c
+    # 超出拟合范围 s_max 的点与数据表插值一样记为 NaN
+    method = "Gaussian fit"
+
+    def __init__(self, elements, coeffs, s_max=None):
+        self.elements = list(elements)
+        self.element_index = {elem: i for i, elem in enumerate(self.elements)}
+        self.coeffs = np.ascontiguousarray(coeffs, dtype=float)  # (元素数, 9)
+        self.s_max = s_max
+
+    @classmethod
+    def from_file(cls, path):
+        import re
+        from xray_fitting import load_fit_table
+        elements, coeffs, header = load_fit_table(path)
+        # 表头形如 "... (sinθ)/λ <= 2"
+        match = re.search(r"<=\s*([0-9.eE+-]+)", header)
+        return cls(elements, coeffs, float(match.group(1)) if match else None)
+
+    def has(self, elem):
+        return elem in self.element_index
+
+    @PERF.timed("eval.xray_gaussian")
+    def evaluate(self, s, elements=None):
+        s = np.asarray(s, dtype=float)
+        s2 = s * s
+        if elements is None:
+            c = self.coeffs
+        else:
+            missing = [elem for elem in elements if elem not in self.element_index]
+            if missing:
+                raise KeyError(f"没有X射线高斯拟合系数：{' '.join(missing)}")
+            c = self.coeffs[[self.element_index[elem] for elem in elements]]
+        expand = (len(c),) + (1,) * s.ndim
+        y = np.broadcast_to(c[:, -1].reshape(expand), (len(c),) + s.shape).copy()
+        for t in range((c.shape[1] - 1) // 2):
+            y += c[:, 2 * t].reshape(expand) * np.exp(-c[:, 2 * t + 1].reshape(expand) * s2)
+        if self.s_max is not None:
+            y[..., (s < 0) | (s > self.s_max)] = np.nan
+        return y
+
+    def evaluate_element(self, elem, s):
+        return self.evaluate(s, [elem])[0]
@@ -0,0 +1,199 @@
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+from collections import deque
+
+# 轻量计时埋点（只依赖标准库）：
+#   with PERF.span("parse.xray", tables=1) as sp: ...; sp.add(bytes=m)
+#   @PERF.timed("eval.magnetic")   返回数组时以其元素个数计入 points
+# 每个 span 累计次数、总耗时、最大与最近一次耗时，附带的计数（points、bytes 等）按名称累加。
+# 环境变量：
+#   FF_PERF_LOG=路径   每个 span 结束时追加一行 JSON 到该文件（"-" 表示标准错误）
+#   FF_PROFILE=路径    启动即开启 cProfile，退出时把统计写入该文件（pstats 格式）
+RECENT_EVENTS = 200
+# Python 3.12 起 cProfile 基于 sys.monitoring，同一时刻只能有一个活动的 profiler，且它已覆盖全部线程；
+# 之前的版本每个 Profile 只采样启用它的线程，工作线程需各自采样后合并
+PER_THREAD_PROFILE = sys.version_info < (3, 12)
+
+
+class Span:
+    __slots__ = ("recorder", "name", "counters", "t0")
+
+    def __init__(self, recorder, name, counters):
+        self.recorder = recorder
+        self.name = name
+        self.counters = counters
+        self.t0 = 0.0
+
+    def add(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder.record(self.name, time.perf_counter() - self.t0, self.counters, exc_type is not None)
+        return False
+
+
+class PerfRecorder:
+    def __init__(self):
+        self.stats = {}  # {名称: [次数, 总耗时, 最大耗时, 最近耗时, 出错次数]}
+        self.counters = {}  # {名称: {计数名: 累计值}}
+        self.recent = deque(maxlen=RECENT_EVENTS)
+        self._lock = threading.Lock()
+        self._log = None
+        self._log_path = os.environ.get("FF_PERF_LOG")
+        self._profiles = None  # 开启 cProfile 时为 [Profile, ...]
+
+    def span(self, name, **counters):
+        return Span(self, name, counters)
+
+    def timed(self, name):
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name) as sp:
+                    result = fn(*args, **kwargs)
+                    size = getattr(result, "size", None)
+                    if size is not None:
+                        sp.add(points=size)
+                    return result
+            return wrapper
+        return decorate
+
+    def record(self, name, seconds, counters=None, failed=False):
+        event = {"ts": time.time(), "span": name, "ms": seconds * 1e3,
+                 "thread": threading.current_thread().name}
+        if failed:
+            event["error"] = True
+        with self._lock:
+            entry = self.stats.get(name)
+            if entry is None:
+                entry = self.stats[name] = [0, 0.0, 0.0, 0.0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] = seconds
+            entry[4] += failed
+            if counters:
+                totals = self.counters.setdefault(name, {})
+                for key, value in counters.items():
+                    totals[key] = totals.get(key, 0) + value
+                event.update(counters)
+            self.recent.append(event)
+            if self._log_path:
+                self._write_log(event)
+
+    def count(self, name, **counters):
+        # 不计时、只累加计数
+        with self._lock:
+            totals = self.counters.setdefault(name, {})
+            for key, value in counters.items():
+                totals[key] = totals.get(key, 0) + value
+
+    def _write_log(self, event):
+        try:
+            if self._log is None:
+                self._log = sys.stderr if self._log_path == "-" else open(self._log_path, "a", encoding="utf-8")
+            self._log.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self._log.flush()
+        except OSError:
+            self._log_path = None
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.counters.clear()
+            self.recent.clear()
+
+    def snapshot(self):
+        # 供调试面板与导出使用的 JSON 友好结构
+        with self._lock:
+            spans = {name: {"count": c, "total_ms": t * 1e3, "mean_ms": t * 1e3 / c if c else 0.0,
+                            "max_ms": m * 1e3, "last_ms": last * 1e3, "errors": err}
+                     for name, (c, t, m, last, err) in self.stats.items()}
+            return {"spans": spans, "counters": {k: dict(v) for k, v in self.counters.items()},
+                    "recent": list(self.recent)}
+
+    def summary_text(self):
+        snap = self.snapshot()
+        lines = [f"{'阶段':<28s}{'次数':>6s}{'总计ms':>11s}{'平均ms':>10s}{'最大ms':>10s}{'最近ms':>10s}"]
+        for name in sorted(snap["spans"]):
+            s = snap["spans"][name]
+            lines.append(f"{name:<30s}{s['count']:>6d}{s['total_ms']:>11.1f}{s['mean_ms']:>10.2f}"
+                         f"{s['max_ms']:>10.2f}{s['last_ms']:>10.2f}")
+        if snap["counters"]:
+            lines.append("")
+            lines.append("计数：")
+            for name in sorted(snap["counters"]):
+                items = "，".join(f"{k} = {_format_count(v)}" for k, v in sorted(snap["counters"][name].items()))
+                lines.append(f"  {name}: {items}")
+        return "\n".join(lines)
+
+    # cProfile：主线程直接启用；3.12 之前工作线程通过 profile_call 各自采样后合并，之后由主线程的 profiler 一并采样
+    @property
+    def profiling(self):
+        return self._profiles is not None
+
+    def start_profile(self):
+        import cProfile
+        if self._profiles is not None:
+            return
+        profile = cProfile.Profile()
+        self._profiles = [profile]
+        profile.enable()
+
+    def profile_call(self, fn, *args, **kwargs):
+        if self._profiles is None or not PER_THREAD_PROFILE:
+            return fn(*args, **kwargs)
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            with self._lock:
+                if self._profiles is not None:
+                    self._profiles.append(profile)
+
+    def stop_profile(self, path=None, limit=30):
+        # 停止采样，可选写出 pstats 文件，返回按累计时间排序的前 limit 项文本
+        import io
+        import pstats
+        if self._profiles is None:
+            return ""
+        with self._lock:
+            profiles, self._profiles = self._profiles, None
+        profiles[0].disable()
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        if path:
+            stats.dump_stats(path)
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+def _format_count(value):
+    if isinstance(value, float) and not value.is_integer():
+        return f"{value:.3g}"
+    value = int(value)
+    for unit, scale in (("G", 1e9), ("M", 1e6), ("k", 1e3)):
+        if value >= scale:
+            return f"{value / scale:.2f}{unit}"
+    return str(value)
+
+
+PERF = PerfRecorder()
+
+if os.environ.get("FF_PROFILE"):
+    PERF.start_profile()
+    atexit.register(lambda: PERF.stop_profile(os.environ["FF_PROFILE"]))
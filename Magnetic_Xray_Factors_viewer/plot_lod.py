@@ -0,0 +1,138 @@
+import numpy as np
+
+# 密集曲线的分级显示：按画布像素把可见区间分箱，每箱只画最小/最大值两点，
+# 缩放、平移、改变窗口大小时由全分辨率数据重新计算包络；全分辨率数组保持不变
+MIN_POINTS_PER_PIXEL = 4  # 每像素点数低于此值时直接绘制原始数据
+
+
+def minmax_envelope(x, y, x_lo, x_hi, n_bins, log=False):
+    # 返回 (xd, yd)：可见区间 [x_lo, x_hi] 内每箱 (min, max) 两点，并保留区间两端相邻的原始点；
+    # y 可为 (曲线数, 点数)，多条共用 x 的曲线一次分箱
+    n = len(x)
+    if n < 2:
+        return x, y
+    monotone = x[-1] >= x[0] and (n < 3 or np.all(np.diff(x[::max(1, n // 1024)]) >= 0))
+    if monotone:
+        start = max(int(np.searchsorted(x, x_lo, side='left')) - 1, 0)
+        stop = min(int(np.searchsorted(x, x_hi, side='right')) + 1, n)
+    else:
+        start, stop = 0, n
+    if stop - start <= MIN_POINTS_PER_PIXEL * n_bins:
+        return x[start:stop], y[..., start:stop]
+
+    xs, ys = x[start:stop], y[..., start:stop]
+    if monotone:
+        lo, hi = xs[0], xs[-1]
+        if log and lo > 0:
+            edges = np.geomspace(lo, hi, n_bins + 1)
+        else:
+            edges = np.linspace(lo, hi, n_bins + 1)
+        bounds = np.unique(np.searchsorted(xs, edges[:-1], side='left'))
+    else:
+        # s 非单调（θ > 90°）时按下标等分
+        bounds = np.linspace(0, len(xs), n_bins + 1, dtype=np.intp)[:-1]
+        bounds = np.unique(bounds)
+    bounds = bounds[bounds < len(xs)]
+    y_min = np.minimum.reduceat(ys, bounds, axis=-1)
+    y_max = np.maximum.reduceat(ys, bounds, axis=-1)
+
+    # 每箱先画两端的 x 位置上的 min、max，形成像素宽的竖线
+    xd = np.empty(2 * len(bounds) + 2)
+    yd = np.empty(ys.shape[:-1] + xd.shape)
+    xd[0], yd[..., 0] = xs[0], ys[..., 0]
+    xd[1:-1:2] = xs[bounds]
+    xd[2:-1:2] = xs[bounds]
+    yd[..., 1:-1:2] = y_min
+    yd[..., 2:-1:2] = y_max
+    xd[-1], yd[..., -1] = xs[-1], ys[..., -1]
+    return xd, yd
+
+
+class LODPlotter:
+    # 管理一个 Axes 上的分级显示曲线
+    def __init__(self, ax):
+        self.ax = ax
+        self.lines = []  # [(Line2D, x全分辨率, y全分辨率)]
+        self._updating = False
+        ax.callbacks.connect('xlim_changed', lambda _ax: self.update())
+        canvas = ax.figure.canvas
+        self._cid = canvas.mpl_connect('resize_event', lambda _evt: self.update()) if canvas else None
+
+    def _n_bins(self):
+        return max(int(self.ax.bbox.width), 1)
+
+    def plot(self, x, y, **kwargs):
+        x = np.asarray(x)
+        y = np.asarray(y)
+        lo, hi = (np.nanmin(x), np.nanmax(x)) if len(x) else (0.0, 1.0)
+        xd, yd = minmax_envelope(x, y, lo, hi, self._n_bins(), self.ax.get_xscale() == 'log')
+        line, = self.ax.plot(xd, yd, **kwargs)
+        self.lines.append((line, x, y))
+        return line
+
+    def set_data(self, line, x, y):
+        # 替换已有曲线的全分辨率数据，保留 Line2D 及其样式；包络按数据全范围计算，供之后自动缩放
+        x = np.asarray(x)
+        y = np.asarray(y)
+        for k, entry in enumerate(self.lines):
+            if entry[0] is line:
+                self.lines[k] = (line, x, y)
+                break
+        lo, hi = (np.nanmin(x), np.nanmax(x)) if len(x) else (0.0, 1.0)
+        line.set_data(*minmax_envelope(x, y, lo, hi, self._n_bins(), self.ax.get_xscale() == 'log'))
+
+    def remove(self, line):
+        self.lines = [entry for entry in self.lines if entry[0] is not line]
+        line.remove()
+
+    def update(self):
+        if self._updating or not self.lines:
+            return
+        self._updating = True
+        try:
+            x_lo, x_hi = sorted(self.ax.get_xlim())
+            log = self.ax.get_xscale() == 'log'
+            n_bins = self._n_bins()
+            for line, x, y in self.lines:
+                line.set_data(*minmax_envelope(x, y, x_lo, x_hi, n_bins, log))
+            canvas = self.ax.figure.canvas
+            if canvas is not None:
+                canvas.draw_idle()
+        finally:
+            self._updating = False
+
+    def disconnect(self):
+        canvas = self.ax.figure.canvas
+        if canvas is not None and self._cid is not None:
+            canvas.mpl_disconnect(self._cid)
+            self._cid = None
+
+
+class LODCollection:
+    # 共用 x 的多条曲线合成一个 LineCollection（一次绘制调用），缩放、平移时一次性重新计算全部包络
+    def __init__(self, ax, x, ys, **kwargs):
+        from matplotlib.collections import LineCollection
+        self.ax = ax
+        self.x = np.asarray(x)
+        self.ys = np.atleast_2d(np.asarray(ys))
+        lo, hi = (np.nanmin(self.x), np.nanmax(self.x)) if len(self.x) else (0.0, 1.0)
+        self.collection = LineCollection(self._segments(lo, hi), **kwargs)
+        ax.add_collection(self.collection)
+        self._cid = ax.callbacks.connect('xlim_changed', lambda _ax: self.update())
+
+    def _segments(self, x_lo, x_hi):
+        log = self.ax.get_xscale() == 'log'
+        xd, yd = minmax_envelope(self.x, self.ys, x_lo, x_hi, max(int(self.ax.bbox.width), 1), log)
+        segments = np.empty(yd.shape + (2,))
+        segments[..., 0] = xd
+        segments[..., 1] = yd
+        return segments
+
+    def update(self):
+        # xlim_changed 发生在绘制开始时的自动缩放或工具栏缩放中，随后的那次绘制即会用到新线段，无需再请求重绘
+        x_lo, x_hi = sorted(self.ax.get_xlim())
+        self.collection.set_segments(self._segments(x_lo, x_hi))
+
+    def remove(self):
+        self.ax.callbacks.disconnect(self._cid)
+        self.collection.remove()
@@ -0,0 +1,213 @@
+import numpy as np
+from plot_lod import LODPlotter, LODCollection
+from perf import PERF
+
+# 持久化的绘图层：坐标轴、网格与各曲线的 Line2D 只创建一次，之后用 set_data 更新数据，
+# 标签不变时不重建图例。拖动滑块期间（begin_live 与 end_live 之间）曲线设为 animated，
+# 背景（坐标轴、刻度、图例）缓存一次，每帧只重绘数据层并 blit；数据超出当前范围时才放宽范围整幅重绘
+LIVE_MARGIN = 0.1  # 实时模式放宽坐标范围时两侧额外留出的比例
+
+
+class CurveView:
+    def __init__(self, fig):
+        self.fig = fig
+        self.canvas = fig.canvas
+        self.ax = fig.add_subplot(111)
+        self.ax.grid(True)
+        self.ax.set_visible(False)
+        self.lod = LODPlotter(self.ax)
+        self.lines = {}  # {(标签, 样式): Line2D}
+        self.collection = None  # 多离子对比时的 LODCollection
+        self._keys = ()
+        self._legend = False
+        self.live = False
+        self._background = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    @staticmethod
+    def _key(label, style):
+        return label, tuple(sorted(style.items()))
+
+    def _set_curves(self, curves):
+        # curves: [(标签, x, y, 样式)]；带 marker 的散点不做分级显示
+        keys = [self._key(label, style) for label, _, _, style in curves]
+        for key in list(self.lines):
+            if key not in keys:
+                self._drop(key)
+        for pos, (key, (label, x, y, style)) in enumerate(zip(keys, curves)):
+            line = self.lines.get(key)
+            raw = bool(style.get('marker'))
+            if line is None:
+                if raw:
+                    line, = self.ax.plot(x, y, label=label, **style)
+                else:
+                    line = self.lod.plot(x, y, label=label, **style)
+                line.set_animated(self.live)
+                self.lines[key] = line
+            elif raw:
+                line.set_data(x, y)
+            else:
+                self.lod.set_data(line, x, y)
+            # 颜色按当前顺序分配，与每次重新绘图时一致
+            if 'color' not in style:
+                line.set_color(f"C{pos}")
+        return tuple(keys)
+
+    def _drop(self, key):
+        line = self.lines.pop(key)
+        if dict(key[1]).get('marker'):
+            line.remove()
+        else:
+            self.lod.remove(line)
+
+    def _set_scale(self, log):
+        scale = "log" if log else "linear"
+        if self.ax.get_xscale() != scale:
+            self.ax.set_xscale(scale)
+
+    def _drop_collection(self):
+        if self.collection is not None:
+            self.collection.remove()
+            self.collection = None
+
+    def show(self, curves, title="", xlabel="", ylabel="", log=False, legend=True):
+        ax = self.ax
+        self._drop_collection()
+        self._set_scale(log)
+        keys = self._set_curves(curves)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        if keys != self._keys or legend != self._legend:
+            if ax.get_legend() is not None:
+                ax.get_legend().remove()
+            if legend:
+                ax.legend(handles=[self.lines[key] for key in keys])
+            self._keys = keys
+            self._legend = legend
+        self.rescale()
+        ax.set_visible(True)
+        self.canvas.draw()
+
+    def show_collection(self, x, ys, colors, linestyles, legend_entries, title="", xlabel="", ylabel="",
+                        log=False):
+        # 多条共用 x 的曲线作为一个 LineCollection 绘制；legend_entries: [(文字, 颜色, 线型)]，
+        # 由调用方给出精简后的条目（如按离子着色、按 j类型区分线型）
+        from matplotlib.lines import Line2D
+        ax = self.ax
+        self.clear()
+        self._set_scale(log)
+        self.collection = LODCollection(ax, x, ys, colors=colors, linestyles=linestyles, linewidths=1.0)
+        handles = [Line2D([], [], color=color, linestyle=ls, label=text) for text, color, ls in legend_entries]
+        if handles:
+            ax.legend(handles=handles, fontsize="small", ncol=2 if len(handles) > 8 else 1)
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        # relim 不统计 Collection，数据范围直接给出
+        ax.set_autoscale_on(True)
+        ax.relim()
+        x = np.asarray(x)
+        if log:
+            x = x[x > 0]
+        if len(x) and np.size(ys):
+            ax.update_datalim([(np.nanmin(x), np.nanmin(ys)), (np.nanmax(x), np.nanmax(ys))])
+        ax.autoscale_view()
+        ax.set_visible(True)
+        self.canvas.draw()
+
+    def rescale(self):
+        # 实时模式放宽范围时 set_xlim 会关闭自动缩放，这里重新打开
+        self.ax.set_autoscale_on(True)
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+    def clear(self, redraw=False):
+        for key in list(self.lines):
+            self._drop(key)
+        self._drop_collection()
+        if self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
+        self._keys = ()
+        self._legend = False
+        self.ax.set_title("")
+        self.ax.set_visible(False)
+        if redraw:
+            self.canvas.draw()
+
+    # ---------- 实时模式（blit） ----------
+    def begin_live(self):
+        if self.live or not self.lines:
+            return
+        self.live = True
+        for line in self.lines.values():
+            line.set_animated(True)
+        self.canvas.draw()
+
+    def end_live(self, redraw=True):
+        if not self.live:
+            return
+        self.live = False
+        self._background = None
+        for line in self.lines.values():
+            line.set_animated(False)
+        if redraw:
+            self.rescale()
+            self.canvas.draw()
+
+    def _on_draw(self, event):
+        # 整幅重绘后缓存不含曲线的背景，再把 animated 曲线画上
+        if not self.live:
+            return
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def update(self, curves):
+        # 实时模式下更新曲线数据：标签不变且数据仍在当前范围内时只 blit 数据层
+        if not self.live or self._background is None or \
+                tuple(self._key(label, style) for label, _, _, style in curves) != self._keys:
+            return False
+        self._set_curves(curves)
+        if not self._fits(curves):
+            self.rescale()
+            self._pad()
+            self.canvas.draw()
+            return True
+        with PERF.span("draw.blit", points=sum(len(line.get_xdata()) for line in self.lines.values())):
+            self.canvas.restore_region(self._background)
+            for line in self.lines.values():
+                self.ax.draw_artist(line)
+            self.canvas.blit(self.ax.bbox)
+        return True
+
+    def _fits(self, curves):
+        log = self.ax.get_xscale() == 'log'
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        for _, x, y, _ in curves:
+            x = np.asarray(x)
+            y = np.asarray(y)
+            ok = np.isfinite(x) & np.isfinite(y)
+            if log:
+                ok &= x > 0
+            if not ok.any():
+                continue
+            x, y = x[ok], y[ok]
+            if x.min() < x0 or x.max() > x1 or y.min() < y0 or y.max() > y1:
+                return False
+        return True
+
+    def _pad(self):
+        # 放宽后留出余量，连续拖动时不必每帧整幅重绘
+        x0, x1 = self.ax.get_xlim()
+        if self.ax.get_xscale() == 'log':
+            if x0 > 0 and x1 > 0:
+                ratio = (x1 / x0) ** LIVE_MARGIN
+                self.ax.set_xlim(x0 / ratio, x1 * ratio)
+        else:
+            dx = (x1 - x0) * LIVE_MARGIN
+            self.ax.set_xlim(x0 - dx, x1 + dx)
+        y0, y1 = self.ax.get_ylim()
+        dy = (y1 - y0) * LIVE_MARGIN
+        self.ax.set_ylim(y0 - dy, y1 + dy)
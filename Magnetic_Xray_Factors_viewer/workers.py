@@ -0,0 +1,49 @@
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+from perf import PERF
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(float)  # 完成比例 0~1
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+
+class Worker(QRunnable):
+    # 在 QThreadPool 中执行 fn(*args, progress=..., **kwargs)；
+    # fn 通过 progress(比例) 汇报进度，取消后下一次 progress 调用抛出 EvaluationCancelled
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def _report(self, fraction):
+        if self.is_cancelled:
+            from form_factor_engine import EvaluationCancelled
+            raise EvaluationCancelled()
+        self.signals.progress.emit(fraction)
+
+    def run(self):
+        # 在工作线程中导入，避免 numpy 拖慢界面启动
+        from form_factor_engine import EvaluationCancelled
+        try:
+            # 开启 cProfile 时工作线程也单独采样并合并
+            result = PERF.profile_call(self.fn, *self.args, progress=self._report, **self.kwargs)
+        except EvaluationCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            traceback.print_exc()
+            self.signals.failed.emit(f"{type(e).__name__}: {e}")
+        else:
+            if self.is_cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# 用 Cromer–Mann 形式 f(s) = Σ a_i·exp(-b_i·s²) + c (i = 1..4) 拟合 XRayFormFactorDB 的分立数据，
+# 残差向量化、解析雅可比，Levenberg–Marquardt 迭代；元素分散到进程池并行拟合
+N_GAUSS = 4
+COEFF_NAMES = ("a1", "b1", "a2", "b2", "a3", "b3", "a4", "b4", "c")
+DEFAULT_S_MAX = 2.0  # International Tables 中 Cromer–Mann 系数的适用范围 sinθ/λ ≤ 2 Å⁻¹
+
+# 多组 b 初值，取残差最小者，避免陷入局部极小
+_B_STARTS = (
+    (0.2, 2.0, 10.0, 50.0),
+    (0.5, 4.0, 20.0, 80.0),
+    (0.1, 1.0, 5.0, 30.0),
+)
+
+
+def _model_and_jacobian(p, s2):
+    # p = [a1, ln b1, ..., a4, ln b4, c]，对 b 取对数保证其为正
+    a = p[0:2 * N_GAUSS:2]
+    b = np.exp(p[1:2 * N_GAUSS:2])
+    e = np.exp(-b[:, None] * s2)  # (4, 点数)
+    f = a @ e + p[-1]
+    jac = np.empty((len(s2), len(p)))
+    jac[:, 0:2 * N_GAUSS:2] = e.T
+    jac[:, 1:2 * N_GAUSS:2] = (-(a * b)[:, None] * s2 * e).T
+    jac[:, -1] = 1.0
+    return f, jac
+
+
+def _levenberg_marquardt(p, s2, y, max_iter=500, tol=1e-12):
+    f, jac = _model_and_jacobian(p, s2)
+    r = f - y
+    cost = r @ r
+    lam = 1e-3
+    for _ in range(max_iter):
+        jtj = jac.T @ jac
+        g = jac.T @ r
+        try:
+            step = np.linalg.solve(jtj + lam * np.diag(np.diag(jtj) + 1e-12), -g)
+        except np.linalg.LinAlgError:
+            lam *= 10
+            continue
+        p_new = p + step
+        f_new, jac_new = _model_and_jacobian(p_new, s2)
+        r_new = f_new - y
+        cost_new = r_new @ r_new
+        if np.isfinite(cost_new) and cost_new < cost:
+            converged = cost - cost_new <= tol * max(cost, 1e-30)
+            p, jac, r, cost = p_new, jac_new, r_new, cost_new
+            lam = max(lam / 3, 1e-12)
+            if converged:
+                break
+        else:
+            lam *= 4
+            if lam > 1e12:
+                break
+    return p, cost
+
+
+def fit_gaussians(s, f, s_max=DEFAULT_S_MAX):
+    # 拟合单个元素，返回 {'coeffs': (9,) 数组 [a1, b1, ..., a4, b4, c], 'rms', 'max_err', 'n_points'}
+    s = np.asarray(s, dtype=float)
+    f = np.asarray(f, dtype=float)
+    keep = (s <= s_max) & ~np.isnan(f)
+    s2, y = s[keep] ** 2, f[keep]
+    best = None
+    for b0 in _B_STARTS:
+        p0 = np.empty(2 * N_GAUSS + 1)
+        p0[0:2 * N_GAUSS:2] = y[0] / N_GAUSS
+        p0[1:2 * N_GAUSS:2] = np.log(b0)
+        p0[-1] = 0.0
+        p, cost = _levenberg_marquardt(p0, s2, y)
+        if best is None or cost < best[1]:
+            best = (p, cost)
+    p = best[0]
+    coeffs = p.copy()
+    coeffs[1:2 * N_GAUSS:2] = np.exp(p[1:2 * N_GAUSS:2])
+    resid = _model_and_jacobian(p, s2)[0] - y
+    return {
+        'coeffs': coeffs,
+        'rms': float(np.sqrt(np.mean(resid ** 2))),
+        'max_err': float(np.abs(resid).max()),
+        'n_points': int(len(y)),
+    }
+
+
+def _fit_task(task):
+    elem, s, f, s_max = task
+    return elem, fit_gaussians(s, f, s_max)
+
+
+def fit_all(xdb, s_max=DEFAULT_S_MAX, processes=None, elements=None):
+    # 对 xdb 中全部（或指定）元素拟合，processes=1 时在当前进程串行执行
+    if elements is None:
+        elements = sorted(xdb.get_all_elements())
+    tasks = []
+    for elem in elements:
+        s, f = xdb.get_points(elem)
+        tasks.append((elem, np.array(s), np.array(f), s_max))
+    if processes == 1 or len(tasks) < 2:
+        return dict(map(_fit_task, tasks))
+    workers = processes or os.cpu_count() or 1
+    chunksize = max(1, len(tasks) // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(_fit_task, tasks, chunksize=chunksize))
+
+
+def save_fit_table(path, results, s_max=DEFAULT_S_MAX):
+    # 保存为与磁性系数表相同风格的 Tab 分隔文本
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"X-ray scattering factors fitted as sum of {N_GAUSS} Gaussians plus constant, "
+                f"(sinθ)/λ <= {s_max:g}\n")
+        f.write("Element\t" + "\t".join(COEFF_NAMES) + "\trms\tmax_err\n")
+        for elem, res in results.items():
+            values = "\t".join(f"{v:.6g}" for v in res['coeffs'])
+            f.write(f"{elem}\t{values}\t{res['rms']:.4g}\t{res['max_err']:.4g}\n")
+
+
+def load_fit_table(path):
+    # 返回 (元素列表, (元素数, 9) 系数数组, 头行描述)
+    elements, rows = [], []
+    with open(path, encoding="utf-8") as f:
+        header = f.readline().strip()
+        f.readline()
+        for line in f:
+            parts = line.rstrip("\r\n").split("\t")
+            if len(parts) < len(COEFF_NAMES) + 1:
+                continue
+            elements.append(parts[0].strip())
+            rows.append([float(p) for p in parts[1:len(COEFF_NAMES) + 1]])
+    return elements, np.array(rows, dtype=float).reshape(len(rows), len(COEFF_NAMES)), header
+
+
+if __name__ == "__main__":
+    from data_manager import XRayFormFactorDB
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="拟合X射线散射因子的高斯系数表")
+    parser.add_argument("--data-dir", default=os.path.join(here, "Xray_scatter_data"))
+    parser.add_argument("--output", default=os.path.join(here, "Xray_gaussian_coeffs.txt"))
+    parser.add_argument("--s-max", type=float, default=DEFAULT_S_MAX)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    xdb = XRayFormFactorDB(args.data_dir)
+    t0 = time.perf_counter()
+    results = fit_all(xdb, s_max=args.s_max, processes=args.processes)
+    elapsed = time.perf_counter() - t0
+    save_fit_table(args.output, results, args.s_max)
+    worst = max(results.items(), key=lambda kv: kv[1]['max_err'])
+    print(f"拟合 {len(results)} 个元素用时 {elapsed:.2f} s，"
+          f"最大偏差 {worst[1]['max_err']:.4g}（{worst[0]}），已保存至 {args.output}", file=sys.stderr)